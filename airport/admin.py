@@ -8,7 +8,8 @@ from airport.models import (
     Airplane,
     Flight,
     Order,
-    Ticket
+    Ticket,
+    SeatHold
 )
 
 
@@ -58,7 +59,8 @@ class FlightAdmin(admin.ModelAdmin):
         "route",
         "airplane",
         "departure_time",
-        "arrival_time"
+        "arrival_time",
+        "tickets_sold"
     )
     list_filter = ("departure_time", "airplane")
     inlines = [TicketInline]
@@ -75,3 +77,9 @@ class OrderAdmin(admin.ModelAdmin):
 class TicketAdmin(admin.ModelAdmin):
     list_display = ("flight", "row", "seat", "order")
     list_filter = ("flight",)
+
+
+@admin.register(SeatHold)
+class SeatHoldAdmin(admin.ModelAdmin):
+    list_display = ("flight", "row", "seat", "user", "expires_at")
+    list_filter = ("flight",)
@@ -0,0 +1,185 @@
+"""
+Native async read endpoints for flight search, flight details and seat
+availability, served without a worker thread per request under ASGI.
+DRF viewsets are synchronous, so these are plain Django async views
+that run the DRF authentication, permission and throttle classes of the
+matching viewset and render the same JSON.
+"""
+from collections import OrderedDict
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from airport.instrumentation import timed
+from airport.models import Flight
+from airport.seat_map import aget_seat_map
+from airport.serializers import FlightDetailSerializer
+from airport.views import FlightViewSet
+
+
+def _json(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        content_type="application/json",
+        status=status_code,
+        headers=headers,
+    )
+
+
+def _error(exc, request):
+    """Response of DRF's exception handler for an APIException"""
+    headers = {}
+    status_code = exc.status_code
+    if isinstance(
+        exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+    ):
+        header = None
+        if request.authenticators:
+            header = request.authenticators[0].authenticate_header(request)
+        if header:
+            headers["WWW-Authenticate"] = header
+        else:
+            status_code = status.HTTP_403_FORBIDDEN
+    wait = getattr(exc, "wait", None)
+    if wait:
+        headers["Retry-After"] = str(int(wait))
+    data = exc.detail
+    if not isinstance(data, (list, dict)):
+        data = {"detail": data}
+    return _json(data, status_code, headers)
+
+
+def _check_access(request, view):
+    """DRF's APIView.initial() checks, run in a worker thread"""
+    with timed("auth"):
+        request.user
+    for permission in view.get_permissions():
+        if not permission.has_permission(request, view):
+            if request.authenticators and not request.successful_authenticator:
+                raise exceptions.NotAuthenticated()
+            raise exceptions.PermissionDenied(
+                getattr(permission, "message", None)
+            )
+    view.check_throttles(request)
+
+
+def flight_view(action):
+    """
+    Wrap an async view(request, view, ...) taking a DRF Request and a
+    FlightViewSet set up for action, after the viewset's access checks
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(django_request, *args, **kwargs):
+            view = FlightViewSet(action=action, format_kwarg=None)
+            view.args, view.kwargs = args, kwargs
+            request = Request(
+                django_request,
+                authenticators=view.get_authenticators(),
+                parser_context={"view": view},
+            )
+            view.request = request
+            try:
+                await sync_to_async(_check_access)(request, view)
+                return await func(request, view, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return _error(exc, request)
+        return wrapper
+    return decorator
+
+
+async def _page(request, view, queryset):
+    """PageNumberPagination of the flight list with async queries"""
+    paginator = view.paginator
+    if paginator.cursor_query_param in request.query_params:
+        # Keyset pages run a single query, no gain from going async
+        page = await sync_to_async(paginator.paginate_queryset)(
+            queryset, request, view
+        )
+        rows = view.values_serializer_class.serialize(page)
+        return paginator.get_paginated_response(rows).data
+
+    page_size = paginator.get_page_size(request)
+    page_number = request.query_params.get(paginator.page_query_param, 1)
+    try:
+        page_number = int(page_number)
+        if page_number < 1:
+            raise ValueError
+    except ValueError:
+        raise exceptions.NotFound("Invalid page.")
+
+    count = await queryset.acount()
+    offset = (page_number - 1) * page_size
+    if page_number > 1 and offset >= count:
+        raise exceptions.NotFound("Invalid page.")
+    rows = [
+        row async for row in queryset[offset:offset + page_size].aiterator()
+    ]
+
+    url = request.build_absolute_uri()
+    next_link = previous_link = None
+    if offset + page_size < count:
+        next_link = replace_query_param(
+            url, paginator.page_query_param, page_number + 1
+        )
+    if page_number == 2:
+        previous_link = remove_query_param(url, paginator.page_query_param)
+    elif page_number > 2:
+        previous_link = replace_query_param(
+            url, paginator.page_query_param, page_number - 1
+        )
+    return OrderedDict([
+        ("count", count),
+        ("next", next_link),
+        ("previous", previous_link),
+        ("results", view.values_serializer_class.serialize(rows)),
+    ])
+
+
+@flight_view("list")
+async def flight_list(request, view):
+    # Resolving airport name filters queries the database
+    queryset = await sync_to_async(view.get_queryset)()
+    queryset = view.values_serializer_class.values(queryset)
+    return _json(await _page(request, view, queryset))
+
+
+@flight_view("retrieve")
+async def flight_detail(request, view, pk):
+    try:
+        flight = await view.queryset.aget(pk=pk)
+    except view.queryset.model.DoesNotExist:
+        raise exceptions.NotFound("No Flight matches the given query.")
+    # Serializing can't query from the event loop
+    seat_map = await aget_seat_map(flight)
+    serializer = FlightDetailSerializer(
+        flight, context={"request": request, "seat_map": seat_map}
+    )
+    with timed("serialize"):
+        data = serializer.data
+    return _json(data)
+
+
+@flight_view("retrieve")
+async def flight_seats(request, view, pk):
+    try:
+        flight = await Flight.objects.select_related("airplane").only(
+            "tickets_version", "airplane__rows", "airplane__seats_in_row"
+        ).aget(pk=pk)
+    except Flight.DoesNotExist:
+        raise exceptions.NotFound("No Flight matches the given query.")
+    seat_map = await aget_seat_map(flight)
+    return _json({
+        "flight": flight.id,
+        "capacity": seat_map.capacity,
+        "available": seat_map.available,
+        "taken_places": [
+            {"row": row, "seat": seat}
+            for row, seat in seat_map.taken_places()
+        ],
+    })
@@ -0,0 +1,123 @@
+"""
+JWT authentication that remembers, per access token, the user it
+resolved to, so repeated requests with the same token skip decoding it
+and the user query.
+
+Entries hold the user's id, is_staff and is_active only; the user of a
+request is a model instance with every other field deferred, loaded on
+first access. Entries live JWT_USER_CACHE_TTL seconds at most (never
+past the token's expiry) in a per-process LRU of JWT_USER_CACHE_SIZE
+tokens, and the entries of a user are dropped when the user is saved or
+deleted. Other workers see such a change after the TTL at the latest.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+
+class UserCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.tokens_by_user = defaultdict(set)
+
+    def get(self, raw_token):
+        with self.lock:
+            entry = self.entries.get(raw_token)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(raw_token)
+                return None
+            self.entries.move_to_end(raw_token)
+            return entry
+
+    def set(self, raw_token, user, validated_token, ttl, max_size):
+        expires_at = time.monotonic() + min(
+            ttl, validated_token["exp"] - time.time()
+        )
+        entry = (
+            expires_at, user.pk, user.is_staff, user.is_active,
+            validated_token,
+        )
+        with self.lock:
+            self.entries[raw_token] = entry
+            self.entries.move_to_end(raw_token)
+            self.tokens_by_user[user.pk].add(raw_token)
+            while len(self.entries) > max_size:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, raw_token):
+        entry = self.entries.pop(raw_token)
+        tokens = self.tokens_by_user[entry[1]]
+        tokens.discard(raw_token)
+        if not tokens:
+            del self.tokens_by_user[entry[1]]
+
+    def invalidate_user(self, user_id):
+        with self.lock:
+            for raw_token in list(self.tokens_by_user.get(user_id, ())):
+                self._remove(raw_token)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tokens_by_user.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication serving repeated tokens from user_cache"""
+
+    def authenticate(self, request):
+        ttl = getattr(settings, "JWT_USER_CACHE_TTL", 0)
+        # Revoking tokens on password change needs the password hash
+        if not ttl or api_settings.CHECK_REVOKE_TOKEN:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        entry = user_cache.get(raw_token)
+        if entry is not None:
+            _, user_id, is_staff, is_active, validated_token = entry
+            return self._user(user_id, is_staff, is_active), validated_token
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        user_cache.set(
+            raw_token,
+            user,
+            validated_token,
+            ttl,
+            getattr(settings, "JWT_USER_CACHE_SIZE", 10000),
+        )
+        return user, validated_token
+
+    def _user(self, user_id, is_staff, is_active):
+        """A user instance per request, the other fields deferred"""
+        model = get_user_model()
+        known = {
+            model._meta.pk.attname: user_id,
+            "is_staff": is_staff,
+            "is_active": is_active,
+        }
+        # from_db() expects the fields in model order
+        names = [
+            field.attname for field in model._meta.concrete_fields
+            if field.attname in known
+        ]
+        return model.from_db(
+            model._default_manager.db, names, [known[name] for name in names]
+        )
@@ -0,0 +1,95 @@
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from airport import metrics
+from airport.replicas import cache_timeout
+
+CACHE_ALIAS = "responses"
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(model):
+    return f"response-version:{model._meta.label_lower}"
+
+
+def _new_version():
+    # Versions may be culled along with the responses; starting over
+    # from the clock instead of 1 never reuses a version seen before
+    return time.time_ns()
+
+
+def get_versions(models):
+    cache = _cache()
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = _new_version()
+            cache.add(key, version, timeout=None)
+            versions[key] = cache.get(key, version)
+    return [versions[key] for key in keys]
+
+
+def _bump_version(model):
+    cache = _cache()
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _new_version(), timeout=None)
+
+
+def invalidate_model(model):
+    """
+    Make cached responses built from model unreachable. The version is
+    bumped right away and again on commit, so a reader that cached the
+    old rows while the transaction was open doesn't keep them alive.
+    """
+    _bump_version(model)
+    transaction.on_commit(lambda: _bump_version(model))
+
+
+class CachedListMixin:
+    """
+    Serve list responses of nearly static reference data from the
+    "responses" cache. Entries are keyed on the versions of cache_models,
+    which model signals bump on every change, and carry an ETag so that
+    clients revalidating with If-None-Match get a 304 without the
+    queryset being touched.
+    """
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        versions = get_versions(self.cache_models)
+        digest = hashlib.sha1(
+            f"{versions}:{request.build_absolute_uri()}".encode()
+        ).hexdigest()
+        etag = f'W/"{digest}"'
+
+        if etag in request.headers.get("If-None-Match", ""):
+            metrics.cache_lookups(CACHE_ALIAS, hits=1, misses=0)
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": etag}
+            )
+
+        cache = _cache()
+        key = f"response:{digest}"
+        data = cache.get(key)
+        hit = data is not None
+        metrics.cache_lookups(CACHE_ALIAS, hits=int(hit), misses=int(not hit))
+        if not hit:
+            response = super().list(request, *args, **kwargs)
+            cache.set(key, response.data, cache_timeout())
+        else:
+            response = Response(data)
+        response["ETag"] = etag
+        return response
@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+from django.core.cache import caches
+
+from airport import metrics
+from airport.caching import get_versions
+from airport.models import Flight, Route
+from airport.replicas import cache_timeout
+
+CACHE_ALIAS = "departures"
+# Stands for any airport in a bucket key
+ANY = "*"
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(versions, day_start, source_id, destination_id):
+    versions = ".".join(map(str, versions))
+    return (
+        f"departures:{versions}:{day_start.isoformat()}:"
+        f"{source_id}:{destination_id}"
+    )
+
+
+def _build_buckets(day_start, day_end, source_ids, destination_ids):
+    """
+    Fill the (source, destination) buckets of a day with one query.
+    Buckets hold (departure timestamp, flight id) pairs.
+    """
+    flights = Flight.objects.filter(
+        departure_time__gte=day_start,
+        departure_time__lt=day_end
+    ).order_by()
+    if ANY not in source_ids:
+        flights = flights.filter(route__source_id__in=source_ids)
+    if ANY not in destination_ids:
+        flights = flights.filter(route__destination_id__in=destination_ids)
+
+    buckets = defaultdict(list)
+    for source_id, destination_id, departure_time, flight_id in (
+        flights.values_list(
+            "route__source_id",
+            "route__destination_id",
+            "departure_time",
+            "id"
+        )
+    ):
+        entry = (departure_time.timestamp(), flight_id)
+        for source in (source_id, ANY):
+            for destination in (destination_id, ANY):
+                buckets[source, destination].append(entry)
+    return buckets
+
+
+def departing_flight_ids(day_start, day_end, source_ids, destination_ids):
+    """
+    Ids of flights departing in [day_start, day_end) between any of the
+    source and destination airports, ordered like Flight.Meta.ordering
+    with id as tie breaker. Pass [ANY] for either side to not filter on
+    it. Buckets are cached per (source, destination, day) and keyed on
+    the Flight and Route versions that their signals bump.
+    """
+    versions = get_versions((Flight, Route))
+    pairs = [
+        (source_id, destination_id)
+        for source_id in source_ids
+        for destination_id in destination_ids
+    ]
+    keys = {
+        _key(versions, day_start, *pair): pair for pair in pairs
+    }
+
+    cache = _cache()
+    cached = cache.get_many(keys)
+    entries = [entry for value in cached.values() for entry in value]
+
+    missing = [keys[key] for key in keys.keys() - cached.keys()]
+    metrics.cache_lookups(CACHE_ALIAS, hits=len(cached), misses=len(missing))
+    if missing:
+        buckets = _build_buckets(
+            day_start,
+            day_end,
+            {source_id for source_id, _ in missing},
+            {destination_id for _, destination_id in missing}
+        )
+        cache.set_many({
+            _key(versions, day_start, *pair): buckets.get(pair, [])
+            for pair in missing
+        }, cache_timeout())
+        for pair in missing:
+            entries.extend(buckets.get(pair, ()))
+
+    entries.sort(reverse=True)
+    return [flight_id for _, flight_id in entries]
+
+
+def forget_buckets(day_start, source_ids, destination_ids):
+    """
+    Drop the cached buckets read by departing_flight_ids(), for when
+    they turn out to list flights that no longer exist
+    """
+    versions = get_versions((Flight, Route))
+    _cache().delete_many([
+        _key(versions, day_start, source_id, destination_id)
+        for source_id in source_ids
+        for destination_id in destination_ids
+    ])
@@ -0,0 +1,169 @@
+import csv
+import datetime
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+
+from airport.models import Flight, Ticket
+
+CHUNK_SIZE = 2000
+# Rendered rows are joined into writes of about this many characters
+BUFFER_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+FLIGHT_FIELDS = {
+    "id": "id",
+    "route": "route_id",
+    "source": "route__source__name",
+    "destination": "route__destination__name",
+    "airplane": "airplane_id",
+    "airplane_name": "airplane__name",
+    "departure_time": "departure_time",
+    "arrival_time": "arrival_time",
+    "tickets_sold": "tickets_sold",
+}
+FLIGHT_COLUMNS = (*FLIGHT_FIELDS, "crew")
+
+TICKET_FIELDS = {
+    "id": "id",
+    "flight": "flight_id",
+    "row": "row",
+    "seat": "seat",
+    "order": "order_id",
+    "user": "order__user_id",
+    "created_at": "order__created_at",
+}
+
+ORDER_FIELDS = {
+    "order": "order_id",
+    "created_at": "order__created_at",
+    "ticket": "id",
+    "flight": "flight_id",
+    "source": "flight__route__source__name",
+    "destination": "flight__route__destination__name",
+    "departure_time": "flight__departure_time",
+    "arrival_time": "flight__arrival_time",
+    "row": "row",
+    "seat": "seat",
+}
+
+_datetime = serializers.DateTimeField().to_representation
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _rows(queryset, fields, chunk_size):
+    """Stream {column: value} dicts of fields from a server-side cursor"""
+    names = tuple(fields)
+    values = queryset.values_list(*fields.values()).iterator(
+        chunk_size=chunk_size
+    )
+    for row in values:
+        yield dict(zip(names, row))
+
+
+def flight_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Flights with their crew ids. Crew is loaded with one query per
+    chunk rather than prefetched, so memory stays bounded by chunk_size.
+    """
+    rows = _rows(
+        queryset.prefetch_related(None).order_by("-departure_time", "-id"),
+        FLIGHT_FIELDS,
+        chunk_size
+    )
+    for chunk in _chunks(rows, chunk_size):
+        crew = defaultdict(list)
+        for flight_id, crew_id in Flight.crew.through.objects.filter(
+            flight_id__in=[row["id"] for row in chunk]
+        ).order_by("crew_id").values_list("flight_id", "crew_id"):
+            crew[flight_id].append(crew_id)
+        for row in chunk:
+            row["crew"] = crew[row["id"]]
+            yield row
+
+
+def flight_ticket_rows(flight_id, chunk_size=CHUNK_SIZE):
+    queryset = Ticket.objects.filter(flight_id=flight_id).order_by(
+        "row", "seat"
+    )
+    return _rows(queryset, TICKET_FIELDS, chunk_size)
+
+
+def user_order_rows(user, chunk_size=CHUNK_SIZE):
+    """One row per ticket of the user's orders, newest orders first"""
+    queryset = Ticket.objects.filter(order__user=user).order_by(
+        "-order__created_at", "-order_id", "row", "seat"
+    )
+    return _rows(queryset, ORDER_FIELDS, chunk_size)
+
+
+def _value(value):
+    if isinstance(value, datetime.datetime):
+        return _datetime(value)
+    return value
+
+
+class _Echo:
+    """File-like object handing each line csv.writer writes back"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ";".join(map(str, value))
+    return _value(value)
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(_csv_value(row[column]) for column in columns)
+
+
+def _ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(
+            {column: _value(row[column]) for column in columns}
+        ) + "\n"
+
+
+WRITERS = {"csv": _csv_lines, "ndjson": _ndjson_lines}
+
+
+def render(file_format, columns, rows):
+    """Yield the rows as CSV or NDJSON text in BUFFER_SIZE pieces"""
+    buffer, size = [], 0
+    for line in WRITERS[file_format](columns, rows):
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def streaming_response(file_format, columns, rows, filename):
+    response = StreamingHttpResponse(
+        render(file_format, columns, rows),
+        content_type=CONTENT_TYPES[file_format]
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{file_format}"'
+    )
+    return response
@@ -0,0 +1,102 @@
+"""
+Flight search table. FlightSearch keeps one row per flight with the
+names of its airports, its airplane's name and capacity and the tickets
+sold, so the flight list filters, sorts and renders from one indexed
+table instead of joining routes, airports and airplanes.
+
+Rows are written by the signals of the models they copy, in the
+transaction of the change; sold tickets by Flight.add_tickets_sold.
+After changes that bypass signals (raw SQL, queryset.update() of
+flights)
+
+    python manage.py rebuild_flight_search
+
+rewrites every row.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from airport.models import Flight, FlightSearch
+
+# FlightSearch field: Flight lookup it is copied from
+COLUMNS = {
+    "flight_id": "id",
+    "route_id": "route_id",
+    "source_id": "route__source_id",
+    "destination_id": "route__destination_id",
+    "source_name": "route__source__name",
+    "destination_name": "route__destination__name",
+    "airplane_id": "airplane_id",
+    "airplane_name": "airplane__name",
+    "capacity": "capacity",
+    "departure_time": "departure_time",
+    "arrival_time": "arrival_time",
+    "tickets_sold": "tickets_sold",
+}
+BATCH_SIZE = 1000
+
+
+def _rows(flights):
+    flights = flights.order_by().annotate(
+        capacity=F("airplane__rows") * F("airplane__seats_in_row")
+    ).values(*COLUMNS.values())
+    for flight in flights.iterator(chunk_size=BATCH_SIZE):
+        yield FlightSearch(
+            **{name: flight[lookup] for name, lookup in COLUMNS.items()}
+        )
+
+
+def _write(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            _upsert(batch)
+            batch = []
+    if batch:
+        _upsert(batch)
+
+
+def _upsert(batch):
+    FlightSearch.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=["flight"],
+        update_fields=[name for name in COLUMNS if name != "flight_id"],
+    )
+
+
+def refresh_flights(flights):
+    """Write the search rows of a Flight queryset"""
+    _write(_rows(flights))
+
+
+def airport_renamed(airport):
+    FlightSearch.objects.filter(source=airport).update(
+        source_name=airport.name
+    )
+    FlightSearch.objects.filter(destination=airport).update(
+        destination_name=airport.name
+    )
+
+
+def airplane_changed(airplane):
+    FlightSearch.objects.filter(airplane=airplane).update(
+        airplane_name=airplane.name, capacity=airplane.capacity
+    )
+
+
+def route_changed(route):
+    moved = FlightSearch.objects.filter(route=route).exclude(
+        source=route.source_id, destination=route.destination_id
+    )
+    if moved.exists():
+        refresh_flights(Flight.objects.filter(route=route))
+
+
+@transaction.atomic
+def rebuild():
+    """Rewrite the whole table, return the number of rows"""
+    FlightSearch.objects.all().delete()
+    _write(_rows(Flight.objects.all()))
+    return FlightSearch.objects.count()
@@ -0,0 +1,179 @@
+"""
+Airplane image variants. Uploads are stored as sent and the airplane
+is marked "pending"; resized copies in each of AIRPLANE_IMAGE_FORMATS
+are then made by IMAGE_TASK_BACKEND, a thread pool of this process by
+default, and recorded in Airplane.image_variants once all are written.
+
+    python manage.py process_airplane_images
+
+redoes the variants of pending or failed airplanes, e.g. after a
+restart dropped queued tasks.
+
+Images and variants are content-addressed (see airport.storage), so
+airplanes with the same image share its files; variant files are only
+deleted once no airplane with that image lists them.
+"""
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps, features
+
+from airport.models import Airplane
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIRECTORY = "uploads/airplanes/variants/"
+SAVE_OPTIONS = {
+    "webp": {"quality": 80, "method": 4},
+    "avif": {"quality": 60},
+    "jpeg": {"quality": 85, "optimize": True},
+}
+
+
+def variant_formats():
+    """Configured formats that this Pillow build can encode"""
+    return [
+        image_format for image_format in settings.AIRPLANE_IMAGE_FORMATS
+        if image_format == "jpeg" or features.check(image_format)
+    ]
+
+
+def get_storage():
+    return Airplane._meta.get_field("image").storage
+
+
+def variant_name(size_name, image_format):
+    """Name to save a variant under, before the storage hashes it"""
+    extension = "jpg" if image_format == "jpeg" else image_format
+    return f"{VARIANTS_DIRECTORY}{size_name}.{extension}"
+
+
+def make_variants(image_name):
+    """Write every variant of a stored image, return {name: path}"""
+    storage = get_storage()
+    with storage.open(image_name) as file:
+        original = Image.open(file)
+        original.load()
+    # Phone photos are often stored sideways with a rotation tag
+    original = ImageOps.exif_transpose(original)
+    has_alpha = original.mode in ("RGBA", "LA", "PA") or (
+        original.mode == "P" and "transparency" in original.info
+    )
+
+    variants = {}
+    for size_name, size in settings.AIRPLANE_IMAGE_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail(size, Image.Resampling.LANCZOS)
+        for image_format in variant_formats():
+            mode = "RGBA" if has_alpha and image_format != "jpeg" else "RGB"
+            buffer = io.BytesIO()
+            resized.convert(mode).save(
+                buffer, format=image_format.upper(),
+                **SAVE_OPTIONS.get(image_format, {})
+            )
+            variants[f"{size_name}_{image_format}"] = storage.save(
+                variant_name(size_name, image_format),
+                ContentFile(buffer.getvalue()),
+            )
+    return variants
+
+
+def delete_variants(variants, image_name):
+    """Delete variant files of image_name that no airplane lists"""
+    in_use = {
+        path
+        for listed in Airplane.objects.filter(image=image_name).values_list(
+            "image_variants", flat=True
+        )
+        for path in listed.values()
+    } if image_name else set()
+    storage = get_storage()
+    for path in set(variants.values()) - in_use:
+        storage.delete(path)
+
+
+def process_airplane_image(airplane_id, image_name):
+    """Build the variants of an airplane's image, unless it changed"""
+    try:
+        variants = make_variants(image_name)
+    except Exception:
+        logger.exception("Image variants of airplane %s failed", airplane_id)
+        Airplane.objects.filter(id=airplane_id, image=image_name).update(
+            image_status=Airplane.ImageStatus.FAILED
+        )
+        return
+    airplanes = Airplane.objects.filter(id=airplane_id, image=image_name)
+    previous = airplanes.values_list("image_variants", flat=True).first()
+    if airplanes.update(
+        image_variants=variants, image_status=Airplane.ImageStatus.READY
+    ):
+        # Variants made again for the same image replace the old files
+        delete_variants(previous or {}, image_name)
+    else:
+        # Replaced or deleted while processing
+        delete_variants(variants, image_name)
+
+
+class ImmediateBackend:
+    """Run tasks right away in the calling thread"""
+
+    def submit(self, func, *args):
+        func(*args)
+
+
+class ThreadPoolBackend:
+    """Run tasks in a pool of threads of this process"""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_TASK_WORKERS,
+            thread_name_prefix="airplane-images",
+        )
+
+    def submit(self, func, *args):
+        self.executor.submit(self._run, func, *args)
+
+    @staticmethod
+    def _run(func, *args):
+        close_old_connections()
+        try:
+            func(*args)
+        finally:
+            close_old_connections()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    path = settings.IMAGE_TASK_BACKEND
+    if _backend is None or _backend[0] != path:
+        with _backend_lock:
+            if _backend is None or _backend[0] != path:
+                _backend = (path, import_string(path)())
+    return _backend[1]
+
+
+def image_changed(airplane, previous_image, previous_variants):
+    """
+    Drop the variants of airplane's previous image and queue those of
+    the new one, once the change is committed
+    """
+    airplane_id, image_name = airplane.id, airplane.image.name
+
+    def enqueue():
+        delete_variants(previous_variants, previous_image)
+        if image_name:
+            get_backend().submit(
+                process_airplane_image, airplane_id, image_name
+            )
+
+    transaction.on_commit(enqueue)
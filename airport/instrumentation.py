@@ -0,0 +1,222 @@
+"""
+Per-request timing: query count, database time, authentication and
+serializer time and the total time of each view action, sent back as
+a Server-Timing header and logged as one JSON line to "airport.timing".
+
+RequestTimingMiddleware is removed from the middleware chain unless
+REQUEST_TIMING_ENABLED is set, and only REQUEST_TIMING_SAMPLE_RATE of
+the requests are measured. TimedViewMixin adds the authentication and
+serializer spans to DRF views; spans can overlap, queries run while
+serializing count towards both the database and the serializer time.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger("airport.timing")
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    __slots__ = (
+        "request", "start", "view", "queries", "db", "spans", "stages"
+    )
+
+    def __init__(self, request, stages=True):
+        self.request = request
+        # Whether timed() blocks record spans, or only queries count
+        self.stages = stages
+        self.start = time.perf_counter()
+        self.view = None
+        self.queries = 0
+        self.db = 0.0
+        self.spans = {}
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def metrics(self):
+        """Durations in milliseconds, by Server-Timing metric name"""
+        metrics = {"db": self.db * 1000}
+        for name, seconds in self.spans.items():
+            metrics[name] = seconds * 1000
+        metrics["total"] = (time.perf_counter() - self.start) * 1000
+        return metrics
+
+
+@contextlib.contextmanager
+def timed(name):
+    """Add the time spent in the block to the current request's span"""
+    timing = _current.get()
+    if timing is None or not timing.stages:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+def _record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.queries += 1
+        timing.db += time.perf_counter() - start
+
+
+def _install(connection):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _install_on_connect(sender, connection, **kwargs):
+    # Database connections are per thread: async views query from a
+    # worker thread, whose connections are set up here
+    _install(connection)
+
+
+def connect_query_counter():
+    connection_created.connect(
+        _install_on_connect, dispatch_uid="airport.timing"
+    )
+
+
+@contextlib.contextmanager
+def measure(request, stages=True):
+    """
+    Measure request, or yield the RequestTiming of the middleware
+    already measuring it. Without stages only the view, the queries and
+    their time are recorded.
+    """
+    timing = _current.get()
+    if timing is not None:
+        timing.stages = timing.stages or stages
+        yield timing
+        return
+    for connection in connections.all():
+        _install(connection)
+    timing = RequestTiming(request, stages)
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+
+
+def view_name(view_func, method):
+    """ViewSet.action of DRF viewsets, the function name of plain views"""
+    cls = getattr(view_func, "cls", None)
+    if cls is None:
+        return view_func.__name__
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        return f"{cls.__name__}.{actions.get(method.lower(), method)}"
+    return cls.__name__
+
+
+def name_view(request, view_func):
+    """Record the view about to handle the measured request"""
+    timing = _current.get()
+    if timing is not None and timing.view is None:
+        timing.view = view_name(view_func, request.method)
+
+
+def server_timing(timing):
+    parts = [f'db;dur={timing.db * 1000:.2f};desc="{timing.queries} queries"']
+    for name, value in timing.metrics().items():
+        if name != "db":
+            parts.append(f"{name};dur={value:.2f}")
+    return ", ".join(parts)
+
+
+class RequestTimingMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_TIMING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "REQUEST_TIMING_SAMPLE_RATE", 1)
+        connect_query_counter()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        with measure(request) as timing:
+            response = self.get_response(request)
+        return self._finish(timing, request, response)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        with measure(request) as timing:
+            response = await self.get_response(request)
+        return self._finish(timing, request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name_view(request, view_func)
+
+    def _finish(self, timing, request, response):
+        response["Server-Timing"] = server_timing(timing)
+        if logger.isEnabledFor(logging.INFO):
+            record = {
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "view": timing.view,
+                "queries": timing.queries,
+            }
+            for name, value in timing.metrics().items():
+                record[f"{name}_ms"] = round(value, 2)
+            logger.info(json.dumps(record))
+        return response
+
+
+class TimedViewMixin:
+    """
+    Time authentication of a DRF view and the output of the serializers
+    it gets from get_serializer() while its request is measured
+    """
+
+    def perform_authentication(self, request):
+        with timed("auth"):
+            super().perform_authentication(request)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        timing = _current.get()
+        if timing is not None and timing.stages:
+            # Covers .data of the serializer or of a whole list, nested
+            # serializers are part of it
+            to_representation = serializer.to_representation
+
+            def timed_representation(instance):
+                with timed("serialize"):
+                    return to_representation(instance)
+
+            serializer.to_representation = timed_representation
+        return serializer
@@ -0,0 +1,290 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+from itertools import count
+
+from django.conf import settings
+
+from airport.models import Flight, Route
+
+Leg = namedtuple(
+    "Leg",
+    "flight_id route_id source_id destination_id departure arrival distance"
+)
+
+SORT_KEYS = ("duration", "distance")
+
+_lock = threading.Lock()
+_index = None
+
+
+def _departure(leg):
+    return leg.departure
+
+
+class ItineraryIndex:
+    """
+    In-memory graph of routes and flights for connection searches.
+    Departures of each airport are kept sorted by time (as timestamps),
+    so the flights leaving within a connection window are found by
+    bisection. Updates go through the methods below and are serialized
+    by the module lock. They replace the departure lists and route sets
+    searches read instead of changing them in place, so searches read
+    without locking and see each list either before or after an update.
+    """
+
+    def __init__(self):
+        self.built_at = time.monotonic()
+        # route_id: (source_id, destination_id, distance)
+        self.routes = {}
+        # destination_id: {route_id} of routes arriving there
+        self.routes_to = defaultdict(set)
+        self.legs = {}
+        self.flights_by_route = defaultdict(set)
+        self.departures = defaultdict(list)
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        for route in Route.objects.values_list(
+            "id", "source_id", "destination_id", "distance"
+        ).iterator(chunk_size=5000):
+            index.set_route(*route)
+        for flight_id, route_id, departure_time, arrival_time in (
+            Flight.objects.values_list(
+                "id", "route_id", "departure_time", "arrival_time"
+            ).iterator(chunk_size=5000)
+        ):
+            leg = index._leg(
+                flight_id, route_id, departure_time, arrival_time
+            )
+            if leg:
+                index._add_leg(leg, sort=False)
+        # Sorting each airport once beats an insort per flight
+        for departures in index.departures.values():
+            departures.sort(key=_departure)
+        return index
+
+    def set_route(self, route_id, source_id, destination_id, distance):
+        previous = self.routes.get(route_id)
+        if previous:
+            self._discard_route_to(previous[1], route_id)
+        self.routes[route_id] = (source_id, destination_id, distance)
+        self.routes_to[destination_id] = (
+            self.routes_to[destination_id] | {route_id}
+        )
+        for flight_id in list(self.flights_by_route[route_id]):
+            leg = self.legs[flight_id]
+            self.set_flight(
+                flight_id, route_id, leg.departure, leg.arrival
+            )
+
+    def remove_route(self, route_id):
+        for flight_id in list(self.flights_by_route.pop(route_id, ())):
+            self.remove_flight(flight_id)
+        previous = self.routes.pop(route_id, None)
+        if previous:
+            self._discard_route_to(previous[1], route_id)
+
+    def _discard_route_to(self, destination_id, route_id):
+        self.routes_to[destination_id] = (
+            self.routes_to[destination_id] - {route_id}
+        )
+
+    def _leg(self, flight_id, route_id, departure_time, arrival_time):
+        route = self.routes.get(route_id)
+        if route is None:
+            return None
+        source_id, destination_id, distance = route
+        return Leg(
+            flight_id,
+            route_id,
+            source_id,
+            destination_id,
+            _timestamp(departure_time),
+            _timestamp(arrival_time),
+            distance,
+        )
+
+    def _add_leg(self, leg, sort=True):
+        self.legs[leg.flight_id] = leg
+        self.flights_by_route[leg.route_id].add(leg.flight_id)
+        if sort:
+            departures = list(self.departures[leg.source_id])
+            insort(departures, leg, key=_departure)
+            self.departures[leg.source_id] = departures
+        else:
+            # Only while building, before searches can see the index
+            self.departures[leg.source_id].append(leg)
+
+    def set_flight(self, flight_id, route_id, departure_time, arrival_time):
+        self.remove_flight(flight_id)
+        leg = self._leg(flight_id, route_id, departure_time, arrival_time)
+        if leg:
+            self._add_leg(leg)
+
+    def remove_flight(self, flight_id):
+        leg = self.legs.pop(flight_id, None)
+        if leg is None:
+            return
+        self.flights_by_route[leg.route_id].discard(flight_id)
+        departures = list(self.departures[leg.source_id])
+        departures.remove(leg)
+        self.departures[leg.source_id] = departures
+
+    def departing(self, airport_id, start, end):
+        """Legs leaving airport_id at timestamps in [start, end]"""
+        departures = self.departures.get(airport_id, ())
+        position = bisect_left(departures, start, key=_departure)
+        while position < len(departures):
+            leg = departures[position]
+            if leg.departure > end:
+                break
+            yield leg
+            position += 1
+
+    def legs_needed(self, destination_ids, max_legs):
+        """
+        Fewest legs from each airport to any of destination_ids over the
+        route graph, for airports at most max_legs away
+        """
+        needed = {airport_id: 0 for airport_id in destination_ids}
+        frontier = list(destination_ids)
+        for legs in range(1, max_legs + 1):
+            reached = []
+            for airport_id in frontier:
+                for route_id in self.routes_to.get(airport_id, ()):
+                    source_id = self.routes[route_id][0]
+                    if source_id not in needed:
+                        needed[source_id] = legs
+                        reached.append(source_id)
+            frontier = reached
+        return needed
+
+    def search(
+        self,
+        source_ids,
+        destination_ids,
+        start,
+        end,
+        max_legs=3,
+        min_connection=None,
+        max_connection=None,
+        sort="duration",
+        limit=10,
+    ):
+        """
+        Itineraries (tuples of legs) from source_ids to destination_ids
+        whose first flight departs between the start and end datetimes,
+        best first by total duration or distance.
+
+        The search is best-first over partial itineraries, so complete
+        ones come out in rank order. Like k-shortest-path searches it
+        expands each airport at most limit times; itineraries passing
+        an airport later than limit better ones are not considered.
+        """
+        if min_connection is None:
+            min_connection = settings.ITINERARY_MIN_CONNECTION
+        if max_connection is None:
+            max_connection = settings.ITINERARY_MAX_CONNECTION
+        min_connection = min_connection.total_seconds()
+        max_connection = max_connection.total_seconds()
+        destination_ids = set(destination_ids)
+        needed = self.legs_needed(destination_ids, max_legs)
+
+        def cost(legs):
+            duration = legs[-1].arrival - legs[0].departure
+            if sort == "distance":
+                return sum(leg.distance for leg in legs), duration
+            return duration, len(legs)
+
+        tie_breaker = count()
+        queue = []
+
+        def push(legs):
+            heapq.heappush(queue, (cost(legs), next(tie_breaker), legs))
+
+        for source_id in set(source_ids) - destination_ids:
+            if needed.get(source_id, max_legs + 1) > max_legs:
+                continue
+            for leg in self.departing(
+                source_id, _timestamp(start), _timestamp(end)
+            ):
+                if needed.get(leg.destination_id, max_legs) < max_legs:
+                    push((leg,))
+
+        results = []
+        expanded = defaultdict(int)
+        while queue and len(results) < limit:
+            _, _, legs = heapq.heappop(queue)
+            last = legs[-1]
+            if last.destination_id in destination_ids:
+                results.append(legs)
+                continue
+
+            expanded[last.destination_id] += 1
+            if expanded[last.destination_id] > limit:
+                continue
+
+            remaining = max_legs - len(legs)
+            visited = {legs[0].source_id}
+            visited.update(leg.destination_id for leg in legs)
+            for leg in self.departing(
+                last.destination_id,
+                last.arrival + min_connection,
+                last.arrival + max_connection,
+            ):
+                if leg.destination_id in visited:
+                    continue
+                if needed.get(leg.destination_id, remaining) < remaining:
+                    push(legs + (leg,))
+
+        return results
+
+
+def _timestamp(value):
+    return value if isinstance(value, float) else value.timestamp()
+
+
+def get_index():
+    """
+    The process-wide index, built on first use. Changes made in this
+    process are applied as they commit; the index is rebuilt after
+    ITINERARY_INDEX_MAX_AGE seconds to pick up changes of other
+    processes and bulk updates that send no signals.
+    """
+    global _index
+    index = _index
+    max_age = settings.ITINERARY_INDEX_MAX_AGE
+    if index is None or time.monotonic() - index.built_at > max_age:
+        with _lock:
+            if _index is None or _index is index:
+                _index = ItineraryIndex.build()
+            index = _index
+    return index
+
+
+def _update(method, *args):
+    with _lock:
+        if _index is not None:
+            getattr(_index, method)(*args)
+
+
+def route_saved(route_id, source_id, destination_id, distance):
+    _update("set_route", route_id, source_id, destination_id, distance)
+
+
+def route_deleted(route_id):
+    _update("remove_route", route_id)
+
+
+def flights_saved(flights):
+    """Apply (id, route_id, departure_time, arrival_time) flight rows"""
+    for flight in flights:
+        _update("set_flight", *flight)
+
+
+def flight_deleted(flight_id):
+    _update("remove_flight", flight_id)
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from airport.reservations import purge_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Delete expired seat holds, once or every --interval seconds"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep running and sweep every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            deleted = purge_expired_holds()
+            self.stdout.write(f"Expired {deleted} seat hold(s)")
+            if not interval:
+                return
+            time.sleep(interval)
@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from airport import exports
+from airport.models import Flight
+
+
+class Command(BaseCommand):
+    help = "Dump flights, tickets of a flight or a user's orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "dataset", choices=["flights", "tickets", "orders"]
+        )
+        parser.add_argument(
+            "--format", choices=sorted(exports.WRITERS), default="csv"
+        )
+        parser.add_argument(
+            "--output", help="File to write, standard output by default"
+        )
+        parser.add_argument("--flight", type=int, help="Flight of tickets")
+        parser.add_argument("--user", help="Username of orders")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=exports.CHUNK_SIZE,
+            help="Rows fetched from the database at a time",
+        )
+
+    def handle(self, *args, **options):
+        dataset = options["dataset"]
+        chunk_size = options["chunk_size"]
+
+        if dataset == "flights":
+            columns = exports.FLIGHT_COLUMNS
+            rows = exports.flight_rows(Flight.objects.all(), chunk_size)
+        elif dataset == "tickets":
+            if options["flight"] is None:
+                raise CommandError("Pass --flight for a tickets dump")
+            columns = tuple(exports.TICKET_FIELDS)
+            rows = exports.flight_ticket_rows(options["flight"], chunk_size)
+        else:
+            if options["user"] is None:
+                raise CommandError("Pass --user for an orders dump")
+            try:
+                user = get_user_model().objects.get_by_natural_key(
+                    options["user"]
+                )
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Unknown user: {options['user']}")
+            columns = tuple(exports.ORDER_FIELDS)
+            rows = exports.user_order_rows(user, chunk_size)
+
+        chunks = exports.render(options["format"], columns, rows)
+        if options["output"]:
+            with open(
+                options["output"], "w", newline="", encoding="utf-8"
+            ) as file:
+                file.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
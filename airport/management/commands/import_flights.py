@@ -0,0 +1,57 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from airport.schedule_import import READERS, ScheduleImporter
+
+
+class Command(BaseCommand):
+    help = "Import a flight schedule from a CSV or JSON Lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON Lines schedule file")
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            help="File format, guessed from the extension by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Flights inserted per batch",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"]
+        if file_format is None:
+            file_format = os.path.splitext(path)[1].lstrip(".").lower()
+            if file_format not in READERS:
+                raise CommandError(
+                    "Can't guess the file format, pass --format"
+                )
+
+        importer = ScheduleImporter(
+            batch_size=options["batch_size"],
+            progress=lambda result: self.stdout.write(
+                f"Imported {result.created} flight(s), "
+                f"{result.error_count} error(s)"
+            ),
+        )
+        try:
+            with open(path, newline="", encoding="utf-8") as file:
+                result = importer.run(READERS[file_format](file))
+        except OSError as error:
+            raise CommandError(error)
+        except UnicodeDecodeError:
+            raise CommandError(f"{path} must be UTF-8 encoded")
+
+        for error in result.errors:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.created} flight(s), "
+                f"skipped {result.error_count} invalid row(s)"
+            )
+        )
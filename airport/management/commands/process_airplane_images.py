@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from airport.images import process_airplane_image
+from airport.models import Airplane
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the image variants of airplanes whose images are pending "
+        "or failed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Redo the variants of every airplane with an image, e.g. "
+                 "after changing AIRPLANE_IMAGE_SIZES",
+        )
+
+    def handle(self, *args, **options):
+        airplanes = Airplane.objects.filter(image__gt="")
+        if not options["all"]:
+            airplanes = airplanes.filter(image_status__in=[
+                Airplane.ImageStatus.PENDING,
+                Airplane.ImageStatus.FAILED,
+            ])
+
+        count = 0
+        for airplane_id, image_name in airplanes.values_list("id", "image"):
+            process_airplane_image(airplane_id, image_name)
+            count += 1
+
+        failed = Airplane.objects.filter(
+            image_status=Airplane.ImageStatus.FAILED
+        ).count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {count} image(s), {failed} failed"
+            )
+        )
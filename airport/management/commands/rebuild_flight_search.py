@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from airport import flight_search
+
+
+class Command(BaseCommand):
+    help = "Rewrite the flight search table from the flights"
+
+    def handle(self, *args, **options):
+        count = flight_search.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {count} flight search row(s)")
+        )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from airport import flight_search
+from airport.models import Flight, Ticket
+
+
+class Command(BaseCommand):
+    help = "Recount Flight.tickets_sold from the Ticket table and fix drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report flights whose counter has drifted",
+        )
+
+    def handle(self, *args, **options):
+        sold = Ticket.objects.filter(
+            flight=OuterRef("pk")
+        ).order_by().values("flight").annotate(
+            count=Count("id")
+        ).values("count")
+
+        with transaction.atomic():
+            drifted = Flight.objects.select_for_update().annotate(
+                actual_sold=Coalesce(Subquery(sold), 0)
+            ).exclude(
+                tickets_sold=F("actual_sold")
+            ).order_by().values_list("id", "tickets_sold", "actual_sold")
+
+            drifted_ids = []
+            for flight_id, tickets_sold, actual_sold in drifted:
+                self.stdout.write(
+                    f"Flight {flight_id}: tickets_sold {tickets_sold} "
+                    f"-> {actual_sold}"
+                )
+                drifted_ids.append(flight_id)
+
+            if drifted_ids and not options["dry_run"]:
+                flights = Flight.objects.filter(id__in=drifted_ids)
+                flights.update(tickets_sold=Coalesce(Subquery(sold), 0))
+                flight_search.refresh_flights(flights)
+
+        verb = "Found" if options["dry_run"] else "Reconciled"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {len(drifted_ids)} drifted flight(s)")
+        )
@@ -0,0 +1,147 @@
+"""
+Serving MEDIA_ROOT. Responses carry an ETag and Last-Modified for
+revalidation and honour a single byte range. Content-addressed files
+(see airport.storage) never change, so they are cacheable for a year as
+immutable; other files for MEDIA_CACHE_MAX_AGE seconds.
+
+Files are sent as FileResponse, which WSGI servers providing
+wsgi.file_wrapper (gunicorn, uWSGI) hand to os.sendfile, so the bytes
+don't pass through Python.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from airport.storage import is_content_addressed
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def byte_range(header, size):
+    """
+    (start, end) of a single-range Range header, inclusive; None to send
+    the whole file, as for multiple or malformed ranges; () when no byte
+    of it is in the file
+    """
+    match = RANGE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    if not size:
+        return ()
+    start, end = match.groups()
+    if not start:
+        # The last end bytes
+        if not int(end):
+            return ()
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        return () if start >= size else None
+    return start, end
+
+
+def _read(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _with_headers(response, headers):
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stats = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404("No such file")
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404("No such file")
+
+    if is_content_addressed(path):
+        etag = '"%s"' % os.path.splitext(os.path.basename(path))[0]
+        cache_control = IMMUTABLE
+    else:
+        etag = '"%x-%x"' % (stats.st_mtime_ns, stats.st_size)
+        cache_control = f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+    last_modified = int(stats.st_mtime)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        return _with_headers(response, headers)
+
+    size = stats.st_size
+    requested = None
+    if_range = request.headers.get("If-Range")
+    if "Range" in request.headers and (
+        # A range of a changed file would be spliced into the old one
+        if_range is None
+        or if_range == etag
+        or parse_http_date_safe(if_range) == last_modified
+    ):
+        requested = byte_range(request.headers["Range"], size)
+
+    if requested == ():
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return _with_headers(response, headers)
+
+    content_type = (
+        mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    )
+    file = open(full_path, "rb")
+    if requested is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = requested
+        if end == size - 1:
+            # Through the end of the file, still sent with sendfile
+            file.seek(start)
+            response = FileResponse(
+                file, status=206, content_type=content_type
+            )
+        else:
+            response = StreamingHttpResponse(
+                _read(file, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return _with_headers(response, headers)
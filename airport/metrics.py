@@ -0,0 +1,340 @@
+"""
+In-process Prometheus metrics served at /metrics in the text format,
+when METRICS_ENABLED, to clients in METRICS_ALLOWED_NETWORKS.
+
+Each worker counts in memory. With METRICS_DIR set, workers also write
+their values to a file of their own in that directory (at most every
+METRICS_FLUSH_INTERVAL seconds and at exit) and /metrics sums the files
+of all workers, so any gunicorn worker can answer a scrape. Clear the
+directory before starting the server, like prometheus_client's
+multiprocess mode.
+"""
+import atexit
+import bisect
+import ipaddress
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.http import Http404, HttpResponse
+
+from airport.instrumentation import connect_query_counter, measure, name_view
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+_lock = threading.Lock()
+_registry = {}
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        _registry[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        _store.changed()
+
+    @staticmethod
+    def merge(value, other):
+        return value + other
+
+    def samples(self, key, value):
+        yield self.name, key, value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            # Counts per bucket (not cumulative), then the sum
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(self.buckets) + 2)
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+        _store.changed()
+
+    @staticmethod
+    def merge(value, other):
+        return [a + b for a, b in zip(value, other)]
+
+    def samples(self, key, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), value):
+            cumulative += count
+            le = "+Inf" if bound == math.inf else repr(float(bound))
+            yield f"{self.name}_bucket", key + (("le", le),), cumulative
+        yield f"{self.name}_sum", key, value[-1]
+        yield f"{self.name}_count", key, cumulative
+
+
+class FileStore:
+    """Per-worker files in METRICS_DIR, see the module docstring"""
+
+    def __init__(self):
+        self.name = self._file_name()
+        self.last_flush = 0
+
+    @staticmethod
+    def _file_name():
+        return f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+
+    def forked(self):
+        """A forked worker starts from zero in a file of its own"""
+        self.name = self._file_name()
+        self.last_flush = 0
+        for metric in _registry.values():
+            metric.values.clear()
+
+    def directory(self):
+        # Disabled metrics are never written, whatever the environment
+        if not getattr(settings, "METRICS_ENABLED", False):
+            return None
+        return getattr(settings, "METRICS_DIR", None)
+
+    def changed(self):
+        interval = getattr(settings, "METRICS_FLUSH_INTERVAL", 1)
+        if self.directory() and time.monotonic() - self.last_flush > interval:
+            self.flush()
+
+    def flush(self):
+        if not self.directory():
+            return
+        path = os.path.join(self.directory(), self.name)
+        with _lock:
+            data = {
+                name: [list(item) for item in metric.values.items()]
+                for name, metric in _registry.items()
+            }
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+        self.last_flush = time.monotonic()
+
+    def collect(self):
+        """{name: {labels: value}} summed over all workers"""
+        if not self.directory():
+            with _lock:
+                return {
+                    name: dict(metric.values)
+                    for name, metric in _registry.items()
+                }
+
+        self.flush()
+        totals = {name: {} for name in _registry}
+        for file_name in os.listdir(self.directory()):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory(), file_name)) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                # Removed or being replaced, counted on the next scrape
+                continue
+            for name, values in data.items():
+                metric = _registry.get(name)
+                if metric is None:
+                    continue
+                for key, value in values:
+                    key = tuple(key)
+                    current = totals[name].get(key)
+                    totals[name][key] = (
+                        value if current is None
+                        else metric.merge(current, value)
+                    )
+        return totals
+
+
+_store = FileStore()
+atexit.register(_store.flush)
+os.register_at_fork(after_in_child=_store.forked)
+
+
+def _escape(value):
+    return (
+        value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    )
+
+
+def _format(name, labels, value):
+    if labels:
+        label_text = ",".join(
+            f'{label}="{_escape(text)}"' for label, text in labels
+        )
+        name = f"{name}{{{label_text}}}"
+    if isinstance(value, float) and not value.is_integer():
+        return f"{name} {value!r}"
+    return f"{name} {int(value)}"
+
+
+def render():
+    lines = []
+    for name, values in sorted(_store.collect().items()):
+        metric = _registry[name]
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        if not values and not metric.labelnames and metric.kind == "counter":
+            values = {(): 0}
+        for key, value in sorted(values.items()):
+            labels = tuple(zip(metric.labelnames, key))
+            for sample, sample_labels, sample_value in metric.samples(
+                labels, value
+            ):
+                lines.append(_format(sample, sample_labels, sample_value))
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_DURATION = Histogram(
+    "airport_request_duration_seconds",
+    "Request latency by view action",
+    ("view",),
+    LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "airport_requests_total",
+    "Requests by view action and status code",
+    ("view", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "airport_request_queries",
+    "Database queries per request by view action",
+    ("view",),
+    QUERY_BUCKETS,
+)
+ORDERS_CREATED = Counter(
+    "airport_orders_created_total", "Orders created"
+)
+TICKETS_CREATED = Counter(
+    "airport_tickets_created_total", "Tickets created"
+)
+SEAT_CONFLICTS = Counter(
+    "airport_seat_conflicts_total",
+    "Bookings refused because a seat was taken, by how it was caught",
+    ("reason",),
+)
+CACHE_REQUESTS = Counter(
+    "airport_cache_requests_total",
+    "Cache lookups by cache and result",
+    ("cache", "result"),
+)
+
+
+def metrics_enabled():
+    return getattr(settings, "METRICS_ENABLED", False)
+
+
+def cache_lookups(cache, hits, misses):
+    if not metrics_enabled():
+        return
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache, result="miss")
+
+
+def orders_created(tickets):
+    if metrics_enabled():
+        ORDERS_CREATED.inc()
+        TICKETS_CREATED.inc(tickets)
+
+
+def seat_conflict(reason):
+    if metrics_enabled():
+        SEAT_CONFLICTS.inc(reason=reason)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status and query count of every request, without
+    the per-stage timers of request timing
+    """
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        connect_query_counter()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with measure(request, stages=False) as timing:
+            start = time.perf_counter()
+            response = self.get_response(request)
+        self._record(timing, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        with measure(request, stages=False) as timing:
+            start = time.perf_counter()
+            response = await self.get_response(request)
+        self._record(timing, response, time.perf_counter() - start)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name_view(request, view_func)
+
+    @staticmethod
+    def _record(timing, response, seconds):
+        view = timing.view or "unresolved"
+        REQUEST_DURATION.observe(seconds, view=view)
+        REQUESTS.inc(view=view, status=response.status_code)
+        REQUEST_QUERIES.observe(timing.queries, view=view)
+
+
+def scrape_allowed(address):
+    """Whether the client address is in METRICS_ALLOWED_NETWORKS"""
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def metrics_view(request):
+    if not metrics_enabled():
+        raise Http404
+    # The peer address: a proxy in front must be allowed, or scrape the
+    # workers directly
+    if not scrape_allowed(request.META.get("REMOTE_ADDR", "")):
+        raise PermissionDenied
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
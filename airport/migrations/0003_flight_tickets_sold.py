@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_tickets_sold(apps, schema_editor):
+    Flight = apps.get_model('airport', 'Flight')
+    Ticket = apps.get_model('airport', 'Ticket')
+    sold = Ticket.objects.filter(
+        flight=OuterRef('pk')
+    ).order_by().values('flight').annotate(count=Count('id')).values('count')
+    Flight.objects.update(tickets_sold=Coalesce(Subquery(sold), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0002_airplane_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='tickets_sold',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_tickets_sold, migrations.RunPython.noop),
+    ]
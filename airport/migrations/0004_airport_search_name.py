@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:42
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize_search_name(value):
+    value = unicodedata.normalize('NFKD', value)
+    return ''.join(
+        char for char in value if not unicodedata.combining(char)
+    ).casefold().strip()
+
+
+def fill_search_name(apps, schema_editor):
+    Airport = apps.get_model('airport', 'Airport')
+    airports = list(Airport.objects.only('id', 'name'))
+    for airport in airports:
+        airport.search_name = normalize_search_name(airport.name)
+    Airport.objects.bulk_update(airports, ['search_name'], batch_size=1000)
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS airport_airport_search_name_trgm '
+        'ON airport_airport USING gin (search_name gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS airport_airport_search_name_trgm'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0003_flight_tickets_sold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airport',
+            name='search_name',
+            field=models.CharField(
+                db_index=True, default='', editable=False, max_length=255
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0006_seathold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airplane',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], max_length=7),
+        ),
+        migrations.AddField(
+            model_name='airplane',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
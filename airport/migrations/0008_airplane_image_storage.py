@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:37
+
+import airport.models
+import airport.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0007_airplane_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='airplane',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=airport.storage.ContentAddressedStorage(), upload_to=airport.models.airplane_image_file_path),
+        ),
+    ]
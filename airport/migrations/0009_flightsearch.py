@@ -0,0 +1,70 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_flight_search(apps, schema_editor):
+    Flight = apps.get_model('airport', 'Flight')
+    FlightSearch = apps.get_model('airport', 'FlightSearch')
+    flights = Flight.objects.order_by().annotate(
+        capacity=F('airplane__rows') * F('airplane__seats_in_row')
+    ).values(
+        'id', 'route_id', 'route__source_id', 'route__destination_id',
+        'route__source__name', 'route__destination__name', 'airplane_id',
+        'airplane__name', 'capacity', 'departure_time', 'arrival_time',
+        'tickets_sold',
+    )
+    FlightSearch.objects.bulk_create(
+        (
+            FlightSearch(
+                flight_id=flight['id'],
+                route_id=flight['route_id'],
+                source_id=flight['route__source_id'],
+                destination_id=flight['route__destination_id'],
+                source_name=flight['route__source__name'],
+                destination_name=flight['route__destination__name'],
+                airplane_id=flight['airplane_id'],
+                airplane_name=flight['airplane__name'],
+                capacity=flight['capacity'],
+                departure_time=flight['departure_time'],
+                arrival_time=flight['arrival_time'],
+                tickets_sold=flight['tickets_sold'],
+            )
+            for flight in flights.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0008_airplane_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlightSearch',
+            fields=[
+                ('flight', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_row', serialize=False, to='airport.flight')),
+                ('source_name', models.CharField(max_length=255)),
+                ('destination_name', models.CharField(max_length=255)),
+                ('airplane_name', models.CharField(max_length=255)),
+                ('capacity', models.IntegerField()),
+                ('departure_time', models.DateTimeField()),
+                ('arrival_time', models.DateTimeField()),
+                ('tickets_sold', models.IntegerField(default=0)),
+                ('airplane', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='airport.airplane')),
+                ('destination', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='airport.airport')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='airport.route')),
+                ('source', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='airport.airport')),
+            ],
+            options={
+                'ordering': ['-departure_time', '-flight_id'],
+                'indexes': [models.Index(fields=['departure_time', 'flight'], name='airport_fli_departu_a3cc49_idx'), models.Index(fields=['source', 'departure_time'], name='airport_fli_source__f3f90c_idx'), models.Index(fields=['destination', 'departure_time'], name='airport_fli_destina_601de8_idx')],
+            },
+        ),
+        migrations.RunPython(fill_flight_search, migrations.RunPython.noop),
+    ]
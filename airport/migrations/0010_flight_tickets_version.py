@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0009_flightsearch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='tickets_version',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0010_flight_tickets_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='airport_ord_user_id_f7a400_idx'),
+        ),
+    ]
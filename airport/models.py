@@ -1,21 +1,49 @@
 import os
-import uuid
+import unicodedata
 
 from django.conf import settings
 from django.db import models
-from django.utils.text import slugify
+
+from airport.storage import ContentAddressedStorage
 
 
 def airplane_image_file_path(instance, filename):
-    """Generate file path for airplane image"""
+    """
+    Generate file path for airplane image, which the storage names
+    after the image's content
+    """
     _, extension = os.path.splitext(filename)
-    filename = f"{slugify(instance.name)}-{uuid.uuid4()}{extension}"
-    return os.path.join("uploads/airplanes/", filename)
+    return os.path.join("uploads/airplanes/", f"image{extension}")
+
+
+def normalize_search_name(value):
+    """Casefold and strip accents so that Kraków matches krakow"""
+    value = unicodedata.normalize("NFKD", value)
+    return "".join(
+        char for char in value if not unicodedata.combining(char)
+    ).casefold().strip()
+
+
+class AirportQuerySet(models.QuerySet):
+    def search(self, term):
+        """
+        Airports whose name contains term. PostgreSQL serves the match
+        from the trigram index on search_name; other databases scan its
+        b-tree index, which is much narrower than the table.
+        """
+        return self.filter(search_name__contains=normalize_search_name(term))
 
 
 class Airport(models.Model):
     name = models.CharField(max_length=255)
     closest_big_city = models.CharField(max_length=255)
+    search_name = models.CharField(
+        max_length=255,
+        db_index=True,
+        editable=False
+    )
+
+    objects = AirportQuerySet.as_manager()
 
     class Meta:
         ordering = ["name"]
@@ -23,6 +51,10 @@ class Airport(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_search_name(self.name)
+        super().save(*args, **kwargs)
+
 
 class Route(models.Model):
     source = models.ForeignKey(
@@ -71,6 +103,11 @@ class AirplaneType(models.Model):
 
 
 class Airplane(models.Model):
+    class ImageStatus(models.TextChoices):
+        PENDING = "pending"
+        READY = "ready"
+        FAILED = "failed"
+
     name = models.CharField(max_length=255)
     rows = models.IntegerField()
     seats_in_row = models.IntegerField()
@@ -82,7 +119,15 @@ class Airplane(models.Model):
     image = models.ImageField(
         null=True,
         blank=True,
-        upload_to=airplane_image_file_path
+        upload_to=airplane_image_file_path,
+        storage=ContentAddressedStorage()
+    )
+    # Resized copies of image by "<size>_<format>", see airport.images
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_status = models.CharField(
+        max_length=7,
+        choices=ImageStatus.choices,
+        blank=True
     )
 
     class Meta:
@@ -110,9 +155,16 @@ class Flight(models.Model):
     departure_time = models.DateTimeField()
     arrival_time = models.DateTimeField()
     crew = models.ManyToManyField(Crew, related_name="flights")
+    tickets_sold = models.IntegerField(default=0, editable=False)
+    # Bumped with every ticket change, keys the cached seat maps
+    tickets_version = models.IntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["-departure_time"]
+        indexes = [
+            models.Index(fields=["route", "departure_time"]),
+            models.Index(fields=["departure_time"]),
+        ]
 
     def __str__(self):
         return (
@@ -120,6 +172,42 @@ class Flight(models.Model):
             f"({self.departure_time})"
         )
 
+    def save(self, *args, **kwargs):
+        # The ticket counters only change through database updates, don't
+        # write back the copies loaded with this instance
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ("tickets_sold", "tickets_version")
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def tickets_available(self):
+        return self.airplane.capacity - self.tickets_sold
+
+    @classmethod
+    def add_tickets_sold(cls, flight_id, count):
+        """
+        Atomically shift the sold tickets counter of a flight and of its
+        search row
+        """
+        cls.objects.filter(id=flight_id).update(
+            tickets_sold=models.F("tickets_sold") + count,
+            tickets_version=models.F("tickets_version") + 1
+        )
+        FlightSearch.objects.filter(flight_id=flight_id).update(
+            tickets_sold=models.F("tickets_sold") + count
+        )
+
+    @classmethod
+    def tickets_changed(cls, flight_id):
+        """Mark the tickets of a flight as changed without a new sale"""
+        cls.objects.filter(id=flight_id).update(
+            tickets_version=models.F("tickets_version") + 1
+        )
+
 
 class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -131,6 +219,10 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pages of a user's orders (OrderPagination)
+            models.Index(fields=["user", "-created_at", "-id"]),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.user}"
@@ -158,3 +250,85 @@ class Ticket(models.Model):
         return (
             f"Flight {self.flight} (row: {self.row}, seat: {self.seat})"
         )
+
+
+class SeatHold(models.Model):
+    row = models.IntegerField()
+    seat = models.IntegerField()
+    flight = models.ForeignKey(
+        Flight,
+        on_delete=models.CASCADE,
+        related_name="seat_holds"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="seat_holds"
+    )
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("flight", "row", "seat")
+        ordering = ["expires_at"]
+
+    def __str__(self):
+        return (
+            f"Hold on flight {self.flight_id} (row: {self.row}, "
+            f"seat: {self.seat}) until {self.expires_at}"
+        )
+
+
+class FlightSearch(models.Model):
+    """
+    Denormalized copy of a flight with what flight lists show and
+    filter on, so they read one table. See airport.flight_search
+    """
+    flight = models.OneToOneField(
+        Flight,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_row"
+    )
+    route = models.ForeignKey(
+        Route,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    source = models.ForeignKey(
+        Airport,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False
+    )
+    destination = models.ForeignKey(
+        Airport,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False
+    )
+    source_name = models.CharField(max_length=255)
+    destination_name = models.CharField(max_length=255)
+    airplane = models.ForeignKey(
+        Airplane,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    airplane_name = models.CharField(max_length=255)
+    capacity = models.IntegerField()
+    departure_time = models.DateTimeField()
+    arrival_time = models.DateTimeField()
+    tickets_sold = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["-departure_time", "-flight_id"]
+        indexes = [
+            models.Index(fields=["departure_time", "flight"]),
+            models.Index(fields=["source", "departure_time"]),
+            models.Index(fields=["destination", "departure_time"]),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.source_name} - {self.destination_name} "
+            f"({self.departure_time})"
+        )
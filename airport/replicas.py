@@ -0,0 +1,80 @@
+"""
+Read replicas. Views list the actions that may read from a replica in
+replica_actions (ReplicaReadsMixin); while such an action handles a GET,
+ReplicaRouter sends every read to one of DATABASE_REPLICAS, picked per
+request. Other actions, writes and authentication use "default".
+
+Replicas lag behind the primary by up to REPLICA_LAG seconds. A user who
+just created an order reads from the primary for that long, so the
+order shows up in their history, and cache entries built from a replica
+expire after that long instead of outliving newer data. The pins live
+in the default cache, which has to be shared (Redis, Memcached) for
+them to hold across workers.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+_replica = ContextVar("replica", default=None)
+
+
+def cache_timeout(timeout=DEFAULT_TIMEOUT):
+    """Timeout for a cache entry built from what the request read"""
+    return settings.REPLICA_LAG if _replica.get() else timeout
+
+
+def _pin_key(user_id):
+    return f"replica-pin:{user_id}"
+
+
+def pin_to_primary(user):
+    """Serve user's reads from the primary until replicas caught up"""
+    if settings.DATABASE_REPLICAS:
+        cache.set(_pin_key(user.pk), True, settings.REPLICA_LAG)
+
+
+def is_pinned(user):
+    return bool(user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaReadsMixin:
+    """Serve the reads of replica_actions from a replica"""
+    replica_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            replicas
+            and self.action in self.replica_actions
+            and request.method in SAFE_METHODS
+            and not is_pinned(request.user)
+        ):
+            self._replica_token = _replica.set(random.choice(replicas))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            _replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,163 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from airport import metrics
+from airport.models import Flight, Order, SeatHold, Ticket
+
+
+class HoldExpired(Exception):
+    """Some of the holds expired or do not belong to the user"""
+
+    def __init__(self, hold_ids):
+        super().__init__(f"Holds are no longer active: {sorted(hold_ids)}")
+        self.hold_ids = set(hold_ids)
+
+
+class SeatTaken(Exception):
+    """Some of the requested (flight_id, row, seat) seats are not free"""
+
+    def __init__(self, seats):
+        super().__init__(f"Seats are not available: {sorted(seats)}")
+        self.seats = set(seats)
+
+
+def lock_flights(flight_ids):
+    """
+    Serialize seat changes on these flights until the transaction ends.
+    Call it first in the transaction: SQLite has no row locks, so there
+    a no-op UPDATE takes the database write lock up front instead.
+    """
+    flight_ids = sorted(set(flight_ids))
+    if connection.features.has_select_for_update:
+        list(
+            Flight.objects.select_for_update()
+            .filter(id__in=flight_ids)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+    else:
+        Flight.objects.filter(id__in=flight_ids).update(
+            tickets_sold=F("tickets_sold")
+        )
+
+
+def _seats_query(seats):
+    query = Q()
+    for flight_id, row, seat in set(seats):
+        query |= Q(flight_id=flight_id, row=row, seat=seat)
+    return query
+
+
+def sold_seats(seats):
+    """Seats of the given (flight_id, row, seat) that have a ticket"""
+    if not seats:
+        return set()
+    return set(
+        Ticket.objects.filter(_seats_query(seats)).values_list(
+            "flight_id", "row", "seat"
+        )
+    )
+
+
+def unavailable_seats(seats, user):
+    """Seats that are sold or held by someone other than user"""
+    if not seats:
+        return set()
+    held = SeatHold.objects.filter(
+        _seats_query(seats), expires_at__gt=timezone.now()
+    ).exclude(user=user).values_list("flight_id", "row", "seat")
+    return sold_seats(seats) | set(held)
+
+
+def purge_expired_holds(flight_ids=None):
+    """Delete expired holds, of the given flights only if passed"""
+    holds = SeatHold.objects.filter(expires_at__lte=timezone.now())
+    if flight_ids is not None:
+        holds = holds.filter(flight_id__in=flight_ids)
+    deleted, _ = holds.delete()
+    return deleted
+
+
+def place_holds(user, seats):
+    """Hold (flight_id, row, seat) seats for user, all or none"""
+    flight_ids = {flight_id for flight_id, _, _ in seats}
+    with transaction.atomic():
+        lock_flights(flight_ids)
+        purge_expired_holds(flight_ids)
+
+        taken = unavailable_seats(seats, user)
+        if taken:
+            raise SeatTaken(taken)
+
+        # Holding a seat again extends the user's existing hold
+        SeatHold.objects.filter(_seats_query(seats), user=user).delete()
+        expires_at = timezone.now() + settings.SEAT_HOLD_TIMEOUT
+        return SeatHold.objects.bulk_create(
+            SeatHold(
+                flight_id=flight_id,
+                row=row,
+                seat=seat,
+                user=user,
+                expires_at=expires_at
+            )
+            for flight_id, row, seat in seats
+        )
+
+
+def create_order(user, seats, hold_ids=None):
+    """
+    Create an order of user with one ticket per (flight_id, row, seat).
+    Seats held by other users are refused. With hold_ids, those holds
+    of user are consumed and must all still be active.
+    """
+    flight_ids = {flight_id for flight_id, _, _ in seats}
+    with transaction.atomic():
+        lock_flights(flight_ids)
+
+        if hold_ids is not None:
+            deleted, _ = SeatHold.objects.filter(
+                id__in=hold_ids, user=user, expires_at__gt=timezone.now()
+            ).delete()
+            if deleted != len(hold_ids):
+                raise HoldExpired(hold_ids)
+
+        taken = unavailable_seats(seats, user)
+        if taken:
+            metrics.seat_conflict("seat_taken")
+            raise SeatTaken(taken)
+
+        order = Order.objects.create(user=user)
+        tickets = [
+            Ticket(order=order, flight_id=flight_id, row=row, seat=seat)
+            for flight_id, row, seat in seats
+        ]
+        try:
+            with transaction.atomic():
+                Ticket.objects.bulk_create(tickets)
+        except IntegrityError:
+            # Only reachable if a writer skipped lock_flights
+            metrics.seat_conflict("integrity_error")
+            raise SeatTaken(seats)
+
+        sold = Counter(flight_id for flight_id, _, _ in seats)
+        for flight_id, count in sold.items():
+            Flight.add_tickets_sold(flight_id, count)
+        transaction.on_commit(lambda: metrics.orders_created(len(seats)))
+        return order
+
+
+def confirm_holds(user, hold_ids):
+    """Turn active holds of user into an order"""
+    hold_ids = set(hold_ids)
+    seats = list(
+        SeatHold.objects.filter(id__in=hold_ids, user=user).values_list(
+            "flight_id", "row", "seat"
+        )
+    )
+    if len(seats) != len(hold_ids):
+        raise HoldExpired(hold_ids)
+    return create_order(user, seats, hold_ids=hold_ids)
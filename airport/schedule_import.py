@@ -0,0 +1,192 @@
+import csv
+import json
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from airport import flight_search, itineraries
+from airport.caching import invalidate_model
+from airport.models import Route, Airplane, Crew, Flight
+
+REQUIRED_FIELDS = ("route", "airplane", "departure_time", "arrival_time")
+
+
+class RowError(Exception):
+    pass
+
+
+def read_csv(file):
+    """Yield (line number, row dict) from a CSV file with a header row"""
+    reader = csv.DictReader(file)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(file):
+    """Yield (line number, row dict) from a file of JSON objects"""
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            row = error
+        yield line_number, row
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+
+class ScheduleImporter:
+    """
+    Stream flight rows into the database in batches. Routes, airplanes
+    and crew are resolved through lookup maps loaded once, so a batch
+    costs one INSERT for flights and one for their crew, whatever its
+    size. Rows that fail validation are reported and skipped.
+
+    Columns: route (id or "Source - Destination"), airplane (id or
+    name), departure_time, arrival_time (ISO 8601) and crew (crew ids
+    or full names separated by ";").
+    """
+
+    def __init__(self, batch_size=1000, max_errors=1000, progress=None):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.progress = progress
+        self.routes = {}
+        self.airplanes = {}
+        self.crew = {}
+        for route_id, source, destination in Route.objects.values_list(
+            "id", "source__name", "destination__name"
+        ):
+            self._add_lookup(
+                self.routes, route_id, f"{source} - {destination}"
+            )
+        for airplane_id, name in Airplane.objects.values_list("id", "name"):
+            self._add_lookup(self.airplanes, airplane_id, name)
+        for crew_id, first_name, last_name in Crew.objects.values_list(
+            "id", "first_name", "last_name"
+        ):
+            self._add_lookup(self.crew, crew_id, f"{first_name} {last_name}")
+
+    @staticmethod
+    def _add_lookup(lookup, object_id, name):
+        lookup[str(object_id)] = object_id
+        # Names shared by several rows can't be resolved
+        lookup[name] = None if name in lookup else object_id
+
+    @staticmethod
+    def _resolve(lookup, value, label):
+        object_id = lookup.get(str(value).strip())
+        if object_id is None:
+            raise RowError(f"Unknown or ambiguous {label}: {value!r}")
+        return object_id
+
+    @staticmethod
+    def _datetime(value, label):
+        try:
+            parsed = parse_datetime(str(value or "").strip())
+        except (TypeError, ValueError):
+            # Well formatted but not a real date, like February 30
+            parsed = None
+        if parsed is None:
+            raise RowError(f"Invalid {label}: {value!r}")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def parse_row(self, row):
+        """Return (Flight, crew ids) for a row dict or raise RowError"""
+        if isinstance(row, Exception):
+            raise RowError(f"Invalid JSON: {row}")
+        if not isinstance(row, dict):
+            raise RowError("Row must be an object")
+        missing = [name for name in REQUIRED_FIELDS if not row.get(name)]
+        if missing:
+            raise RowError(f"Missing {', '.join(missing)}")
+
+        departure_time = self._datetime(
+            row["departure_time"], "departure_time"
+        )
+        arrival_time = self._datetime(row["arrival_time"], "arrival_time")
+        if arrival_time <= departure_time:
+            raise RowError("arrival_time must be after departure_time")
+
+        crew = row.get("crew") or []
+        if isinstance(crew, str):
+            crew = [member for member in crew.split(";") if member.strip()]
+        elif not isinstance(crew, list):
+            raise RowError(f"Invalid crew: {crew!r}")
+        crew_ids = {
+            self._resolve(self.crew, member, "crew") for member in crew
+        }
+
+        flight = Flight(
+            route_id=self._resolve(self.routes, row["route"], "route"),
+            airplane_id=self._resolve(
+                self.airplanes, row["airplane"], "airplane"
+            ),
+            departure_time=departure_time,
+            arrival_time=arrival_time,
+        )
+        return flight, crew_ids
+
+    def _error(self, result, line_number, message):
+        result.error_count += 1
+        if len(result.errors) < self.max_errors:
+            result.errors.append({"line": line_number, "error": message})
+
+    def _flush(self, batch, result):
+        with transaction.atomic():
+            flights = Flight.objects.bulk_create(
+                [flight for flight, _ in batch]
+            )
+            Flight.crew.through.objects.bulk_create(
+                Flight.crew.through(flight_id=flight.id, crew_id=crew_id)
+                for flight, (_, crew_ids) in zip(flights, batch)
+                for crew_id in crew_ids
+            )
+            # bulk_create sends no post_save signals
+            rows = [
+                (
+                    flight.id,
+                    flight.route_id,
+                    flight.departure_time,
+                    flight.arrival_time,
+                )
+                for flight in flights
+            ]
+            transaction.on_commit(lambda: itineraries.flights_saved(rows))
+            flight_search.refresh_flights(
+                Flight.objects.filter(id__in=[flight.id for flight in flights])
+            )
+            invalidate_model(Flight)
+        result.created += len(flights)
+        if self.progress:
+            self.progress(result)
+
+    def run(self, rows):
+        """Import (line number, row) pairs, see read_csv and read_jsonl"""
+        result = ImportResult()
+        batch = []
+        for line_number, row in rows:
+            try:
+                batch.append(self.parse_row(row))
+            except RowError as error:
+                self._error(result, line_number, str(error))
+                continue
+            if len(batch) >= self.batch_size:
+                self._flush(batch, result)
+                batch = []
+        if batch:
+            self._flush(batch, result)
+        return result
@@ -0,0 +1,149 @@
+"""
+Cached seat occupancy of flights, for showing taken places and
+availability. The maps are built from the Ticket table and cached under
+the flight's tickets_version, which every ticket change bumps, so a
+worker never reads a map older than the flight it loaded. Whether a
+seat can be sold is always decided by the database
+(airport.reservations).
+"""
+from django.core.cache import caches
+
+from airport import metrics
+from airport.models import Ticket
+from airport.replicas import cache_timeout
+
+CACHE_ALIAS = "seat_maps"
+
+
+class SeatMap:
+    """
+    Bitset of taken seats of a flight, one bit per (row, seat), with the
+    ticket sold for each of them
+    """
+
+    def __init__(self, rows, seats_in_row, bits=0, ticket_ids=()):
+        self.rows = rows
+        self.seats_in_row = seats_in_row
+        self.bits = bits
+        self.ticket_ids = dict(zip(self.taken_places(), ticket_ids))
+
+    @property
+    def capacity(self):
+        return self.rows * self.seats_in_row
+
+    @property
+    def taken_count(self):
+        return self.bits.bit_count()
+
+    @property
+    def available(self):
+        return self.capacity - self.taken_count
+
+    def in_range(self, row, seat):
+        return 1 <= row <= self.rows and 1 <= seat <= self.seats_in_row
+
+    def _bit(self, row, seat):
+        return 1 << ((row - 1) * self.seats_in_row + seat - 1)
+
+    def is_taken(self, row, seat):
+        return self.in_range(row, seat) and bool(
+            self.bits & self._bit(row, seat)
+        )
+
+    def take(self, row, seat, ticket_id=None):
+        if self.in_range(row, seat):
+            self.bits |= self._bit(row, seat)
+            self.ticket_ids[row, seat] = ticket_id
+
+    def release(self, row, seat):
+        if self.in_range(row, seat):
+            self.bits &= ~self._bit(row, seat)
+            self.ticket_ids.pop((row, seat), None)
+
+    def taken_places(self):
+        """Yield taken (row, seat) pairs ordered by row and seat"""
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            row, seat = divmod(lowest.bit_length() - 1, self.seats_in_row)
+            yield row + 1, seat + 1
+            bits ^= lowest
+
+    def tickets(self):
+        """Yield (ticket_id, row, seat) of taken seats, like taken_places"""
+        for row, seat in self.taken_places():
+            yield self.ticket_ids.get((row, seat)), row, seat
+
+    def to_cache(self):
+        return (
+            self.rows,
+            self.seats_in_row,
+            self.bits,
+            tuple(ticket_id for ticket_id, _, _ in self.tickets()),
+        )
+
+    @classmethod
+    def from_cache(cls, value):
+        return cls(*value)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(flight):
+    airplane = flight.airplane
+    return (
+        f"seat_map:{flight.id}:{flight.tickets_version}:"
+        f"{airplane.rows}x{airplane.seats_in_row}"
+    )
+
+
+def _new_seat_map(flight):
+    return SeatMap(flight.airplane.rows, flight.airplane.seats_in_row)
+
+
+def get_seat_map(flight):
+    """
+    Return the SeatMap of a loaded flight, building it from its tickets
+    when missing from the cache. The flight's airplane is read too, so
+    select it along with the flight.
+    """
+    cache = _cache()
+    key = _key(flight)
+    value = cache.get(key)
+    hit = value is not None
+    metrics.cache_lookups(CACHE_ALIAS, hits=int(hit), misses=int(not hit))
+    if hit:
+        return SeatMap.from_cache(value)
+
+    seat_map = _new_seat_map(flight)
+    tickets = Ticket.objects.filter(flight_id=flight.id).values_list(
+        "id", "row", "seat"
+    )
+    for ticket_id, row, seat in tickets:
+        seat_map.take(row, seat, ticket_id)
+    cache.set(key, seat_map.to_cache(), cache_timeout())
+    return seat_map
+
+
+async def aget_seat_map(flight):
+    """get_seat_map() for async views, through the async cache and ORM"""
+    cache = _cache()
+    key = _key(flight)
+    value = await cache.aget(key)
+    hit = value is not None
+    metrics.cache_lookups(CACHE_ALIAS, hits=int(hit), misses=int(not hit))
+    if hit:
+        return SeatMap.from_cache(value)
+
+    seat_map = _new_seat_map(flight)
+    # values_list() runs its query when aiterator() sets it up, outside
+    # of a worker thread; values() defers it like the async API expects
+    tickets = Ticket.objects.filter(flight_id=flight.id).values(
+        "id", "row", "seat"
+    )
+    async for ticket in tickets.aiterator():
+        seat_map.take(ticket["row"], ticket["seat"], ticket["id"])
+    await cache.aset(key, seat_map.to_cache(), cache_timeout())
+    return seat_map
@@ -1,4 +1,6 @@
-from django.db import transaction
+from operator import itemgetter
+
+from django.conf import settings
 from rest_framework import serializers
 
 from airport.models import (
@@ -9,8 +11,22 @@ from airport.models import (
     Airplane,
     Flight,
     Order,
-    Ticket
+    Ticket,
+    SeatHold
+)
+from airport.images import get_storage, variant_formats
+from airport.itineraries import SORT_KEYS
+from airport.reservations import (
+    HoldExpired,
+    SeatTaken,
+    confirm_holds,
+    create_order,
+    place_holds,
+    sold_seats,
 )
+from airport.replicas import pin_to_primary
+from airport.schedule_import import READERS
+from airport.seat_map import get_seat_map
 
 
 class AirportSerializer(serializers.ModelSerializer):
@@ -50,7 +66,36 @@ class AirplaneTypeSerializer(serializers.ModelSerializer):
         fields = ("id", "name")
 
 
+def _media_url(path, request):
+    url = get_storage().url(path)
+    return request.build_absolute_uri(url) if request else url
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URLs of the image variants, absolute like ImageField renders"""
+
+    def to_representation(self, variants):
+        request = self.context.get("request")
+        return {
+            name: _media_url(path, request)
+            for name, path in variants.items()
+        }
+
+
+class ThumbnailField(serializers.ReadOnlyField):
+    """URL of the thumbnail variant in the first available format"""
+
+    def to_representation(self, variants):
+        for image_format in variant_formats():
+            path = variants.get(f"thumbnail_{image_format}")
+            if path:
+                return _media_url(path, self.context.get("request"))
+        return None
+
+
 class AirplaneSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Airplane
         fields = (
@@ -59,8 +104,11 @@ class AirplaneSerializer(serializers.ModelSerializer):
             "rows",
             "seats_in_row",
             "airplane_type",
-            "image"
+            "image",
+            "image_status",
+            "image_variants"
         )
+        read_only_fields = ("image_status",)
 
 
 class AirplaneListSerializer(AirplaneSerializer):
@@ -69,6 +117,7 @@ class AirplaneListSerializer(AirplaneSerializer):
         read_only=True
     )
     capacity = serializers.IntegerField(read_only=True)
+    thumbnail = ThumbnailField(source="image_variants")
 
     class Meta:
         model = Airplane
@@ -79,7 +128,8 @@ class AirplaneListSerializer(AirplaneSerializer):
             "seats_in_row",
             "airplane_type",
             "capacity",
-            "image"
+            "image",
+            "thumbnail"
         )
 
 
@@ -96,14 +146,28 @@ class AirplaneDetailSerializer(AirplaneSerializer):
             "seats_in_row",
             "airplane_type",
             "capacity",
-            "image"
+            "image",
+            "image_status",
+            "image_variants"
         )
 
 
 class AirplaneImageSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Airplane
-        fields = ("id", "image")
+        fields = ("id", "image", "image_status", "image_variants")
+        read_only_fields = ("image_status",)
+        extra_kwargs = {"image": {"required": True, "allow_null": False}}
+
+    def validate_image(self, image):
+        if image.size > settings.AIRPLANE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                "Image files can't be larger than "
+                f"{settings.AIRPLANE_IMAGE_MAX_SIZE // (1024 * 1024)} MB."
+            )
+        return image
 
 
 class FlightSerializer(serializers.ModelSerializer):
@@ -141,6 +205,88 @@ class FlightListSerializer(FlightSerializer):
         )
 
 
+class ValuesSerializer:
+    """
+    Read-only fast path for list endpoints. Rows come from
+    queryset.values(*columns) and each output field is a precompiled
+    getter of the row, skipping DRF field machinery and model instances.
+    Subclasses must render exactly what their DRF serializer renders.
+    """
+    columns = ()
+    getters = ()
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.prefetch_related(None).values(*cls.columns)
+
+    @classmethod
+    def serialize(cls, rows):
+        getters = cls.getters
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+
+_datetime = serializers.DateTimeField().to_representation
+
+
+class FlightListValuesSerializer(ValuesSerializer):
+    """FlightListSerializer output from .values() rows"""
+    columns = (
+        "id",
+        "route__source__name",
+        "route__destination__name",
+        "airplane__name",
+        "airplane__rows",
+        "airplane__seats_in_row",
+        "departure_time",
+        "arrival_time",
+        "tickets_sold",
+    )
+    getters = (
+        ("id", itemgetter("id")),
+        ("route", lambda row: (
+            f"{row['route__source__name']} - "
+            f"{row['route__destination__name']}"
+        )),
+        ("airplane", itemgetter("airplane__name")),
+        ("airplane_capacity", lambda row: (
+            row["airplane__rows"] * row["airplane__seats_in_row"]
+        )),
+        ("departure_time", lambda row: _datetime(row["departure_time"])),
+        ("arrival_time", lambda row: _datetime(row["arrival_time"])),
+        ("tickets_available", lambda row: (
+            row["airplane__rows"] * row["airplane__seats_in_row"]
+            - row["tickets_sold"]
+        )),
+    )
+
+
+class FlightSearchValuesSerializer(ValuesSerializer):
+    """FlightListSerializer output from FlightSearch rows"""
+    columns = (
+        "flight_id",
+        "source_name",
+        "destination_name",
+        "airplane_name",
+        "capacity",
+        "departure_time",
+        "arrival_time",
+        "tickets_sold",
+    )
+    getters = (
+        ("id", itemgetter("flight_id")),
+        ("route", lambda row: (
+            f"{row['source_name']} - {row['destination_name']}"
+        )),
+        ("airplane", itemgetter("airplane_name")),
+        ("airplane_capacity", itemgetter("capacity")),
+        ("departure_time", lambda row: _datetime(row["departure_time"])),
+        ("arrival_time", lambda row: _datetime(row["arrival_time"])),
+        ("tickets_available", lambda row: (
+            row["capacity"] - row["tickets_sold"]
+        )),
+    )
+
+
 class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
@@ -155,11 +301,7 @@ class FlightDetailSerializer(FlightSerializer):
     route = RouteListSerializer(read_only=True)
     airplane = AirplaneListSerializer(read_only=True)
     crew = CrewSerializer(many=True, read_only=True)
-    taken_places = TicketSerializer(
-        source="tickets",
-        many=True,
-        read_only=True
-    )
+    taken_places = serializers.SerializerMethodField()
 
     class Meta:
         model = Flight
@@ -173,11 +315,112 @@ class FlightDetailSerializer(FlightSerializer):
             "taken_places"
         )
 
+    def get_taken_places(self, flight) -> list[dict]:
+        # Async views load the seat map beforehand and pass it in
+        seat_map = self.context.get("seat_map") or get_seat_map(flight)
+        return [
+            {"id": ticket_id, "row": row, "seat": seat, "flight": flight.id}
+            for ticket_id, row, seat in seat_map.tickets()
+        ]
+
+
+class FlightImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(
+        choices=sorted(READERS), required=False
+    )
+
+    def validate(self, attrs):
+        if "format" not in attrs:
+            extension = attrs["file"].name.rsplit(".", 1)[-1].lower()
+            if extension not in READERS:
+                raise serializers.ValidationError(
+                    {"format": "Can't guess the file format, pass format"}
+                )
+            attrs["format"] = extension
+        return attrs
+
+
+SEAT_TAKEN_MESSAGE = "The fields flight, row, seat must make a unique set."
+
+
+def ticket_seats(tickets):
+    return [
+        (ticket["flight"].id, ticket["row"], ticket["seat"])
+        for ticket in tickets
+    ]
+
+
+def seat_errors(seats, unavailable):
+    """
+    Per-ticket errors in the shape of a UniqueTogetherValidator failure
+    for seats that are unavailable or repeated, None if there are none
+    """
+    errors = []
+    seen = set()
+    for seat in seats:
+        if seat in unavailable or seat in seen:
+            errors.append({"non_field_errors": [SEAT_TAKEN_MESSAGE]})
+        else:
+            errors.append({})
+        seen.add(seat)
+    return errors if any(errors) else None
+
+
+def validate_ticket_seats(tickets):
+    """Reject seats that are sold or repeated, with a single query"""
+    seats = ticket_seats(tickets)
+    errors = seat_errors(seats, sold_seats(seats))
+    if errors:
+        raise serializers.ValidationError(errors)
+    return tickets
+
+
+class TicketFlightField(serializers.PrimaryKeyRelatedField):
+    """Flight of a ticket, taken from the flights its list loaded"""
+
+    def to_internal_value(self, data):
+        flights = getattr(self.parent.parent, "flights", None)
+        if flights is None:
+            return super().to_internal_value(data)
+        try:
+            return flights[int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+class TicketSeatsListSerializer(serializers.ListSerializer):
+    """Loads the flights of all tickets, with airplanes, in one query"""
+
+    def to_internal_value(self, data):
+        flight_ids = set()
+        if isinstance(data, list):
+            for ticket in data:
+                if isinstance(ticket, dict):
+                    try:
+                        flight_ids.add(int(ticket.get("flight")))
+                    except (TypeError, ValueError):
+                        pass
+        self.flights = Flight.objects.select_related("airplane").in_bulk(
+            flight_ids
+        )
+        return super().to_internal_value(data)
+
 
 class TicketSeatsSerializer(serializers.ModelSerializer):
+    flight = TicketFlightField(queryset=Flight.objects.all())
+
     class Meta:
         model = Ticket
         fields = ("row", "seat", "flight")
+        list_serializer_class = TicketSeatsListSerializer
+
+    def get_validators(self):
+        # Seat uniqueness is checked for the whole order at once in
+        # OrderSerializer.validate_tickets instead of one query per ticket.
+        return []
 
     def validate(self, data):
         flight = data.get("flight")
@@ -205,14 +448,142 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ("id", "created_at", "tickets")
 
+    def validate_tickets(self, tickets):
+        return validate_ticket_seats(tickets)
+
     def create(self, validated_data):
-        with transaction.atomic():
-            tickets_data = validated_data.pop("tickets")
-            order = Order.objects.create(**validated_data)
-            for ticket_data in tickets_data:
-                Ticket.objects.create(order=order, **ticket_data)
-            return order
+        seats = ticket_seats(validated_data["tickets"])
+        try:
+            order = create_order(validated_data["user"], seats)
+        except SeatTaken as error:
+            # Sold or held by someone else since validation
+            raise serializers.ValidationError(
+                {"tickets": seat_errors(seats, error.seats)}
+            )
+        # Replicas may not have the order yet
+        pin_to_primary(validated_data["user"])
+        return order
 
 
 class OrderListSerializer(OrderSerializer):
     tickets = TicketListSerializer(many=True, read_only=True)
+
+
+class OrderListValuesSerializer(ValuesSerializer):
+    """
+    OrderListSerializer output from .values() rows, loading the tickets
+    and flights of a whole page with one query each
+    """
+    columns = ("id", "created_at")
+
+    @classmethod
+    def serialize(cls, rows):
+        rows = list(rows)
+        tickets = list(
+            Ticket.objects.filter(
+                order_id__in=[row["id"] for row in rows]
+            ).values("id", "row", "seat", "order_id", "flight_id")
+        )
+        flights = {
+            flight["id"]: flight
+            for flight in FlightListValuesSerializer.serialize(
+                FlightListValuesSerializer.values(
+                    Flight.objects.filter(
+                        id__in={ticket["flight_id"] for ticket in tickets}
+                    )
+                )
+            )
+        }
+        order_tickets = {row["id"]: [] for row in rows}
+        for ticket in tickets:
+            order_tickets[ticket["order_id"]].append({
+                "id": ticket["id"],
+                "row": ticket["row"],
+                "seat": ticket["seat"],
+                "flight": flights[ticket["flight_id"]],
+            })
+        return [
+            {
+                "id": row["id"],
+                "created_at": _datetime(row["created_at"]),
+                "tickets": order_tickets[row["id"]],
+            }
+            for row in rows
+        ]
+
+
+class SeatHoldSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SeatHold
+        fields = ("id", "row", "seat", "flight", "expires_at")
+
+
+class SeatHoldCreateSerializer(serializers.Serializer):
+    tickets = TicketSeatsSerializer(many=True, allow_empty=False)
+
+    def validate_tickets(self, tickets):
+        return validate_ticket_seats(tickets)
+
+    def create(self, validated_data):
+        seats = ticket_seats(validated_data["tickets"])
+        try:
+            return place_holds(validated_data["user"], seats)
+        except SeatTaken as error:
+            raise serializers.ValidationError(
+                {"tickets": seat_errors(seats, error.seats)}
+            )
+
+
+class SeatHoldConfirmSerializer(serializers.Serializer):
+    holds = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False
+    )
+
+    def create(self, validated_data):
+        try:
+            order = confirm_holds(
+                validated_data["user"],
+                validated_data["holds"]
+            )
+        except HoldExpired:
+            raise serializers.ValidationError(
+                {"holds": ["Some holds expired or do not exist."]}
+            )
+        except SeatTaken:
+            raise serializers.ValidationError(
+                {"holds": ["Some held seats are no longer available."]}
+            )
+        pin_to_primary(validated_data["user"])
+        return order
+
+
+class ItinerarySearchSerializer(serializers.Serializer):
+    source = serializers.CharField()
+    destination = serializers.CharField()
+    date = serializers.DateField()
+    max_legs = serializers.IntegerField(min_value=1, max_value=4, default=3)
+    min_connection = serializers.IntegerField(
+        min_value=0,
+        required=False,
+        help_text="Minutes between legs, ITINERARY_MIN_CONNECTION if unset"
+    )
+    sort = serializers.ChoiceField(choices=SORT_KEYS, default="duration")
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class ItineraryLegSerializer(serializers.Serializer):
+    flight = serializers.IntegerField()
+    source = serializers.CharField()
+    destination = serializers.CharField()
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    distance = serializers.IntegerField()
+
+
+class ItinerarySerializer(serializers.Serializer):
+    legs = ItineraryLegSerializer(many=True)
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    duration = serializers.IntegerField(help_text="Minutes")
+    distance = serializers.IntegerField()
@@ -0,0 +1,154 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from airport import flight_search, images, itineraries
+from airport.authentication import user_cache
+from airport.caching import invalidate_model
+from airport.models import (
+    Airport,
+    Route,
+    Crew,
+    AirplaneType,
+    Airplane,
+    Flight,
+    Ticket
+)
+
+
+@receiver(pre_save, sender=Ticket)
+def remember_ticket_flight(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_flight_id = (
+            Ticket.objects.filter(pk=instance.pk)
+            .values_list("flight_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Ticket)
+def take_ticket_seat(sender, instance, created, **kwargs):
+    if created:
+        Flight.add_tickets_sold(instance.flight_id, 1)
+        return
+    previous_flight_id = getattr(instance, "_previous_flight_id", None)
+    if previous_flight_id not in (None, instance.flight_id):
+        Flight.add_tickets_sold(previous_flight_id, -1)
+        Flight.add_tickets_sold(instance.flight_id, 1)
+    else:
+        # The seat may have moved
+        Flight.tickets_changed(instance.flight_id)
+
+
+@receiver(post_delete, sender=Ticket)
+def release_ticket_seat(sender, instance, **kwargs):
+    Flight.add_tickets_sold(instance.flight_id, -1)
+
+
+@receiver(post_save, sender=Flight)
+def update_itinerary_flight(sender, instance, **kwargs):
+    flights = [(
+        instance.id,
+        instance.route_id,
+        instance.departure_time,
+        instance.arrival_time,
+    )]
+    transaction.on_commit(lambda: itineraries.flights_saved(flights))
+
+
+@receiver(post_delete, sender=Flight)
+def remove_itinerary_flight(sender, instance, **kwargs):
+    flight_id = instance.id
+    transaction.on_commit(lambda: itineraries.flight_deleted(flight_id))
+
+
+@receiver(post_save, sender=Route)
+def update_itinerary_route(sender, instance, **kwargs):
+    route = (
+        instance.id,
+        instance.source_id,
+        instance.destination_id,
+        instance.distance,
+    )
+    transaction.on_commit(lambda: itineraries.route_saved(*route))
+
+
+@receiver(post_delete, sender=Route)
+def remove_itinerary_route(sender, instance, **kwargs):
+    route_id = instance.id
+    transaction.on_commit(lambda: itineraries.route_deleted(route_id))
+
+
+@receiver(post_save, sender=Flight)
+def refresh_flight_search_row(sender, instance, **kwargs):
+    flight_search.refresh_flights(Flight.objects.filter(id=instance.id))
+
+
+@receiver(post_save, sender=Route)
+def refresh_route_search_rows(sender, instance, created, **kwargs):
+    if not created:
+        flight_search.route_changed(instance)
+
+
+@receiver(post_save, sender=Airport)
+def rename_airport_search_rows(sender, instance, created, **kwargs):
+    if not created:
+        flight_search.airport_renamed(instance)
+
+
+@receiver(post_save, sender=Airplane)
+def refresh_airplane_search_rows(sender, instance, created, **kwargs):
+    if not created:
+        flight_search.airplane_changed(instance)
+
+
+@receiver(pre_save, sender=Airplane)
+def remember_airplane_image(sender, instance, **kwargs):
+    previous = {"image": "", "image_variants": {}}
+    if instance.pk:
+        previous = Airplane.objects.filter(pk=instance.pk).values(
+            "image", "image_variants"
+        ).first() or previous
+    image = instance.image
+    # An uncommitted file is a new upload, stored after this signal
+    if (image and not image._committed) or (
+        (image.name or "") != (previous["image"] or "")
+    ):
+        instance._previous_image = previous
+        instance.image_variants = {}
+        instance.image_status = (
+            Airplane.ImageStatus.PENDING if image else ""
+        )
+
+
+@receiver(post_save, sender=Airplane)
+def queue_airplane_image_variants(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_image", None)
+    if previous is not None:
+        del instance._previous_image
+        images.image_changed(
+            instance, previous["image"], previous["image_variants"]
+        )
+
+
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+@receiver(post_save, sender=Crew)
+@receiver(post_delete, sender=Crew)
+@receiver(post_save, sender=AirplaneType)
+@receiver(post_delete, sender=AirplaneType)
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate_model(sender)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_id = instance.pk
+    user_cache.invalidate_user(user_id)
+    transaction.on_commit(lambda: user_cache.invalidate_user(user_id))
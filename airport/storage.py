@@ -0,0 +1,58 @@
+"""
+Content-addressed file storage: a saved file is named after the SHA-256
+of its bytes, in the directory and with the extension of the name it was
+saved under,
+
+    uploads/airplanes/plane.png -> uploads/airplanes/3f/3f9a...c2.png
+
+so the same upload is stored once, and a name never changes content,
+which lets airport.media serve such files as immutable.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}(\.\w+)?$")
+
+
+def is_content_addressed(name):
+    return bool(HASHED_NAME.match(posixpath.basename(name)))
+
+
+def file_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        directory, filename = posixpath.split(name.replace("\\", "/"))
+        _, extension = os.path.splitext(filename)
+        digest = file_digest(content)
+        name = posixpath.join(
+            directory, digest[:2], f"{digest}{extension.lower()}"
+        )
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # A stored file of that name has the same content
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        # Written aside and renamed, so the name never shows a partial file
+        partial = super()._save(f"{name}.{uuid.uuid4().hex}.part", content)
+        os.replace(self.path(partial), self.path(name))
+        return name
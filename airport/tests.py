@@ -1,25 +1,107 @@
+import copy
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
+from unittest import addModuleCleanup, skipUnless
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from asgiref.sync import sync_to_async
+from PIL import Image
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 
 from airport.models import (
     Airport,
     Route,
+    Crew,
     AirplaneType,
     Airplane,
     Flight,
+    FlightSearch,
     Order,
+    Ticket,
+    SeatHold,
+)
+from airport import images, itineraries, metrics, replicas
+from airport.authentication import user_cache
+from airport.instrumentation import measure, timed
+from airport.reservations import SeatTaken, create_order
+from airport.throttling import (
+    SlidingWindowUserThrottle,
+    SQLiteStore,
+    get_store,
 )
-from airport.serializers import AirportSerializer
+from airport import seat_map as seat_maps
+from airport.seat_map import SeatMap, get_seat_map
+from airport.serializers import (
+    AirportSerializer,
+    FlightListSerializer,
+    FlightListValuesSerializer,
+    OrderListSerializer,
+    OrderListValuesSerializer,
+)
+from airport.views import FlightViewSet, OrderPagination
 
 AIRPORT_URL = reverse("airport:airport-list")
 AIRPLANE_URL = reverse("airport:airplane-list")
+ROUTE_URL = reverse("airport:route-list")
 FLIGHT_URL = reverse("airport:flight-list")
 ORDER_URL = reverse("airport:order-list")
+SEAT_HOLD_URL = reverse("airport:seathold-list")
+SEAT_HOLD_CONFIRM_URL = reverse("airport:seathold-confirm")
+ITINERARY_URL = reverse("airport:itinerary-list")
+FLIGHT_IMPORT_URL = reverse("airport:flight-bulk-import")
+
+
+def export_url(name, file_format, **kwargs):
+    return reverse(
+        f"airport:{name}", kwargs={"file_format": file_format, **kwargs}
+    )
+
+
+def flight_detail_url(flight_id):
+    return reverse("airport:flight-detail", args=[flight_id])
+
+
+def setUpModule():
+    # Throttle counters of the test run, apart from the server's file
+    directory = tempfile.mkdtemp()
+    throttle_path = override_settings(
+        THROTTLE_SQLITE_PATH=os.path.join(directory, "throttle.sqlite3")
+    )
+    throttle_path.enable()
+    addModuleCleanup(shutil.rmtree, directory)
+    addModuleCleanup(throttle_path.disable)
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return " ".join(str(row) for row in cursor.fetchall())
+
+
+def reset_itinerary_index():
+    with itineraries._lock:
+        itineraries._index = None
 
 
 def sample_airport(**params):
@@ -150,6 +232,7 @@ class FlightTests(TestCase):
             password="testpass123",
         )
         self.client.force_authenticate(self.user)
+        caches["departures"].clear()
 
     def test_list_flights(self):
         sample_flight()
@@ -177,6 +260,77 @@ class FlightTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data["results"]), 1)
 
+    def test_filter_flights_by_destination_ignores_case_and_accents(self):
+        krakow = sample_airport(name="Kraków Balice")
+        warsaw = sample_airport(name="Warsaw")
+        sample_flight(route=sample_route(source=warsaw, destination=krakow))
+        sample_flight(route=sample_route(source=krakow, destination=warsaw))
+
+        res = self.client.get(FLIGHT_URL, {"destination": "KRAKOW"})
+
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["route"], str(
+            Route.objects.get(destination=krakow)
+        ))
+
+    @override_settings(TIME_ZONE="Europe/Warsaw")
+    def test_filter_flights_by_date_in_time_zone(self):
+        # 23:30 UTC on 31 Dec is already 1 Jan in Warsaw
+        late = datetime(2030, 12, 31, 23, 30, tzinfo=dt_timezone.utc)
+        sample_flight(departure_time=late, arrival_time=late)
+        sample_flight(
+            departure_time=late - timedelta(hours=1),
+            arrival_time=late
+        )
+
+        res = self.client.get(FLIGHT_URL, {"date": "2031-01-01"})
+
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_filter_flights_by_invalid_date(self):
+        res = self.client.get(FLIGHT_URL, {"date": "01.01.2031"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite query plan")
+    def test_flight_date_and_route_filters_use_indexes(self):
+        day_start = datetime(2031, 1, 1, tzinfo=dt_timezone.utc)
+        day_end = day_start + timedelta(days=1)
+        by_date = Flight.objects.filter(
+            departure_time__gte=day_start,
+            departure_time__lt=day_end
+        )
+
+        self.assertIn(
+            "USING INDEX airport_fli_departu_abe547_idx",
+            query_plan(by_date)
+        )
+        self.assertIn(
+            "USING INDEX airport_fli_route_i_baa295_idx",
+            query_plan(by_date.filter(route_id__in=[1, 2]))
+        )
+
+    def test_filter_flights_by_source_substring(self):
+        warsaw = sample_airport(name="Warsaw Chopin")
+        sample_flight(route=sample_route(source=warsaw))
+        sample_flight()
+
+        res = self.client.get(FLIGHT_URL, {"source": "CHOP"})
+
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(
+            [airport.name for airport in Airport.objects.search("saw")],
+            ["Warsaw Chopin"]
+        )
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite query plan")
+    def test_airport_search_uses_index(self):
+        plan = query_plan(
+            Airport.objects.search("war").order_by().values("id")
+        )
+
+        self.assertIn("COVERING INDEX airport_airport_search_name", plan)
+
 
 class OrderTests(TestCase):
     def setUp(self):
@@ -202,6 +356,76 @@ class OrderTests(TestCase):
         order = Order.objects.get(id=res.data["id"])
         self.assertEqual(order.tickets.count(), 2)
 
+    def test_create_order_with_taken_seat(self):
+        flight = sample_flight()
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(row=1, seat=1, flight=flight, order=order)
+        payload = {
+            "tickets": [
+                {"row": 1, "seat": 2, "flight": flight.id},
+                {"row": 1, "seat": 1, "flight": flight.id},
+            ]
+        }
+
+        res = self.client.post(ORDER_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["tickets"][0], {})
+        self.assertIn("non_field_errors", res.data["tickets"][1])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_create_order_with_duplicate_seat(self):
+        flight = sample_flight()
+        payload = {
+            "tickets": [
+                {"row": 2, "seat": 3, "flight": flight.id},
+                {"row": 2, "seat": 3, "flight": flight.id},
+            ]
+        }
+
+        res = self.client.post(ORDER_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+
+    def test_create_order_inserts_tickets_in_one_query(self):
+        flight = sample_flight()
+        payload = {
+            "tickets": [
+                {"row": 1 + i // 6, "seat": 1 + i % 6, "flight": flight.id}
+                for i in range(40)
+            ]
+        }
+
+        # Flights are loaded once for the order, not once per ticket
+        with self.assertNumQueries(14):
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(ORDER_URL, payload, format="json")
+
+        inserts = [
+            query["sql"] for query in queries
+            if query["sql"].startswith('INSERT INTO "airport_ticket"')
+        ]
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Ticket.objects.count(), 40)
+
+    def test_create_order_with_unknown_flight(self):
+        flight = sample_flight()
+        payload = {
+            "tickets": [
+                {"row": 1, "seat": 1, "flight": flight.id},
+                {"row": 1, "seat": 2, "flight": flight.id + 1},
+            ]
+        }
+
+        res = self.client.post(ORDER_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["tickets"][0], {})
+        self.assertIn("flight", res.data["tickets"][1])
+        self.assertFalse(Order.objects.exists())
+
     def test_list_orders_for_user(self):
         Order.objects.create(user=self.user)
 
@@ -215,3 +439,1857 @@ class OrderTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data["count"], 1)
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite query plan")
+    def test_order_keyset_pages_use_index(self):
+        keyset = OrderPagination.keyset
+        orders = Order.objects.filter(user=self.user).order_by(*keyset)
+        after = OrderPagination._after(keyset, [timezone.now(), 10])
+
+        for queryset in (orders, orders.filter(after)):
+            plan = query_plan(queryset)
+            self.assertIn("INDEX airport_ord_user_id_f7a400_idx", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+
+class SeatMapTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        caches["seat_maps"].clear()
+
+    def test_seat_map_bits(self):
+        seat_map = SeatMap(rows=3, seats_in_row=4)
+        seat_map.take(3, 4)
+        seat_map.take(1, 2)
+        seat_map.take(5, 1)
+
+        self.assertTrue(seat_map.is_taken(1, 2))
+        self.assertFalse(seat_map.is_taken(2, 2))
+        self.assertEqual(list(seat_map.taken_places()), [(1, 2), (3, 4)])
+        self.assertEqual(seat_map.available, 10)
+
+        seat_map.release(1, 2)
+        self.assertEqual(list(seat_map.taken_places()), [(3, 4)])
+
+    def test_ticket_changes_bump_seat_map_version(self):
+        flight = sample_flight()
+        self.assertEqual(get_seat_map(flight).taken_count, 0)
+        payload = {"tickets": [{"row": 2, "seat": 3, "flight": flight.id}]}
+
+        res = self.client.post(ORDER_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        # The map cached before the sale is never read again
+        self.assertEqual(get_seat_map(flight).taken_count, 0)
+        flight.refresh_from_db()
+        self.assertEqual(list(get_seat_map(flight).taken_places()), [(2, 3)])
+
+        ticket = Ticket.objects.get(flight=flight)
+        ticket.seat = 4
+        ticket.save()
+        flight.refresh_from_db()
+        self.assertEqual(list(get_seat_map(flight).taken_places()), [(2, 4)])
+
+        Order.objects.get(user=self.user).delete()
+        flight.refresh_from_db()
+        self.assertEqual(get_seat_map(flight).taken_count, 0)
+
+    def test_flight_save_keeps_ticket_counters(self):
+        flight = sample_flight()
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(row=1, seat=1, flight=flight, order=order)
+
+        flight.save()
+
+        flight.refresh_from_db()
+        self.assertEqual(flight.tickets_sold, 1)
+        self.assertEqual(flight.tickets_version, 1)
+
+    def test_flight_detail_taken_places(self):
+        flight = sample_flight()
+        order = Order.objects.create(user=self.user)
+        ticket = Ticket.objects.create(
+            row=2, seat=3, flight=flight, order=order
+        )
+
+        res = self.client.get(flight_detail_url(flight.id))
+
+        self.assertEqual(
+            res.data["taken_places"],
+            [{"id": ticket.id, "row": 2, "seat": 3, "flight": flight.id}]
+        )
+
+    def test_seat_validation_ignores_stale_seat_map(self):
+        flight = sample_flight()
+        order = Order.objects.create(user=self.user)
+        ticket = Ticket.objects.create(
+            row=1, seat=1, flight=flight, order=order
+        )
+        flight.refresh_from_db()
+        # Maps that disagree with the tickets must not decide the sale
+        stale = get_seat_map(flight)
+        stale.release(1, 1)
+        caches["seat_maps"].set(seat_maps._key(flight), stale.to_cache())
+        payload = {"tickets": [{"row": 1, "seat": 1, "flight": flight.id}]}
+
+        res = self.client.post(ORDER_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        ticket.delete()
+        flight.refresh_from_db()
+        stale.take(1, 1)
+        caches["seat_maps"].set(seat_maps._key(flight), stale.to_cache())
+
+        res = self.client.post(ORDER_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_list_flights_tickets_available(self):
+        flight = sample_flight()
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(row=1, seat=1, flight=flight, order=order)
+
+        res = self.client.get(FLIGHT_URL)
+
+        self.assertEqual(res.data["results"][0]["tickets_available"], 119)
+
+    def test_create_order_row_out_of_range(self):
+        flight = sample_flight()
+        payload = {"tickets": [{"row": 21, "seat": 1, "flight": flight.id}]}
+
+        res = self.client.post(ORDER_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TicketsSoldTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_order_create_and_delete_update_counter(self):
+        flight = sample_flight()
+        payload = {
+            "tickets": [
+                {"row": 1, "seat": 1, "flight": flight.id},
+                {"row": 1, "seat": 2, "flight": flight.id},
+            ]
+        }
+
+        res = self.client.post(ORDER_URL, payload, format="json")
+        flight.refresh_from_db()
+        self.assertEqual(flight.tickets_sold, 2)
+
+        Order.objects.get(id=res.data["id"]).delete()
+        flight.refresh_from_db()
+        self.assertEqual(flight.tickets_sold, 0)
+
+    def test_flight_list_does_not_join_tickets(self):
+        sample_flight()
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(FLIGHT_URL)
+
+        self.assertEqual(res.data["results"][0]["tickets_available"], 120)
+        for query in queries:
+            self.assertNotIn('"airport_ticket"', query["sql"])
+
+    def test_reconcile_tickets_sold(self):
+        flight = sample_flight()
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(row=1, seat=1, flight=flight, order=order)
+        Flight.objects.filter(id=flight.id).update(tickets_sold=5)
+
+        call_command("reconcile_tickets_sold", stdout=StringIO())
+
+        flight.refresh_from_db()
+        self.assertEqual(flight.tickets_sold, 1)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        route = sample_route()
+        airplane = sample_airplane()
+        departure = timezone.now() + timedelta(days=1)
+        self.flights = [
+            sample_flight(
+                route=route,
+                airplane=airplane,
+                # Pairs of flights share a departure time
+                departure_time=departure + timedelta(hours=i // 2),
+                arrival_time=departure + timedelta(hours=i // 2 + 2),
+            )
+            for i in range(25)
+        ]
+
+    def ids(self, res):
+        return [flight["id"] for flight in res.data["results"]]
+
+    def test_cursor_pages_follow_keyset_order(self):
+        expected = list(
+            Flight.objects.order_by(
+                "-departure_time", "-id"
+            ).values_list("id", flat=True)
+        )
+
+        res = self.client.get(FLIGHT_URL, {"cursor": ""})
+        self.assertNotIn("count", res.data)
+        self.assertIsNone(res.data["previous"])
+        seen = self.ids(res)
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            seen += self.ids(res)
+
+        self.assertEqual(seen, expected)
+
+    def test_cursor_page_is_stable_under_inserts(self):
+        first = self.client.get(FLIGHT_URL, {"cursor": ""})
+        second = self.client.get(first.data["next"])
+
+        # A new flight sorting before the current page
+        sample_flight(departure_time=timezone.now() + timedelta(days=30))
+
+        again = self.client.get(first.data["next"])
+        self.assertEqual(self.ids(again), self.ids(second))
+
+        previous = self.client.get(second.data["previous"])
+        self.assertEqual(self.ids(previous), self.ids(first))
+
+    def test_invalid_cursor(self):
+        res = self.client.get(FLIGHT_URL, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_pagination_still_works(self):
+        res = self.client.get(FLIGHT_URL, {"page": 3})
+
+        self.assertEqual(res.data["count"], 25)
+        self.assertEqual(len(res.data["results"]), 5)
+
+    def test_order_cursor_pagination(self):
+        orders = [Order.objects.create(user=self.user) for _ in range(12)]
+
+        res = self.client.get(ORDER_URL, {"cursor": "", "page_size": 5})
+        self.assertEqual(
+            [order["id"] for order in res.data["results"]],
+            [order.id for order in reversed(orders)][:5]
+        )
+        self.assertIn("page_size=5", res.data["next"])
+
+
+class SeatHoldTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.other_client = APIClient()
+        self.other_client.force_authenticate(
+            get_user_model().objects.create_user(
+                username="otheruser",
+                password="testpass123",
+            )
+        )
+        self.client.force_authenticate(self.user)
+        self.flight = sample_flight()
+        self.payload = {
+            "tickets": [
+                {"row": 3, "seat": 1, "flight": self.flight.id},
+                {"row": 3, "seat": 2, "flight": self.flight.id},
+            ]
+        }
+
+    def test_hold_and_confirm(self):
+        res = self.client.post(SEAT_HOLD_URL, self.payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        hold_ids = [hold["id"] for hold in res.data]
+
+        res = self.client.post(
+            SEAT_HOLD_CONFIRM_URL, {"holds": hold_ids}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get(id=res.data["id"])
+        self.assertEqual(order.tickets.count(), 2)
+        self.assertFalse(SeatHold.objects.exists())
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.tickets_sold, 2)
+
+    def test_held_seat_is_unavailable_to_others(self):
+        self.client.post(SEAT_HOLD_URL, self.payload, format="json")
+
+        hold = self.other_client.post(
+            SEAT_HOLD_URL, self.payload, format="json"
+        )
+        order = self.other_client.post(ORDER_URL, self.payload, format="json")
+
+        self.assertEqual(hold.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(order.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            order.data["tickets"][0]["non_field_errors"][0],
+            "The fields flight, row, seat must make a unique set."
+        )
+
+    def test_expired_hold(self):
+        res = self.client.post(SEAT_HOLD_URL, self.payload, format="json")
+        hold_ids = [hold["id"] for hold in res.data]
+        SeatHold.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        other = self.other_client.post(
+            SEAT_HOLD_URL, self.payload, format="json"
+        )
+        confirm = self.client.post(
+            SEAT_HOLD_CONFIRM_URL, {"holds": hold_ids}, format="json"
+        )
+
+        self.assertEqual(other.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(confirm.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expire_seat_holds_command(self):
+        self.client.post(SEAT_HOLD_URL, self.payload, format="json")
+        SeatHold.objects.filter(row=3, seat=1).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        call_command("expire_seat_holds", stdout=StringIO())
+
+        self.assertEqual(SeatHold.objects.count(), 1)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        caches["responses"].clear()
+
+    def test_list_is_served_from_cache(self):
+        sample_airport()
+        first = self.client.get(AIRPORT_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(AIRPORT_URL)
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(second.data, first.data)
+
+    def test_change_invalidates_cached_list(self):
+        self.client.get(AIRPORT_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                AIRPORT_URL,
+                {"name": "New Airport", "closest_big_city": "New City"}
+            )
+        res = self.client.get(AIRPORT_URL)
+
+        self.assertEqual(res.data["count"], 1)
+
+    def test_airport_change_invalidates_route_list(self):
+        airport = sample_airport(name="Old Name")
+        sample_route(source=airport)
+        self.client.get(ROUTE_URL)
+
+        airport.name = "New Name"
+        airport.save()
+        res = self.client.get(ROUTE_URL)
+
+        self.assertEqual(res.data["results"][0]["source"], "New Name")
+
+    def test_culled_version_does_not_revive_cached_list(self):
+        self.client.get(AIRPORT_URL)
+        sample_airport()
+        caches["responses"].delete("response-version:airport.airport")
+
+        res = self.client.get(AIRPORT_URL)
+
+        self.assertEqual(res.data["count"], 1)
+
+    def test_if_none_match_returns_not_modified(self):
+        res = self.client.get(AIRPORT_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(
+                AIRPORT_URL, HTTP_IF_NONE_MATCH=res["ETag"]
+            )
+
+        self.assertEqual(
+            not_modified.status_code, status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(len(queries), 0)
+
+        sample_airport()
+        modified = self.client.get(
+            AIRPORT_URL, HTTP_IF_NONE_MATCH=res["ETag"]
+        )
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+
+
+@override_settings(TIME_ZONE="Europe/Warsaw")
+class ValuesSerializerTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.flights = [sample_flight(), sample_flight()]
+        first_order = Order.objects.create(user=self.user)
+        second_order = Order.objects.create(user=self.user)
+        Ticket.objects.create(
+            row=1, seat=1, flight=self.flights[0], order=first_order
+        )
+        Ticket.objects.create(
+            row=1, seat=2, flight=self.flights[1], order=second_order
+        )
+        Ticket.objects.create(
+            row=2, seat=1, flight=self.flights[0], order=second_order
+        )
+
+    def assertSameJson(self, fast, slow):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(fast), renderer.render(slow))
+
+    def test_flight_list_output_is_identical(self):
+        queryset = FlightViewSet.queryset
+
+        self.assertSameJson(
+            FlightListValuesSerializer.serialize(
+                FlightListValuesSerializer.values(queryset)
+            ),
+            FlightListSerializer(queryset, many=True).data
+        )
+
+    def test_order_list_output_is_identical(self):
+        queryset = Order.objects.all()
+
+        self.assertSameJson(
+            OrderListValuesSerializer.serialize(
+                OrderListValuesSerializer.values(queryset)
+            ),
+            OrderListSerializer(queryset, many=True).data
+        )
+
+
+class QueryCountTests(TestCase):
+    """Every endpoint runs the same number of queries at any data size"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+
+    def seed(self, size):
+        """Add size rows of everything, orders with size tickets each"""
+        airplane_type = sample_airplane_type()
+        crew = [
+            Crew.objects.create(first_name="Crew", last_name=str(i))
+            for i in range(size)
+        ]
+        for i in range(size):
+            flight = sample_flight(
+                route=sample_route(
+                    source=sample_airport(name=f"Source {i}"),
+                    destination=sample_airport(name=f"Destination {i}"),
+                ),
+                airplane=sample_airplane(airplane_type=airplane_type),
+            )
+            flight.crew.set(crew)
+            order = Order.objects.create(user=self.user)
+            Ticket.objects.bulk_create(
+                Ticket(order=order, flight=flight, row=1, seat=seat)
+                for seat in range(1, size + 1)
+            )
+            SeatHold.objects.create(
+                flight=flight,
+                row=2,
+                seat=1,
+                user=self.user,
+                expires_at=timezone.now() + timedelta(minutes=5)
+            )
+        return flight, order
+
+    def count_queries(self, url):
+        # Measure the database path, not the response and seat map caches
+        caches["responses"].clear()
+        caches["seat_maps"].clear()
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def assertConstantQueries(self, expected, url_for):
+        flight, order = self.seed(1)
+        small = self.count_queries(url_for(flight, order))
+        flight, order = self.seed(4)
+        large = self.count_queries(url_for(flight, order))
+
+        self.assertEqual(small, large)
+        self.assertEqual(large, expected)
+
+    def test_airport_list(self):
+        self.assertConstantQueries(2, lambda flight, order: AIRPORT_URL)
+
+    def test_route_list(self):
+        self.assertConstantQueries(2, lambda flight, order: ROUTE_URL)
+
+    def test_route_detail(self):
+        self.assertConstantQueries(1, lambda flight, order: reverse(
+            "airport:route-detail", args=[flight.route_id]
+        ))
+
+    def test_crew_list(self):
+        self.assertConstantQueries(
+            2, lambda flight, order: reverse("airport:crew-list")
+        )
+
+    def test_airplane_type_list(self):
+        self.assertConstantQueries(
+            2, lambda flight, order: reverse("airport:airplanetype-list")
+        )
+
+    def test_airplane_list(self):
+        self.assertConstantQueries(2, lambda flight, order: AIRPLANE_URL)
+
+    def test_airplane_detail(self):
+        self.assertConstantQueries(1, lambda flight, order: reverse(
+            "airport:airplane-detail", args=[flight.airplane_id]
+        ))
+
+    def test_flight_list(self):
+        self.assertConstantQueries(2, lambda flight, order: FLIGHT_URL)
+
+    def test_flight_detail(self):
+        self.assertConstantQueries(
+            3, lambda flight, order: flight_detail_url(flight.id)
+        )
+
+    def test_order_list(self):
+        self.assertConstantQueries(4, lambda flight, order: ORDER_URL)
+
+    def test_order_detail(self):
+        self.assertConstantQueries(2, lambda flight, order: reverse(
+            "airport:order-detail", args=[order.id]
+        ))
+
+    def test_seat_hold_list(self):
+        self.assertConstantQueries(2, lambda flight, order: SEAT_HOLD_URL)
+
+
+class ScheduleImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            username="admin",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.admin)
+        self.route = sample_route()
+        self.airplane = sample_airplane(name="Boeing 737")
+        self.pilot = Crew.objects.create(first_name="Anna", last_name="Nowak")
+        self.steward = Crew.objects.create(first_name="Jan", last_name="Kos")
+
+    def test_import_csv_command(self):
+        rows = [
+            "route,airplane,departure_time,arrival_time,crew",
+            f"{self.route.id},Boeing 737,2030-01-01T10:00:00Z,"
+            f"2030-01-01T12:00:00Z,{self.pilot.id};Jan Kos",
+            "Source Airport - Destination Airport,"
+            f"{self.airplane.id},2030-01-02T10:00,2030-01-02T12:00,",
+            "999,Boeing 737,2030-01-03T10:00Z,2030-01-03T12:00Z,",
+            f"{self.route.id},Boeing 737,2030-01-04T12:00Z,"
+            "2030-01-04T10:00Z,",
+        ]
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", delete=False
+        ) as file:
+            file.write("\n".join(rows))
+        self.addCleanup(os.remove, file.name)
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command(
+            "import_flights",
+            file.name,
+            batch_size=1,
+            stdout=stdout,
+            stderr=stderr
+        )
+
+        flights = Flight.objects.order_by("departure_time")
+        self.assertEqual(flights.count(), 2)
+        self.assertEqual(
+            set(flights[0].crew.all()), {self.pilot, self.steward}
+        )
+        self.assertFalse(flights[1].crew.exists())
+        self.assertEqual(flights[1].tickets_sold, 0)
+        self.assertIn("Line 4: Unknown or ambiguous route", stderr.getvalue())
+        self.assertIn("Line 5: arrival_time", stderr.getvalue())
+        self.assertIn("Imported 2 flight(s)", stdout.getvalue())
+
+    def test_import_command_rejects_non_utf8_file(self):
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as file:
+            file.write("route,airplane\nZürich,1\n".encode("latin-1"))
+        self.addCleanup(os.remove, file.name)
+
+        with self.assertRaisesMessage(CommandError, "must be UTF-8"):
+            call_command("import_flights", file.name, stdout=StringIO())
+
+    def test_bulk_import_endpoint(self):
+        lines = [
+            json.dumps({
+                "route": self.route.id,
+                "airplane": self.airplane.id,
+                "departure_time": "2030-01-01T10:00:00Z",
+                "arrival_time": "2030-01-01T12:00:00Z",
+                "crew": [self.pilot.id],
+            }),
+            "not json",
+            json.dumps({"route": self.route.id}),
+        ]
+        upload = SimpleUploadedFile(
+            "schedule.jsonl", "\n".join(lines).encode()
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(
+                FLIGHT_IMPORT_URL, {"file": upload}, format="multipart"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 1)
+        self.assertEqual(
+            [error["line"] for error in res.data["errors"]], [2, 3]
+        )
+        flight = Flight.objects.get()
+        self.assertEqual(list(flight.crew.all()), [self.pilot])
+        inserts = [
+            query for query in queries
+            if query["sql"].startswith('INSERT INTO "airport_flight')
+        ]
+        # One per table: flights, their crews and search rows
+        self.assertEqual(len(inserts), 3)
+
+    def test_bulk_import_reports_invalid_dates_and_crew(self):
+        row = {
+            "route": self.route.id,
+            "airplane": self.airplane.id,
+            "departure_time": "2030-01-01T10:00:00Z",
+            "arrival_time": "2030-01-01T12:00:00Z",
+        }
+        lines = [
+            json.dumps({**row, "departure_time": "2030-02-30T10:00"}),
+            json.dumps({**row, "crew": 5}),
+            json.dumps(row),
+        ]
+        upload = SimpleUploadedFile(
+            "schedule.jsonl", "\n".join(lines).encode()
+        )
+
+        res = self.client.post(
+            FLIGHT_IMPORT_URL, {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 1)
+        self.assertEqual(res.data["errors"], [
+            {"line": 1, "error": "Invalid departure_time: '2030-02-30T10:00'"},
+            {"line": 2, "error": "Invalid crew: 5"},
+        ])
+
+    def test_bulk_import_requires_admin(self):
+        user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(user)
+        upload = SimpleUploadedFile("schedule.csv", b"route\n")
+
+        res = self.client.post(
+            FLIGHT_IMPORT_URL, {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        self.flight = sample_flight()
+        self.pilot = Crew.objects.create(first_name="Anna", last_name="Nowak")
+        self.flight.crew.add(self.pilot)
+
+    @staticmethod
+    def content(response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_flight_csv_export_is_reimportable(self):
+        for _ in range(3):
+            sample_flight(
+                route=self.flight.route, airplane=self.flight.airplane
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(export_url("flight-export", "csv"))
+            lines = self.content(res).splitlines()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[0].startswith("id,route,source,destination"))
+        self.assertIn(f",{self.pilot.id}", lines[-1])
+
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", delete=False
+        ) as file:
+            file.write("\n".join(lines))
+        self.addCleanup(os.remove, file.name)
+        call_command("import_flights", file.name, stdout=StringIO())
+        self.assertEqual(Flight.objects.count(), 8)
+        self.assertEqual(Flight.crew.through.objects.count(), 2)
+
+    def test_order_ndjson_export_only_lists_own_tickets(self):
+        other = get_user_model().objects.create_user(
+            username="other",
+            password="testpass123",
+        )
+        for user, seat in [(self.user, 1), (other, 2)]:
+            order = Order.objects.create(user=user)
+            Ticket.objects.create(
+                row=1, seat=seat, flight=self.flight, order=order
+            )
+
+        res = self.client.get(export_url("order-export", "ndjson"))
+        rows = [json.loads(line) for line in self.content(res).splitlines()]
+
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["seat"], 1)
+        self.assertEqual(rows[0]["source"], "Source Airport")
+
+    def test_flight_tickets_export_requires_admin(self):
+        url = export_url(
+            "flight-export-tickets", "csv", pk=self.flight.id
+        )
+
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.content(res).splitlines(),
+            ["id,flight,row,seat,order,user,created_at"]
+        )
+
+    def test_export_data_command(self):
+        stdout = StringIO()
+
+        call_command("export_data", "flights", format="ndjson", stdout=stdout)
+
+        row = json.loads(stdout.getvalue())
+        self.assertEqual(row["id"], self.flight.id)
+        self.assertEqual(row["crew"], [self.pilot.id])
+
+
+class ItineraryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        reset_itinerary_index()
+        self.addCleanup(reset_itinerary_index)
+
+        airports = {
+            name: sample_airport(name=name)
+            for name in ["Alpha", "Bravo", "Charlie", "Delta"]
+        }
+        self.airplane = sample_airplane()
+        self.routes = {
+            (source, destination): sample_route(
+                source=airports[source],
+                destination=airports[destination],
+                distance=distance
+            )
+            for source, destination, distance in [
+                ("Alpha", "Bravo", 400),
+                ("Bravo", "Charlie", 400),
+                ("Alpha", "Charlie", 500),
+                ("Charlie", "Delta", 300),
+            ]
+        }
+        self.direct = self.flight("Alpha", "Charlie", 10, 16)
+        self.first_leg = self.flight("Alpha", "Bravo", 8, 9)
+        self.connection = self.flight("Bravo", "Charlie", 10, 11)
+        # Leaves only 30 minutes to connect
+        self.flight("Bravo", "Charlie", 9.5, 10)
+
+    def flight(self, source, destination, departure, arrival):
+        day = datetime(2030, 5, 1)
+        return sample_flight(
+            route=self.routes[(source, destination)],
+            airplane=self.airplane,
+            departure_time=timezone.make_aware(
+                day + timedelta(hours=departure)
+            ),
+            arrival_time=timezone.make_aware(day + timedelta(hours=arrival)),
+        )
+
+    def search(self, **params):
+        params = {
+            "source": "Alpha",
+            "destination": "Charlie",
+            "date": "2030-05-01",
+            **params
+        }
+        res = self.client.get(ITINERARY_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [
+            [leg["flight"] for leg in itinerary["legs"]]
+            for itinerary in res.data
+        ], res.data
+
+    def test_itineraries_ranked_by_duration(self):
+        flights, data = self.search()
+
+        self.assertEqual(
+            flights,
+            [[self.first_leg.id, self.connection.id], [self.direct.id]]
+        )
+        self.assertEqual(data[0]["duration"], 180)
+        self.assertEqual(data[0]["distance"], 800)
+        self.assertEqual(data[0]["legs"][1]["source"], "Bravo")
+
+    def test_itineraries_ranked_by_distance(self):
+        flights, _ = self.search(sort="distance")
+
+        self.assertEqual(flights[0], [self.direct.id])
+
+    def test_max_legs_and_min_connection(self):
+        flights, _ = self.search(max_legs=1)
+        self.assertEqual(flights, [[self.direct.id]])
+
+        flights, _ = self.search(min_connection=30)
+        self.assertEqual(len(flights), 3)
+
+    def test_three_leg_itinerary(self):
+        last_leg = self.flight("Charlie", "Delta", 13, 14)
+
+        flights, _ = self.search(destination="Delta")
+
+        self.assertEqual(
+            flights,
+            [[self.first_leg.id, self.connection.id, last_leg.id]]
+        )
+
+    def test_index_is_updated_on_commit(self):
+        index = itineraries.get_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            faster = self.flight("Alpha", "Charlie", 8, 10)
+            self.direct.delete()
+
+        flights, _ = self.search()
+        self.assertIs(itineraries.get_index(), index)
+        self.assertEqual(flights[0], [faster.id])
+        self.assertNotIn([self.direct.id], flights)
+
+        # Lists handed out to searches are replaced, never changed
+        departures = index.departures[self.direct.route.source_id]
+        snapshot = list(departures)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flight("Alpha", "Bravo", 12, 13)
+            self.first_leg.delete()
+        self.assertEqual(departures, snapshot)
+        self.assertIsNot(
+            index.departures[self.direct.route.source_id], departures
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            route = self.routes[("Alpha", "Charlie")]
+            route.distance = 100
+            route.save()
+        self.assertEqual(index.legs[faster.id].distance, 100)
+
+
+class DepartureIndexTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        caches["departures"].clear()
+
+        self.warsaw = sample_airport(name="Warsaw")
+        self.berlin = sample_airport(name="Berlin")
+        self.route = sample_route(source=self.warsaw, destination=self.berlin)
+        self.day = timezone.make_aware(datetime(2030, 5, 1))
+        for hours in [6, 12, 9]:
+            self.flight_at(hours)
+        # Other day and other route
+        self.flight_at(30)
+        sample_flight(
+            route=sample_route(source=self.berlin, destination=self.warsaw),
+            departure_time=self.day + timedelta(hours=8),
+            arrival_time=self.day + timedelta(hours=10),
+        )
+
+    def flight_at(self, hours):
+        return sample_flight(
+            route=self.route,
+            departure_time=self.day + timedelta(hours=hours),
+            arrival_time=self.day + timedelta(hours=hours + 2),
+        )
+
+    def search(self, **params):
+        params = {"date": "2030-05-01", **params}
+        return self.client.get(FLIGHT_URL, params).data
+
+    def test_index_matches_database_search(self):
+        for params in [
+            {},
+            {"source": "Warsaw"},
+            {"destination": "Berlin"},
+            {"source": "Warsaw", "destination": "Berlin"},
+            {"source": "Warsaw", "page": 2},
+        ]:
+            indexed = self.search(**params)
+            with override_settings(DEPARTURE_INDEX_ENABLED=False):
+                self.assertEqual(indexed, self.search(**params))
+
+        self.assertEqual(self.search(source="Warsaw")["count"], 3)
+
+    def test_cached_bucket_skips_route_join_and_sort(self):
+        self.search(source="Warsaw", destination="Berlin")
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.search(source="Warsaw", destination="Berlin")
+
+        flight_queries = [
+            query["sql"] for query in queries
+            if '"airport_flight' in query["sql"]
+        ]
+        self.assertEqual(len(flight_queries), 1)
+        self.assertIn(
+            '"airport_flightsearch"."flight_id" IN', flight_queries[0]
+        )
+        self.assertNotIn("ORDER BY", flight_queries[0])
+        self.assertEqual(len(data["results"]), 3)
+
+    def test_flight_changes_invalidate_buckets(self):
+        self.search(source="Warsaw")
+
+        flight = self.flight_at(7)
+        self.assertEqual(self.search(source="Warsaw")["count"], 4)
+
+        flight.departure_time += timedelta(days=1)
+        flight.arrival_time += timedelta(days=1)
+        flight.save()
+        self.assertEqual(self.search(source="Warsaw")["count"], 3)
+
+        self.route.source = self.berlin
+        self.route.save()
+        self.assertEqual(self.search(source="Warsaw")["count"], 0)
+
+    def test_unseen_flight_deletion_falls_back_to_database(self):
+        self.search(source="Warsaw")
+        # As if deleted by another worker, whose version bump this
+        # process doesn't see
+        with mock.patch("airport.signals.invalidate_model"):
+            Flight.objects.filter(
+                departure_time=self.day + timedelta(hours=12)
+            ).delete()
+
+        data = self.search(source="Warsaw")
+
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(len(data["results"]), 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.search(source="Warsaw")
+        self.assertFalse(
+            any("ORDER BY" in query["sql"] for query in queries)
+        )
+
+
+class AsyncFlightViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        self.token = AccessToken.for_user(self.user)
+        caches["seat_maps"].clear()
+
+        self.flight = sample_flight()
+        self.flight.crew.add(
+            Crew.objects.create(first_name="Anna", last_name="Nowak")
+        )
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(row=2, seat=3, flight=self.flight, order=order)
+        for _ in range(11):
+            sample_flight(
+                route=self.flight.route, airplane=self.flight.airplane
+            )
+
+    async def get(self, url):
+        return await AsyncClient().get(
+            url, headers={"authorization": f"Bearer {self.token}"}
+        )
+
+    async def assertRendersLike(self, async_url, url):
+        res = await self.get(async_url)
+        expected = await sync_to_async(self.client.get)(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(res.content.replace(b"/async/", b"/")),
+            json.loads(JSONRenderer().render(expected.data))
+        )
+
+    async def test_flight_list_matches_viewset(self):
+        for query in ["", "?page=2", "?source=Source&cursor="]:
+            await self.assertRendersLike(
+                reverse("airport:async-flight-list") + query,
+                FLIGHT_URL + query
+            )
+
+    async def test_flight_detail_matches_viewset(self):
+        await self.assertRendersLike(
+            reverse("airport:async-flight-detail", args=[self.flight.id]),
+            flight_detail_url(self.flight.id)
+        )
+
+    async def test_flight_seats(self):
+        res = await self.get(
+            reverse("airport:async-flight-seats", args=[self.flight.id])
+        )
+
+        self.assertEqual(
+            json.loads(res.content),
+            {
+                "flight": self.flight.id,
+                "capacity": 120,
+                "available": 119,
+                "taken_places": [{"row": 2, "seat": 3}],
+            }
+        )
+
+    async def test_async_views_require_authentication(self):
+        res = await AsyncClient().get(reverse("airport:async-flight-list"))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn("Bearer", res["WWW-Authenticate"])
+
+    async def test_missing_flight_and_page(self):
+        res = await self.get(
+            reverse("airport:async-flight-seats", args=[0])
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = await self.get(
+            reverse("airport:async-flight-list") + "?page=9"
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.flight = sample_flight()
+        caches["seat_maps"].clear()
+
+    def test_disabled_by_default(self):
+        res = self.client.get(flight_detail_url(self.flight.id))
+
+        self.assertNotIn("Server-Timing", res)
+
+    @override_settings(REQUEST_TIMING_ENABLED=True)
+    def test_server_timing_and_log(self):
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertLogs("airport.timing") as logs:
+                res = self.client.get(flight_detail_url(self.flight.id))
+
+        metrics = res["Server-Timing"]
+        self.assertIn(f'desc="{len(queries)} queries"', metrics)
+        for name in ("db;dur=", "auth;dur=", "serialize;dur=", "total;dur="):
+            self.assertIn(name, metrics)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "FlightViewSet.retrieve")
+        self.assertEqual(record["status"], status.HTTP_200_OK)
+        self.assertEqual(record["queries"], len(queries))
+
+    @override_settings(REQUEST_TIMING_ENABLED=True)
+    def test_serializer_list_is_timed(self):
+        SeatHold.objects.create(
+            flight=self.flight,
+            row=1,
+            seat=1,
+            user=self.user,
+            expires_at=timezone.now() + timedelta(minutes=5)
+        )
+
+        with self.assertLogs("airport.timing") as logs:
+            res = self.client.get(SEAT_HOLD_URL)
+
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertIn("serialize;dur=", res["Server-Timing"])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreater(record["serialize_ms"], 0)
+
+    @override_settings(REQUEST_TIMING_ENABLED=True)
+    def test_values_serializer_list_is_timed(self):
+        with self.assertLogs("airport.timing"):
+            res = self.client.get(ORDER_URL)
+
+        self.assertIn("serialize;dur=", res["Server-Timing"])
+
+    @override_settings(
+        REQUEST_TIMING_ENABLED=True, REQUEST_TIMING_SAMPLE_RATE=0
+    )
+    def test_unsampled_requests_are_not_measured(self):
+        res = self.client.get(flight_detail_url(self.flight.id))
+
+        self.assertNotIn("Server-Timing", res)
+
+
+def metric_value(text, sample):
+    """Value of a sample line like 'name{label="x"}' in /metrics output"""
+    for line in text.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        self.flight = sample_flight()
+        caches["seat_maps"].clear()
+
+    def scrape(self):
+        res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.content.decode()
+
+    def test_request_latency_and_queries(self):
+        view = 'view="FlightViewSet.list"'
+        before = self.scrape()
+
+        self.client.get(FLIGHT_URL)
+
+        after = self.scrape()
+        for sample in (
+            f"airport_request_duration_seconds_count{{{view}}}",
+            f"airport_request_queries_count{{{view}}}",
+            f'airport_requests_total{{{view},status="200"}}',
+        ):
+            self.assertEqual(
+                metric_value(after, sample) - metric_value(before, sample), 1
+            )
+        self.assertIn(
+            f'airport_request_duration_seconds_bucket{{{view},le="+Inf"}}',
+            after
+        )
+
+    def test_orders_tickets_and_seat_conflicts(self):
+        before = self.scrape()
+        payload = {
+            "tickets": [
+                {"row": 1, "seat": 1, "flight": self.flight.id},
+                {"row": 1, "seat": 2, "flight": self.flight.id},
+            ]
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(ORDER_URL, payload, format="json")
+        with self.assertRaises(SeatTaken):
+            create_order(self.user, [(self.flight.id, 1, 1)])
+
+        after = self.scrape()
+        for sample, change in (
+            ("airport_orders_created_total", 1),
+            ("airport_tickets_created_total", 2),
+            ('airport_seat_conflicts_total{reason="seat_taken"}', 1),
+        ):
+            self.assertEqual(
+                metric_value(after, sample) - metric_value(before, sample),
+                change
+            )
+
+    def test_cache_hits_and_misses(self):
+        hit = 'airport_cache_requests_total{cache="seat_maps",result="hit"}'
+        miss = 'airport_cache_requests_total{cache="seat_maps",result="miss"}'
+        before = self.scrape()
+
+        get_seat_map(self.flight)
+        get_seat_map(self.flight)
+
+        after = self.scrape()
+        self.assertEqual(
+            metric_value(after, hit) - metric_value(before, hit), 1
+        )
+        self.assertEqual(
+            metric_value(after, miss) - metric_value(before, miss), 1
+        )
+
+    def test_workers_are_summed_through_shared_directory(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, "1-other.json"), "w") as file:
+            json.dump({"airport_orders_created_total": [[[], 5]]}, file)
+
+        with override_settings(METRICS_DIR=directory):
+            text = self.scrape()
+
+        local = metrics.ORDERS_CREATED.values.get((), 0)
+        self.assertEqual(
+            metric_value(text, "airport_orders_created_total"), local + 5
+        )
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        res = self.client.get(reverse("metrics"))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS_ALLOWED_NETWORKS=["10.0.0.0/8"])
+    def test_scrape_only_from_allowed_networks(self):
+        res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        res = self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_metrics_skip_stage_timers(self):
+        with measure(None, stages=False) as timing:
+            with timed("serialize"):
+                pass
+        self.assertEqual(timing.spans, {})
+
+        res = self.client.get(flight_detail_url(self.flight.id))
+        self.assertNotIn("Server-Timing", res)
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+
+    def throttle(self, now):
+        throttle = SlidingWindowUserThrottle()
+        throttle.rate = "10/m"
+        throttle.num_requests, throttle.duration = 10, 60
+        throttle.timer = lambda: now
+        return throttle
+
+    def allowed(self, now, count):
+        request = SimpleNamespace(user=self.user)
+        return sum(
+            self.throttle(now).allow_request(request, None)
+            for _ in range(count)
+        )
+
+    def assertSlidingWindow(self):
+        get_store().clear()
+        start = 600_000 * 60
+        self.assertEqual(self.allowed(start, 12), 10)
+        # Half of the previous window's 10 requests still count
+        self.assertEqual(self.allowed(start + 90, 8), 5)
+        throttle = self.throttle(start + 90)
+        self.assertFalse(
+            throttle.allow_request(SimpleNamespace(user=self.user), None)
+        )
+        # One more request fits once a tenth of the previous one slid out
+        self.assertAlmostEqual(throttle.wait(), 6)
+        # The window before last doesn't count at all
+        self.assertEqual(self.allowed(start + 180, 12), 10)
+
+    def test_cache_store(self):
+        with override_settings(
+            THROTTLE_STORE="airport.throttling.CacheStore"
+        ):
+            self.assertSlidingWindow()
+
+    def test_sqlite_store_is_default(self):
+        self.assertIsInstance(get_store(), SQLiteStore)
+        self.assertSlidingWindow()
+
+    def test_throttled_response(self):
+        get_store().clear()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.dict(
+            SlidingWindowUserThrottle.THROTTLE_RATES, {"user": "2/day"}
+        ):
+            responses = [client.get(AIRPORT_URL) for _ in range(3)]
+
+        self.assertEqual(
+            [res.status_code for res in responses],
+            [
+                status.HTTP_200_OK,
+                status.HTTP_200_OK,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            ]
+        )
+        self.assertIn("Retry-After", responses[2])
+
+
+class CachedUserAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        return res, len(queries)
+
+    def test_repeated_token_skips_user_query(self):
+        _, first = self.count_queries(ORDER_URL)
+        res, second = self.count_queries(ORDER_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(second, first - 1)
+
+    def test_cached_user_places_own_orders(self):
+        flight = sample_flight()
+        self.client.get(ORDER_URL)
+        payload = {"tickets": [{"row": 1, "seat": 1, "flight": flight.id}]}
+
+        res = self.client.post(ORDER_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.get().user, self.user)
+        self.assertEqual(len(self.client.get(ORDER_URL).data["results"]), 1)
+
+    def test_saving_user_updates_permissions(self):
+        url = export_url("flight-export-tickets", "csv", pk=sample_flight().id)
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_403_FORBIDDEN
+        )
+
+        self.user.is_staff = True
+        self.user.save()
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_deactivated_user_is_refused(self):
+        self.client.get(ORDER_URL)
+
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ORDER_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(JWT_USER_CACHE_SIZE=2)
+    def test_least_recently_used_tokens_are_evicted(self):
+        tokens = [str(AccessToken.for_user(self.user)) for _ in range(3)]
+        for token in tokens[:2] + tokens[:1] + tokens[2:]:
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            self.client.get(ORDER_URL)
+
+        self.assertEqual(
+            set(user_cache.entries),
+            {tokens[0].encode(), tokens[2].encode()}
+        )
+
+    @override_settings(JWT_USER_CACHE_TTL=0)
+    def test_disabled(self):
+        _, first = self.count_queries(ORDER_URL)
+        _, second = self.count_queries(ORDER_URL)
+
+        self.assertEqual(first, second)
+
+
+def image_upload(name="plane.png", size=(1600, 900), mode="RGB"):
+    buffer = BytesIO()
+    Image.new(mode, size, "steelblue").save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), "image/png")
+
+
+class AirplaneImageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(
+            MEDIA_ROOT=media_root,
+            IMAGE_TASK_BACKEND="airport.images.ImmediateBackend",
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            username="admin",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.admin)
+        self.airplane = sample_airplane()
+        self.url = reverse(
+            "airport:airplane-upload-image", args=[self.airplane.id]
+        )
+
+    def upload(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                self.url, {"image": image}, format="multipart"
+            )
+
+    def test_upload_makes_variants(self):
+        res = self.upload(image_upload())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["image_status"], "pending")
+        self.airplane.refresh_from_db()
+        self.assertEqual(self.airplane.image_status, "ready")
+        expected = {
+            f"{size}_{image_format}"
+            for size in ("thumbnail", "medium")
+            for image_format in images.variant_formats()
+        }
+        self.assertEqual(set(self.airplane.image_variants), expected)
+        with default_storage.open(
+            self.airplane.image_variants["thumbnail_webp"]
+        ) as file:
+            self.assertEqual(Image.open(file).size, (320, 180))
+
+        detail = self.client.get(
+            reverse("airport:airplane-detail", args=[self.airplane.id])
+        )
+        self.assertTrue(
+            detail.data["image_variants"]["medium_webp"].startswith(
+                "http://testserver/media/uploads/airplanes/variants/"
+            )
+        )
+        listed = self.client.get(AIRPLANE_URL).data["results"][0]
+        self.assertRegex(
+            listed["thumbnail"], r"/variants/\w\w/[0-9a-f]{64}\.webp$"
+        )
+
+    def test_new_image_replaces_variants(self):
+        self.upload(image_upload())
+        self.airplane.refresh_from_db()
+        old_variants = self.airplane.image_variants
+
+        self.upload(image_upload(size=(1200, 900)))
+
+        self.airplane.refresh_from_db()
+        self.assertEqual(self.airplane.image_status, "ready")
+        for path in old_variants.values():
+            self.assertFalse(default_storage.exists(path))
+        for path in self.airplane.image_variants.values():
+            self.assertTrue(default_storage.exists(path))
+
+    def test_identical_uploads_share_files(self):
+        upload = image_upload()
+        digest = hashlib.sha256(upload.read()).hexdigest()
+        upload.seek(0)
+        other = sample_airplane(name="Other")
+        self.upload(upload)
+        self.url = reverse("airport:airplane-upload-image", args=[other.id])
+        self.upload(image_upload())
+
+        self.airplane.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(
+            self.airplane.image.name,
+            f"uploads/airplanes/{digest[:2]}/{digest}.png",
+        )
+        self.assertEqual(other.image.name, self.airplane.image.name)
+        self.assertEqual(other.image_variants, self.airplane.image_variants)
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(self.airplane.image.path))), 1
+        )
+
+        # The variants stay while the other airplane lists them
+        self.upload(image_upload(size=(1200, 900)))
+        for path in self.airplane.image_variants.values():
+            self.assertTrue(default_storage.exists(path))
+
+    def test_invalid_image_is_rejected(self):
+        res = self.upload(
+            SimpleUploadedFile("plane.png", b"not an image", "image/png")
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.airplane.refresh_from_db()
+        self.assertFalse(self.airplane.image)
+
+    def test_upload_requires_admin(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                username="testuser",
+                password="testpass123",
+            )
+        )
+
+        res = self.upload(image_upload())
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_failed_and_pending_images_are_retried(self):
+        name = default_storage.save(
+            "uploads/airplanes/broken.png", ContentFile(b"broken")
+        )
+        Airplane.objects.filter(id=self.airplane.id).update(
+            image=name, image_status="pending"
+        )
+
+        with self.assertLogs("airport.images", "ERROR"):
+            images.process_airplane_image(self.airplane.id, name)
+        self.airplane.refresh_from_db()
+        self.assertEqual(self.airplane.image_status, "failed")
+
+        with default_storage.open(name, "wb") as file:
+            file.write(image_upload().read())
+        call_command("process_airplane_images", stdout=StringIO())
+        self.airplane.refresh_from_db()
+        self.assertEqual(self.airplane.image_status, "ready")
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.content = bytes(range(256)) * 4
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self.name = Airplane._meta.get_field("image").storage.save(
+            "uploads/airplanes/plane.PNG", ContentFile(self.content)
+        )
+        self.url = f"/media/{self.name}"
+
+    def test_content_addressed_file_is_immutable(self):
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(res.streaming_content), self.content)
+        self.assertEqual(
+            self.name, f"uploads/airplanes/{self.digest[:2]}/{self.digest}.png"
+        )
+        self.assertEqual(res["ETag"], f'"{self.digest}"')
+        self.assertEqual(res["Content-Type"], "image/png")
+        self.assertEqual(res["Content-Length"], "1024")
+        self.assertEqual(res["Accept-Ranges"], "bytes")
+        self.assertIn("immutable", res["Cache-Control"])
+
+    def test_other_files_are_revalidated(self):
+        with open(os.path.join(self.media_root, "notes.txt"), "wb") as file:
+            file.write(b"notes")
+
+        res = self.client.get("/media/notes.txt")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Cache-Control"], "public, max-age=3600")
+        self.assertNotEqual(res["ETag"], '"notes"')
+
+    def test_conditional_requests(self):
+        first = self.client.get(self.url)
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], first["ETag"])
+        res = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range_requests(self):
+        for header, start, end in (
+            ("bytes=0-9", 0, 9),
+            ("bytes=1000-", 1000, 1023),
+            ("bytes=-24", 1000, 1023),
+            ("bytes=10-5000", 10, 1023),
+        ):
+            res = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+            self.assertEqual(res["Content-Range"], f"bytes {start}-{end}/1024")
+            self.assertEqual(res["Content-Length"], str(end - start + 1))
+            self.assertEqual(
+                b"".join(res.streaming_content), self.content[start:end + 1]
+            )
+
+        res = self.client.get(self.url, HTTP_RANGE="bytes=2000-")
+        self.assertEqual(
+            res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(res["Content-Range"], "bytes */1024")
+
+        # Whole file for several ranges, or a range of another version
+        for headers in (
+            {"HTTP_RANGE": "bytes=0-1,5-6"},
+            {"HTTP_RANGE": "bytes=0-9", "HTTP_IF_RANGE": '"old"'},
+        ):
+            res = self.client.get(self.url, **headers)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(b"".join(res.streaming_content), self.content)
+
+    def test_missing_and_outside_files(self):
+        for url in (
+            "/media/uploads/missing.png",
+            "/media/uploads/",
+            "/media/../manage.py",
+        ):
+            self.assertEqual(
+                self.client.get(url).status_code, status.HTTP_404_NOT_FOUND
+            )
+        self.assertEqual(
+            self.client.post(self.url).status_code,
+            status.HTTP_405_METHOD_NOT_ALLOWED,
+        )
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite connection settings")
+class SQLiteConnectionTests(TestCase):
+    def test_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], REPLICA_LAG=5)
+class ReplicaRoutingTests(TestCase):
+    """A second SQLite file stands in for a replica, rows differ"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Added here, the test runner doesn't know the alias
+        cls.databases = {"default", "replica"}
+        cls.directory = tempfile.mkdtemp()
+        replica = copy.deepcopy(connections.settings["default"])
+        replica["NAME"] = os.path.join(cls.directory, "replica.sqlite3")
+        replica["TEST"] = {**replica["TEST"], "NAME": None, "MIRROR": None}
+        connections.settings["replica"] = replica
+        call_command("migrate", database="replica", verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        for alias in ("default", "responses", "seat_maps", "departures"):
+            caches[alias].clear()
+        self.user = get_user_model().objects.create_user(
+            username="reader",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        sample_airport(name="Primary Airport")
+        Airport.objects.using("replica").create(
+            name="Replica Airport", closest_big_city="Replica City"
+        )
+
+    def airport_names(self):
+        return [
+            airport["name"]
+            for airport in self.client.get(AIRPORT_URL).data["results"]
+        ]
+
+    def test_opted_in_reads_use_replica(self):
+        self.assertEqual(self.airport_names(), ["Replica Airport"])
+
+        airports = Airport.objects.using("replica")
+        route = Route.objects.using("replica").create(
+            source=airports.get(),
+            destination=airports.create(name="Other", closest_big_city="X"),
+            distance=500,
+        )
+        res = self.client.get(reverse("airport:route-detail", args=[route.id]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["source"]["name"], "Replica Airport")
+
+    def test_writes_and_other_views_use_primary(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.post(
+            AIRPORT_URL, {"name": "New Airport", "closest_big_city": "City"}
+        )
+
+        self.assertTrue(Airport.objects.filter(name="New Airport").exists())
+        self.assertFalse(
+            Airport.objects.using("replica").filter(name="New Airport")
+        )
+        # No replica left selected once the request is over
+        self.assertIsNone(replicas.ReplicaRouter().db_for_read(Airport))
+
+    def test_new_order_pins_user_to_primary(self):
+        flight = sample_flight()
+        self.assertEqual(self.client.get(ORDER_URL).data["results"], [])
+
+        res = self.client.post(
+            ORDER_URL,
+            {"tickets": [{"flight": flight.id, "row": 1, "seat": 1}]},
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        orders = self.client.get(ORDER_URL).data["results"]
+        self.assertEqual([order["id"] for order in orders], [res.data["id"]])
+        self.assertNotIn("Replica Airport", self.airport_names())
+
+        # Once the replicas caught up
+        caches["default"].clear()
+        self.assertEqual(self.client.get(ORDER_URL).data["results"], [])
+
+    def test_no_replicas_configured(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.airport_names(), ["Primary Airport"])
+
+
+class FlightSearchTableTests(TestCase):
+    def setUp(self):
+        caches["departures"].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser",
+            password="testpass123",
+        )
+        self.client.force_authenticate(self.user)
+        self.source = sample_airport(name="Warsaw Chopin")
+        self.route = sample_route(
+            source=self.source,
+            destination=sample_airport(name="Berlin Brandenburg"),
+        )
+        self.airplane = sample_airplane(name="Boeing", rows=10)
+        self.flight = sample_flight(route=self.route, airplane=self.airplane)
+
+    def listed(self, **params):
+        return self.client.get(FLIGHT_URL, params).data["results"]
+
+    def listed_by_serializer(self):
+        return FlightListSerializer(
+            Flight.objects.all(), many=True
+        ).data
+
+    @override_settings(DEPARTURE_INDEX_ENABLED=False)
+    def test_list_reads_search_table_alone(self):
+        date = self.flight.departure_time.date().isoformat()
+
+        with CaptureQueriesContext(connection) as queries:
+            results = self.listed(source="Warsaw", date=date)
+
+        flight_queries = [
+            query["sql"] for query in queries
+            if '"airport_flight' in query["sql"]
+        ]
+        self.assertEqual(len(flight_queries), 2)
+        for sql in flight_queries:
+            self.assertIn('FROM "airport_flightsearch"', sql)
+            self.assertNotIn("JOIN", sql)
+        self.assertEqual(results, self.listed_by_serializer())
+
+    def test_rows_follow_changes(self):
+        Order.objects.create(user=self.user).tickets.create(
+            flight=self.flight, row=1, seat=1
+        )
+        self.source.name = "Warsaw Modlin"
+        self.source.save()
+        self.airplane.name = "Airbus"
+        self.airplane.rows = 20
+        self.airplane.save()
+
+        flight = self.listed()[0]
+        self.assertEqual(flight["route"], "Warsaw Modlin - Berlin Brandenburg")
+        self.assertEqual(flight["airplane"], "Airbus")
+        self.assertEqual(flight["airplane_capacity"], 120)
+        self.assertEqual(flight["tickets_available"], 119)
+
+        self.route.source = sample_airport(name="Gdansk")
+        self.route.save()
+        self.assertEqual(self.listed(source="Gdansk")[0]["id"], self.flight.id)
+
+        self.flight.delete()
+        self.assertFalse(FlightSearch.objects.exists())
+
+    def test_rebuild_command(self):
+        sample_flight(route=self.route, airplane=self.airplane)
+        FlightSearch.objects.all().delete()
+        FlightSearch.objects.create(
+            flight=self.flight,
+            route=self.route,
+            source=self.source,
+            destination=self.source,
+            source_name="Stale",
+            destination_name="Stale",
+            airplane=self.airplane,
+            airplane_name="Stale",
+            capacity=1,
+            departure_time=self.flight.departure_time,
+            arrival_time=self.flight.arrival_time,
+        )
+
+        out = StringIO()
+        call_command("rebuild_flight_search", stdout=out)
+
+        self.assertIn("Rebuilt 2", out.getvalue())
+        self.assertEqual(self.listed(), self.listed_by_serializer())
@@ -0,0 +1,171 @@
+"""
+Request throttles keeping a sliding-window counter per client instead
+of DRF's list of request timestamps, which is read and rewritten on
+every request and grows to the full rate (1000 entries for "1000/day").
+
+A client's state is the number of requests in the current and the
+previous fixed window. The previous window's count is weighted by how
+much of it still overlaps the sliding window, so the estimate moves
+smoothly instead of resetting at window boundaries.
+
+The counters live in the store named by THROTTLE_STORE: CacheStore
+keeps them in the "throttle" cache (atomic with Redis or Memcached),
+SQLiteStore in the THROTTLE_SQLITE_PATH file shared by the workers of
+one host.
+"""
+import random
+import sqlite3
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+CACHE_ALIAS = "throttle"
+
+
+class CacheStore:
+    def __init__(self, alias=CACHE_ALIAS):
+        self.alias = alias
+
+    def hit(self, key, window, duration, amount=1):
+        """
+        Add amount to key's count of window, return the count and the
+        count of the window before
+        """
+        cache = caches[self.alias]
+        current = f"{key}:{window}"
+        try:
+            count = cache.incr(current, amount)
+        except ValueError:
+            # Kept through the next window, where it is the previous one
+            if cache.add(current, amount, timeout=2 * duration):
+                count = amount
+            else:
+                count = cache.incr(current, amount)
+        return count, cache.get(f"{key}:{window - 1}", 0)
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+class SQLiteStore:
+    # One row per key, updated in place by a single statement
+    HIT_SQL = """
+        INSERT INTO throttle (key, window, count, previous, expires)
+        VALUES (:key, :window, :amount, 0, :expires)
+        ON CONFLICT (key) DO UPDATE SET
+            previous = CASE
+                WHEN window = :window THEN previous
+                WHEN window = :window - 1 THEN count
+                ELSE 0
+            END,
+            count = CASE
+                WHEN window = :window THEN count + :amount
+                ELSE :amount
+            END,
+            window = :window,
+            expires = :expires
+        RETURNING count, previous
+    """
+    # Share of hits that also delete rows of clients gone for a while
+    PURGE_RATE = 0.001
+
+    def __init__(self, path=None):
+        self.path = str(path or settings.THROTTLE_SQLITE_PATH)
+        self.local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS throttle ("
+                "key TEXT PRIMARY KEY, window INTEGER NOT NULL, "
+                "count INTEGER NOT NULL, previous INTEGER NOT NULL, "
+                "expires INTEGER NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self.local.connection = connection
+        return connection
+
+    def hit(self, key, window, duration, amount=1):
+        connection = self._connection()
+        # Once the next window is over as well, the row counts for nothing
+        expires = (window + 2) * duration
+        count, previous = connection.execute(
+            self.HIT_SQL,
+            {
+                "key": key,
+                "window": window,
+                "amount": amount,
+                "expires": expires,
+            },
+        ).fetchone()
+        if random.random() < self.PURGE_RATE:
+            connection.execute(
+                "DELETE FROM throttle WHERE expires < :now",
+                {"now": window * duration},
+            )
+        return count, previous
+
+    def clear(self):
+        self._connection().execute("DELETE FROM throttle")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    path = settings.THROTTLE_STORE
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault(path, import_string(path)())
+    return store
+
+
+class SlidingWindowMixin:
+    """SimpleRateThrottle counting requests in a sliding window"""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        window, self.offset = divmod(self.timer(), self.duration)
+        window = int(window)
+        store = get_store()
+        count, self.previous = store.hit(self.key, window, self.duration)
+        weight = 1 - self.offset / self.duration
+        if self.previous * weight + count <= self.num_requests:
+            return True
+
+        # Refused requests don't count against the client
+        self.count, _ = store.hit(self.key, window, self.duration, -1)
+        return self.throttle_failure()
+
+    def wait(self):
+        available = self.num_requests - self.count - 1
+        if available < 0 or not self.previous:
+            return self.duration - self.offset
+        # Until enough of the previous window slid out of the estimate
+        remaining = self.duration * (1 - available / self.previous)
+        return max(remaining - self.offset, 0)
+
+
+class SlidingWindowAnonThrottle(SlidingWindowMixin, AnonRateThrottle):
+    pass
+
+
+class SlidingWindowUserThrottle(SlidingWindowMixin, UserRateThrottle):
+    pass
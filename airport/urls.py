@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from airport import async_views
 from airport.views import (
     AirportViewSet,
     RouteViewSet,
@@ -8,7 +9,9 @@ from airport.views import (
     AirplaneTypeViewSet,
     AirplaneViewSet,
     FlightViewSet,
-    OrderViewSet
+    OrderViewSet,
+    SeatHoldViewSet,
+    ItineraryViewSet
 )
 
 router = DefaultRouter()
@@ -19,8 +22,26 @@ router.register("airplane-types", AirplaneTypeViewSet)
 router.register("airplanes", AirplaneViewSet)
 router.register("flights", FlightViewSet)
 router.register("orders", OrderViewSet)
+router.register("seat-holds", SeatHoldViewSet)
+router.register("itineraries", ItineraryViewSet, basename="itinerary")
 
 urlpatterns = [
+    # Async read path of the flight endpoints, for ASGI deployments
+    path(
+        "async/flights/",
+        async_views.flight_list,
+        name="async-flight-list"
+    ),
+    path(
+        "async/flights/<int:pk>/",
+        async_views.flight_detail,
+        name="async-flight-detail"
+    ),
+    path(
+        "async/flights/<int:pk>/seats/",
+        async_views.flight_seats,
+        name="async-flight-seats"
+    ),
     path("", include(router.urls)),
 ]
 
@@ -1,7 +1,12 @@
-from django.db.models import F, Count
+import datetime
+import io
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
@@ -12,7 +17,9 @@ from airport.models import (
     AirplaneType,
     Airplane,
     Flight,
-    Order
+    FlightSearch,
+    Order,
+    SeatHold
 )
 from airport.serializers import (
     AirportSerializer,
@@ -27,13 +34,69 @@ from airport.serializers import (
     AirplaneImageSerializer,
     FlightSerializer,
     FlightListSerializer,
+    FlightSearchValuesSerializer,
     FlightDetailSerializer,
+    FlightImportSerializer,
+    ItinerarySearchSerializer,
+    ItinerarySerializer,
     OrderSerializer,
-    OrderListSerializer
+    OrderListSerializer,
+    OrderListValuesSerializer,
+    SeatHoldSerializer,
+    SeatHoldCreateSerializer,
+    SeatHoldConfirmSerializer
 )
+from airport import departure_index, exports, itineraries
+from airport.caching import CachedListMixin
+from airport.instrumentation import TimedViewMixin, timed
+from airport.pagination import KeysetPagination
+from airport.replicas import ReplicaReadsMixin
+from airport.schedule_import import READERS, ScheduleImporter
+
+# The format is part of the path: a ?format= parameter would be taken
+# by DRF for choosing a renderer
+EXPORT_PATH = r"export/(?P<file_format>csv|ndjson)"
+
+
+def day_range(day):
+    """Aware datetimes of the midnights starting and ending a date"""
+    day_start = timezone.make_aware(
+        datetime.datetime.combine(day, datetime.time.min)
+    )
+    day_end = timezone.make_aware(
+        datetime.datetime.combine(
+            day + datetime.timedelta(days=1), datetime.time.min
+        )
+    )
+    return day_start, day_end
+
+
+class ValuesListMixin:
+    """
+    List through values_serializer_class, a fast .values() based
+    serializer rendering the same output as the list serializer
+    """
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.values_serializer_class
+        queryset = serializer.values(
+            self.filter_queryset(self.get_queryset())
+        )
+
+        page = self.paginate_queryset(queryset)
+        with timed("serialize"):
+            data = serializer.serialize(queryset if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+
+        return Response(data)
 
 
 class AirportViewSet(
+    TimedViewMixin,
+    ReplicaReadsMixin,
+    CachedListMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet,
@@ -41,12 +104,21 @@ class AirportViewSet(
     queryset = Airport.objects.all()
     serializer_class = AirportSerializer
     permission_classes = (IsAuthenticated,)
+    cache_models = (Airport,)
+    replica_actions = ("list",)
 
 
-class RouteViewSet(viewsets.ModelViewSet):
+class RouteViewSet(
+    TimedViewMixin,
+    ReplicaReadsMixin,
+    CachedListMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Route.objects.select_related("source", "destination")
     serializer_class = RouteSerializer
     permission_classes = (IsAuthenticated,)
+    cache_models = (Route, Airport)
+    replica_actions = ("list", "retrieve")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -62,6 +134,8 @@ class RouteViewSet(viewsets.ModelViewSet):
 
 
 class CrewViewSet(
+    TimedViewMixin,
+    CachedListMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet,
@@ -69,9 +143,12 @@ class CrewViewSet(
     queryset = Crew.objects.all()
     serializer_class = CrewSerializer
     permission_classes = (IsAuthenticated,)
+    cache_models = (Crew,)
 
 
 class AirplaneTypeViewSet(
+    TimedViewMixin,
+    CachedListMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet,
@@ -79,9 +156,10 @@ class AirplaneTypeViewSet(
     queryset = AirplaneType.objects.all()
     serializer_class = AirplaneTypeSerializer
     permission_classes = (IsAuthenticated,)
+    cache_models = (AirplaneType,)
 
 
-class AirplaneViewSet(viewsets.ModelViewSet):
+class AirplaneViewSet(TimedViewMixin, viewsets.ModelViewSet):
     queryset = Airplane.objects.select_related("airplane_type")
     serializer_class = AirplaneSerializer
     permission_classes = (IsAuthenticated,)
@@ -96,7 +174,13 @@ class AirplaneViewSet(viewsets.ModelViewSet):
         return AirplaneSerializer
 
     def get_permissions(self):
-        if self.action in ["create", "update", "partial_update", "destroy"]:
+        if self.action in [
+            "create",
+            "update",
+            "partial_update",
+            "destroy",
+            "upload_image",
+        ]:
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
@@ -118,26 +202,64 @@ class AirplaneViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class FlightViewSet(viewsets.ModelViewSet):
+class FlightPagination(KeysetPagination):
+    # Of FlightSearch rows, which the list reads
+    keyset = ("-departure_time", "-flight_id")
+
+
+class FlightViewSet(
+    TimedViewMixin,
+    ReplicaReadsMixin,
+    ValuesListMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Flight.objects.select_related(
         "route__source",
         "route__destination",
         "airplane__airplane_type"
     ).prefetch_related("crew")
     serializer_class = FlightSerializer
+    values_serializer_class = FlightSearchValuesSerializer
+    pagination_class = FlightPagination
     permission_classes = (IsAuthenticated,)
+    # Above this many matching airports the ids stay a subquery
+    max_resolved_airports = 1000
+    # Searches needing more (source, destination) buckets of the
+    # departure index go to the database
+    max_departure_buckets = 100
+    replica_actions = ("list", "retrieve")
+
+    @staticmethod
+    def _day_range(value):
+        """
+        Half-open [midnight, next midnight) range of a YYYY-MM-DD date in
+        the current time zone. Unlike departure_time__date it does not
+        wrap the column in a cast, so the departure_time indexes apply.
+        """
+        try:
+            day = datetime.date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError(
+                {"date": "Date must be in YYYY-MM-DD format"}
+            )
+        return day_range(day)
+
+    def _search_airport_ids(self, term):
+        """Resolve an airport name filter to ids before querying flights"""
+        airport_ids = Airport.objects.search(term).order_by().values_list(
+            "id", flat=True
+        )
+        resolved = list(airport_ids[:self.max_resolved_airports + 1])
+        if len(resolved) > self.max_resolved_airports:
+            return airport_ids
+        return resolved
 
     def get_queryset(self):
-        queryset = self.queryset
-
-        # Add tickets_available annotation for list view
+        # The list reads the search table alone, other actions flights
         if self.action == "list":
-            queryset = queryset.annotate(
-                tickets_available=(
-                    F("airplane__rows") * F("airplane__seats_in_row")
-                    - Count("tickets")
-                )
-            )
+            queryset, route = FlightSearch.objects.all(), ""
+        else:
+            queryset, route = self.queryset, "route__"
 
         # Filtering
         source = self.request.query_params.get("source")
@@ -145,55 +267,205 @@ class FlightViewSet(viewsets.ModelViewSet):
         date = self.request.query_params.get("date")
 
         if source:
-            queryset = queryset.filter(
-                route__source__name__icontains=source
-            )
+            queryset = queryset.filter(**{
+                f"{route}source_id__in": self._search_airport_ids(source)
+            })
 
         if destination:
-            queryset = queryset.filter(
-                route__destination__name__icontains=destination
-            )
+            queryset = queryset.filter(**{
+                f"{route}destination_id__in": self._search_airport_ids(
+                    destination
+                )
+            })
 
         if date:
+            day_start, day_end = self._day_range(date)
             queryset = queryset.filter(
-                departure_time__date=date
+                departure_time__gte=day_start,
+                departure_time__lt=day_end
             )
 
         return queryset
 
+    def _departure_search(self):
+        """
+        (day_start, day_end, source_ids, destination_ids) of a date
+        search, to look up in the departure index. None when the search
+        doesn't fit the index: no date, cursor pagination or too many
+        matching airports.
+        """
+        params = self.request.query_params
+        date = params.get("date")
+        if (
+            not settings.DEPARTURE_INDEX_ENABLED
+            or not date
+            or self.paginator is None
+            or self.paginator.cursor_query_param in params
+        ):
+            return None
+
+        airport_ids = []
+        for name in ("source", "destination"):
+            term = params.get(name)
+            if not term:
+                airport_ids.append([departure_index.ANY])
+                continue
+            resolved = self._search_airport_ids(term)
+            if not isinstance(resolved, list):
+                return None
+            airport_ids.append(resolved)
+        source_ids, destination_ids = airport_ids
+        if len(source_ids) * len(destination_ids) > (
+            self.max_departure_buckets
+        ):
+            return None
+
+        day_start, day_end = self._day_range(date)
+        return day_start, day_end, source_ids, destination_ids
+
+    def list(self, request, *args, **kwargs):
+        search = self._departure_search()
+        if search is None:
+            return super().list(request, *args, **kwargs)
+        day_start, day_end, source_ids, destination_ids = search
+
+        # Only the page is read from the database, by primary key
+        page = self.paginate_queryset(
+            departure_index.departing_flight_ids(*search)
+        )
+        serializer = self.values_serializer_class
+        rows = {
+            row["flight_id"]: row
+            for row in serializer.values(
+                FlightSearch.objects.filter(flight_id__in=page).order_by()
+            )
+        }
+        if len(rows) < len(page):
+            # Flights removed without bumping the versions, e.g. by
+            # another worker or a raw delete; don't serve a short page
+            departure_index.forget_buckets(
+                day_start, source_ids, destination_ids
+            )
+            return super().list(request, *args, **kwargs)
+
+        with timed("serialize"):
+            data = serializer.serialize(rows[flight_id] for flight_id in page)
+        return self.get_paginated_response(data)
+
     def get_serializer_class(self):
         if self.action == "list":
             return FlightListSerializer
         if self.action == "retrieve":
             return FlightDetailSerializer
+        if self.action == "bulk_import":
+            return FlightImportSerializer
         return FlightSerializer
 
     def get_permissions(self):
-        if self.action in ["create", "update", "partial_update", "destroy"]:
+        if self.action in [
+            "create",
+            "update",
+            "partial_update",
+            "destroy",
+            "bulk_import",
+            "export_tickets",
+        ]:
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path=EXPORT_PATH,
+    )
+    def export(self, request, file_format):
+        """Endpoint for downloading the filtered flights as CSV or NDJSON"""
+        return exports.streaming_response(
+            file_format,
+            exports.FLIGHT_COLUMNS,
+            exports.flight_rows(self.filter_queryset(self.get_queryset())),
+            "flights"
+        )
 
-class OrderPagination(PageNumberPagination):
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path=f"tickets/{EXPORT_PATH}",
+    )
+    def export_tickets(self, request, file_format, pk=None):
+        """Endpoint for downloading the tickets of a flight"""
+        flight = self.get_object()
+        return exports.streaming_response(
+            file_format,
+            tuple(exports.TICKET_FIELDS),
+            exports.flight_ticket_rows(flight.id),
+            f"flight-{flight.id}-tickets"
+        )
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk-import",
+        parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        """
+        Endpoint for importing a CSV or JSON Lines flight schedule. The
+        upload is read row by row and inserted in batches, invalid rows
+        are skipped and reported.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        reader = READERS[serializer.validated_data["format"]]
+
+        upload.open("rb")
+        file = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+        try:
+            result = ScheduleImporter().run(reader(file))
+        except UnicodeDecodeError:
+            raise ValidationError({"file": "File must be UTF-8 encoded"})
+        finally:
+            file.detach()
+
+        return Response(
+            {
+                "created": result.created,
+                "error_count": result.error_count,
+                "errors": result.errors,
+            },
+            status=(
+                status.HTTP_201_CREATED
+                if result.created or not result.error_count
+                else status.HTTP_400_BAD_REQUEST
+            )
+        )
+
+
+class OrderPagination(KeysetPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
+    keyset = ("-created_at", "-id")
 
 
 class OrderViewSet(
+    TimedViewMixin,
+    ReplicaReadsMixin,
+    ValuesListMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = Order.objects.prefetch_related(
-        "tickets__flight__route__source",
-        "tickets__flight__route__destination",
-        "tickets__flight__airplane"
-    )
+    # The list renders through OrderListValuesSerializer, which loads
+    # the tickets and flights of a page itself
+    queryset = Order.objects.prefetch_related("tickets")
     serializer_class = OrderSerializer
+    values_serializer_class = OrderListValuesSerializer
     pagination_class = OrderPagination
     permission_classes = (IsAuthenticated,)
+    replica_actions = ("list",)
 
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user)
@@ -205,3 +477,143 @@ class OrderViewSet(
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    @action(methods=["GET"], detail=False, url_path=EXPORT_PATH)
+    def export(self, request, file_format):
+        """Endpoint for downloading the user's tickets as CSV or NDJSON"""
+        return exports.streaming_response(
+            file_format,
+            tuple(exports.ORDER_FIELDS),
+            exports.user_order_rows(request.user),
+            "orders"
+        )
+
+
+class SeatHoldViewSet(
+    TimedViewMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Short-lived seat holds: hold seats while the user checks out, then
+    confirm the holds into an order before they expire.
+    """
+    queryset = SeatHold.objects.all()
+    serializer_class = SeatHoldSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.queryset.filter(
+            user=self.request.user,
+            expires_at__gt=timezone.now()
+        )
+
+    def get_serializer_class(self):
+        if self.action == "create":
+            return SeatHoldCreateSerializer
+        if self.action == "confirm":
+            return SeatHoldConfirmSerializer
+        return SeatHoldSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        holds = serializer.save(user=request.user)
+        with timed("serialize"):
+            data = SeatHoldSerializer(holds, many=True).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(methods=["POST"], detail=False)
+    def confirm(self, request):
+        """Endpoint for turning held seats into an order"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save(user=request.user)
+        with timed("serialize"):
+            data = OrderSerializer(order).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class ItineraryViewSet(TimedViewMixin, viewsets.GenericViewSet):
+    """
+    Connecting journeys between airports matched by name, searched in
+    the in-memory itinerary index rather than the database
+    """
+    serializer_class = ItinerarySerializer
+    permission_classes = (IsAuthenticated,)
+    # Airport name filters matching more airports are cut to this many
+    max_resolved_airports = 100
+
+    def _airport_ids(self, term):
+        return list(
+            Airport.objects.search(term).order_by().values_list(
+                "id", flat=True
+            )[:self.max_resolved_airports]
+        )
+
+    @staticmethod
+    def _timestamp_datetime(value):
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+
+    def list(self, request):
+        query = ItinerarySearchSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        min_connection = params.get("min_connection")
+        if min_connection is not None:
+            min_connection = datetime.timedelta(minutes=min_connection)
+        day_start, day_end = day_range(params["date"])
+        results = itineraries.get_index().search(
+            self._airport_ids(params["source"]),
+            self._airport_ids(params["destination"]),
+            day_start,
+            day_end - datetime.timedelta(microseconds=1),
+            max_legs=params["max_legs"],
+            min_connection=min_connection,
+            sort=params["sort"],
+            limit=params["limit"],
+        )
+
+        airport_ids = {
+            airport_id
+            for legs in results
+            for leg in legs
+            for airport_id in (leg.source_id, leg.destination_id)
+        }
+        names = dict(
+            Airport.objects.filter(id__in=airport_ids).values_list(
+                "id", "name"
+            )
+        ) if airport_ids else {}
+
+        data = []
+        for legs in results:
+            departure_time = self._timestamp_datetime(legs[0].departure)
+            arrival_time = self._timestamp_datetime(legs[-1].arrival)
+            data.append({
+                "legs": [
+                    {
+                        "flight": leg.flight_id,
+                        "source": names.get(leg.source_id),
+                        "destination": names.get(leg.destination_id),
+                        "departure_time": self._timestamp_datetime(
+                            leg.departure
+                        ),
+                        "arrival_time": self._timestamp_datetime(
+                            leg.arrival
+                        ),
+                        "distance": leg.distance,
+                    }
+                    for leg in legs
+                ],
+                "departure_time": departure_time,
+                "arrival_time": arrival_time,
+                "duration": int(
+                    (arrival_time - departure_time).total_seconds() // 60
+                ),
+                "distance": sum(leg.distance for leg in legs),
+            })
+
+        return Response(self.get_serializer(data, many=True).data)
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -23,6 +24,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "airport.instrumentation.RequestTimingMiddleware",
+    "airport.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -53,11 +56,138 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "airport_api.wsgi.application"
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# PostgreSQL when DB_HOST is set (docker-compose), SQLite otherwise.
+# Connections are kept DB_CONN_MAX_AGE seconds and checked before reuse;
+# DB_POOL=1 uses a psycopg pool of DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE
+# connections per worker instead. Statements running longer than
+# DB_STATEMENT_TIMEOUT milliseconds are cancelled
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 60))
+DB_STATEMENT_TIMEOUT = int(os.environ.get("DB_STATEMENT_TIMEOUT", 30000))
+
+if os.environ.get("DB_HOST"):
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "HOST": os.environ["DB_HOST"],
+            "PORT": os.environ.get("DB_PORT", "5432"),
+            "NAME": os.environ.get("DB_NAME", "airport"),
+            "USER": os.environ.get("DB_USER", "postgres"),
+            "PASSWORD": os.environ.get("DB_PASS", ""),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                "connect_timeout": 5,
+                "options": (
+                    f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"
+                    f" -c idle_in_transaction_session_timeout="
+                    f"{DB_STATEMENT_TIMEOUT * 2}"
+                ),
+            },
+        }
+    }
+    if os.environ.get("DB_POOL", "") not in ("", "0"):
+        # Pooled connections go back to the pool at the end of a request
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+            "timeout": 10,
+        }
+else:
+    # Single-node mode: WAL lets readers run alongside the writer,
+    # writers wait for the lock instead of failing with "database is
+    # locked", and reads are served from a memory map of the file
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                "timeout": 20,
+                "transaction_mode": "IMMEDIATE",
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    "PRAGMA mmap_size=268435456;"
+                    "PRAGMA cache_size=-20000;"
+                    "PRAGMA temp_store=MEMORY"
+                ),
+            },
+        }
+    }
+
+# Replicas serving the reads of the views that opt in, see
+# airport.replicas: DB_REPLICA_HOSTS lists PostgreSQL hosts separated by
+# commas, DB_REPLICA_NAME is a SQLite file standing in for a replica.
+# REPLICA_LAG bounds how many seconds they may be behind the primary
+DATABASE_ROUTERS = ["airport.replicas.ReplicaRouter"]
+DATABASE_REPLICAS = []
+REPLICA_LAG = int(os.environ.get("REPLICA_LAG", 5))
+
+if os.environ.get("DB_HOST"):
+    _replicas = [
+        {"HOST": host.strip()}
+        for host in os.environ.get("DB_REPLICA_HOSTS", "").split(",")
+        if host.strip()
+    ]
+else:
+    _replicas = [
+        {"NAME": name} for name in [os.environ.get("DB_REPLICA_NAME")] if name
+    ]
+for number, replica in enumerate(_replicas, 1):
+    DATABASE_REPLICAS.append(f"replica{number}")
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+        **replica,
+        # Tests read the test database through them, none is created
+        "TEST": {"MIRROR": "default"},
     }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Seat occupancy shown by airport.seat_map, keyed on the flight's
+    # tickets_version so no worker reads a stale map; older versions
+    # are left to expire
+    "seat_maps": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "seat-maps",
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
+    },
+    # Swap for django.core.cache.backends.filebased.FileBasedCache to
+    # share cached responses between local worker processes
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+        "TIMEOUT": 600,
+        "OPTIONS": {
+            "MAX_ENTRIES": 1000,
+        },
+    },
+    # Throttle counters with THROTTLE_STORE set to CacheStore, swap for
+    # a Redis cache to share them between workers and hosts
+    "throttle": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "throttle",
+        "TIMEOUT": None,
+        "OPTIONS": {
+            "MAX_ENTRIES": 100000,
+        },
+    },
+    "departures": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "departures",
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
+    },
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -87,12 +217,27 @@ STATIC_URL = "static/"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Browser cache lifetime of media files that aren't content-addressed,
+# see airport.media
+MEDIA_CACHE_MAX_AGE = 60 * 60
+
+# Airplane image variants: bounding boxes by size name, output formats
+# (skipped when Pillow can't encode them) and where they are made.
+# airport.images.ImmediateBackend makes them during the request instead
+AIRPLANE_IMAGE_SIZES = {
+    "thumbnail": (320, 240),
+    "medium": (1280, 960),
+}
+AIRPLANE_IMAGE_FORMATS = ["webp", "avif"]
+AIRPLANE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_TASK_BACKEND = "airport.images.ThreadPoolBackend"
+IMAGE_TASK_WORKERS = 2
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "airport.authentication.CachedUserJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -101,8 +246,8 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "airport.throttling.SlidingWindowAnonThrottle",
+        "airport.throttling.SlidingWindowUserThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "anon": "100/day",
@@ -110,12 +255,77 @@ REST_FRAMEWORK = {
     },
 }
 
+# Where the sliding-window throttles keep their counters:
+# airport.throttling.SQLiteStore a file shared by the local workers,
+# airport.throttling.CacheStore the "throttle" cache, only shared
+# between workers once that is a Redis or Memcached cache
+THROTTLE_STORE = os.environ.get(
+    "THROTTLE_STORE", "airport.throttling.SQLiteStore"
+)
+THROTTLE_SQLITE_PATH = os.environ.get(
+    "THROTTLE_SQLITE_PATH", BASE_DIR / "throttle.sqlite3"
+)
+
+# Seconds a worker reuses the user resolved from an access token, and
+# how many tokens it remembers; 0 looks the user up on every request
+JWT_USER_CACHE_TTL = 60
+JWT_USER_CACHE_SIZE = 10000
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
 }
 
+# How long seats placed on hold stay reserved before checkout
+SEAT_HOLD_TIMEOUT = timedelta(minutes=10)
+
+# Serve date searches of the flight list from the departure index
+DEPARTURE_INDEX_ENABLED = True
+
+# Connection times allowed between legs of an itinerary search
+ITINERARY_MIN_CONNECTION = timedelta(minutes=45)
+ITINERARY_MAX_CONNECTION = timedelta(hours=24)
+# Seconds before a worker rebuilds its itinerary index from the database
+ITINERARY_INDEX_MAX_AGE = 300
+
+# Send Server-Timing headers and log the query count, database,
+# authentication, serializer and total time of sampled requests
+REQUEST_TIMING_ENABLED = False
+REQUEST_TIMING_SAMPLE_RATE = 1.0
+
+# Prometheus metrics at /metrics, set METRICS_ENABLED=1 to collect and
+# serve them. Only clients in METRICS_ALLOWED_NETWORKS may scrape. Set
+# METRICS_DIR to a directory shared by the workers (emptied before they
+# start) to serve their totals
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "") not in ("", "0")
+METRICS_ALLOWED_NETWORKS = [
+    network.strip()
+    for network in os.environ.get(
+        "METRICS_ALLOWED_NETWORKS", "127.0.0.0/8,::1/128"
+    ).split(",")
+    if network.strip()
+]
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+METRICS_FLUSH_INTERVAL = 1
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+        },
+    },
+    "loggers": {
+        "airport.timing": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Airport Service API",
     "DESCRIPTION": "Airport flight tracking and booking system",
@@ -0,0 +1,53 @@
+"""
+Flight search by airport name: the old icontains join against
+airport ids resolved through Airport.objects.search(), on the
+benchmarks.datagen data set.
+
+    python -m benchmarks.airport_search [--scale NAME] [--seed N]
+"""
+import argparse
+import json
+
+from benchmarks.utils import setup_django, test_database, measure, summarize
+
+setup_django()
+
+from airport.models import Flight  # noqa: E402
+from airport.views import FlightViewSet  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+
+
+def run(scale_name, seed):
+    dataset = datagen.generate(datagen.SCALES[scale_name], seed=seed)
+    names = dataset.airport_names
+    # A shared prefix matches a group of airports, like a city name
+    term = names[len(names) // 2][:-1]
+    view = FlightViewSet()
+
+    def legacy():
+        list(
+            Flight.objects.filter(route__source__name__icontains=term)
+            .order_by("-departure_time")[:10]
+        )
+
+    def indexed():
+        list(
+            Flight.objects.filter(
+                route__source_id__in=view._search_airport_ids(term)
+            ).order_by("-departure_time")[:10]
+        )
+
+    return {
+        **dataset.counts(),
+        "term": term,
+        "icontains_join": summarize(measure(legacy)),
+        "resolved_ids": summarize(measure(indexed)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    datagen.add_arguments(parser, scale="large")
+    args = parser.parse_args()
+    with test_database():
+        print(json.dumps(run(args.scale, args.seed), indent=2))
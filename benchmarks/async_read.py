@@ -0,0 +1,170 @@
+"""
+Load test of the flight read endpoints over HTTP: the DRF viewsets
+behind a threaded WSGI server against the async views (and the same
+viewsets) under uvicorn (see requirements.txt). Both servers run in
+this process on the benchmarks.datagen data set; the load comes from
+--clients threads sending requests for --seconds per endpoint.
+
+    python -m benchmarks.async_read [--clients N] [--seconds N]
+        [--scale NAME] [--seed N]
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import random
+import threading
+import time
+from urllib.parse import quote
+
+from benchmarks.utils import (
+    setup_django,
+    start_wsgi_server,
+    summarize,
+    test_database,
+)
+
+setup_django()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.asgi import get_asgi_application  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from benchmarks import datagen  # noqa: E402
+
+
+def tokens(dataset):
+    # Requests are spread over users so the per-user throttle doesn't
+    # kick in
+    return [
+        str(AccessToken.for_user(user))
+        for user in get_user_model().objects.filter(id__in=dataset.user_ids)
+    ]
+
+
+def start_uvicorn():
+    import uvicorn
+
+    config = uvicorn.Config(
+        get_asgi_application(),
+        host="127.0.0.1",
+        port=0,
+        log_level="warning",
+        lifespan="off",
+    )
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    def stop():
+        server.should_exit = True
+
+    return port, stop
+
+
+def load(port, paths, tokens, clients, seconds):
+    """Send requests to random paths until the time is up"""
+    samples, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(index):
+        rng = random.Random(index)
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        local_samples, local_errors = [], 0
+        while time.perf_counter() < deadline:
+            headers = {
+                "Authorization": f"Bearer {rng.choice(tokens)}",
+                # Allowed by the test environment's ALLOWED_HOSTS
+                "Host": "testserver",
+            }
+            start = time.perf_counter()
+            try:
+                connection.request("GET", rng.choice(paths), headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+                if response.getheader("Connection") == "close" or (
+                    response.version == 10
+                ):
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection.close()
+            local_samples.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            samples.extend(local_samples)
+            errors.append(local_errors)
+
+    threads = [
+        threading.Thread(target=client, args=(index,))
+        for index in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        "requests_per_second": round(len(samples) / seconds, 1),
+        "errors": sum(errors),
+        **summarize(samples),
+    }
+
+
+def run(clients, seconds, scale_name, seed):
+    dataset = datagen.generate(datagen.SCALES[scale_name], seed=seed)
+    user_tokens = tokens(dataset)
+    sample_ids = random.Random(seed).sample(dataset.flight_ids, 200)
+    source = quote(dataset.airport_names[1][:-1])
+    endpoints = {
+        "flight_list": (
+            [f"/api/airport/flights/?source={source}"],
+            [f"/api/airport/async/flights/?source={source}"],
+        ),
+        "flight_detail": (
+            [f"/api/airport/flights/{pk}/" for pk in sample_ids],
+            [f"/api/airport/async/flights/{pk}/" for pk in sample_ids],
+        ),
+        "seat_availability": (
+            [f"/api/airport/flights/{pk}/" for pk in sample_ids],
+            [f"/api/airport/async/flights/{pk}/seats/" for pk in sample_ids],
+        ),
+    }
+
+    uvicorn_server = start_uvicorn()
+    targets = [
+        ("wsgi", start_wsgi_server(), 0),
+        ("asgi_sync_views", uvicorn_server, 0),
+        ("asgi_async_views", uvicorn_server, 1),
+    ]
+
+    results = {"clients": clients, "seconds_per_endpoint": seconds}
+    for name, (port, _), variant in targets:
+        results[name] = {
+            endpoint: load(
+                port, paths[variant], user_tokens, clients, seconds
+            )
+            for endpoint, paths in endpoints.items()
+        }
+    for _, (_, stop), _ in targets:
+        stop()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    datagen.add_arguments(parser, scale="medium")
+    args = parser.parse_args()
+    if importlib.util.find_spec("uvicorn") is None:
+        parser.exit(
+            1, "uvicorn is required: pip install -r requirements.txt\n"
+        )
+    with test_database(on_disk=True):
+        report = run(args.clients, args.seconds, args.scale, args.seed)
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,71 @@
+"""
+Compare two reports of benchmarks.suite. Prints the change of each
+scenario's latency, queries per request and throughput as JSON and
+exits with status 1 when a scenario's p95 latency grew by more than
+--max-regression percent or it runs more queries per request, so CI
+can fail on regressions.
+
+    python -m benchmarks.compare baseline.json current.json
+        [--max-regression PCT]
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "requests_per_second")
+
+
+def change(before, after):
+    if not before:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+def compare(baseline, current, max_regression):
+    scenarios, regressions = {}, []
+    for name, after in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        result = {
+            metric: {
+                "baseline": before[metric],
+                "current": after[metric],
+                "change_pct": change(before[metric], after[metric]),
+            }
+            for metric in METRICS
+        }
+        result["queries_per_request"] = {
+            "baseline": before["queries_per_request"],
+            "current": after["queries_per_request"],
+        }
+        scenarios[name] = result
+
+        p95_change = result["p95_ms"]["change_pct"]
+        if p95_change is not None and p95_change > max_regression:
+            regressions.append(f"{name}: p95 latency +{p95_change}%")
+        if after["queries_per_request"] > before["queries_per_request"]:
+            regressions.append(
+                f"{name}: {before['queries_per_request']} -> "
+                f"{after['queries_per_request']} queries per request"
+            )
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{name}: {after['errors']} errors")
+    return {"scenarios": scenarios, "regressions": regressions}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--max-regression", type=float, default=20)
+    args = parser.parse_args()
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    if baseline["meta"]["scale"] != current["meta"]["scale"]:
+        sys.exit("Reports of different scales can't be compared")
+    result = compare(baseline, current, args.max_regression)
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result["regressions"] else 0)
@@ -0,0 +1,94 @@
+"""
+Per-request cost of database connection setup. Each request runs one
+small query between Django's request_started and request_finished
+signals, which close connections older than CONN_MAX_AGE, under:
+
+- no_reuse: CONN_MAX_AGE = 0, a new connection per request
+- persistent: CONN_MAX_AGE = 60, one connection for all requests
+- pooled (PostgreSQL with psycopg_pool): connections from a pool
+- untuned_no_reuse (SQLite): new connections without the PRAGMAs
+
+against the database configured by the environment, see DATABASES.
+
+    python -m benchmarks.connections [--requests N]
+"""
+import argparse
+import copy
+import importlib.util
+import json
+import time
+
+from benchmarks.utils import setup_django, summarize, test_database
+
+setup_django()
+
+from django.core.signals import (  # noqa: E402
+    request_finished,
+    request_started,
+)
+from django.db import connection  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+
+from airport.models import Airport  # noqa: E402
+
+
+def configurations(options):
+    options = {
+        name: value for name, value in options.items() if name != "pool"
+    }
+    configs = {
+        "no_reuse": {"CONN_MAX_AGE": 0, "OPTIONS": options},
+        "persistent": {"CONN_MAX_AGE": 60, "OPTIONS": options},
+    }
+    if connection.vendor == "postgresql" and importlib.util.find_spec(
+        "psycopg_pool"
+    ):
+        configs["pooled"] = {
+            "CONN_MAX_AGE": 0,
+            "OPTIONS": {**options, "pool": {"min_size": 1, "max_size": 2}},
+        }
+    if connection.vendor == "sqlite":
+        configs["untuned_no_reuse"] = {"CONN_MAX_AGE": 0, "OPTIONS": {}}
+    return configs
+
+
+def run_config(requests):
+    connects = []
+
+    def count(**kwargs):
+        connects.append(1)
+
+    connection_created.connect(count)
+    samples = []
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            request_started.send(sender=None)
+            Airport.objects.exists()
+            request_finished.send(sender=None)
+            samples.append(time.perf_counter() - start)
+    finally:
+        connection_created.disconnect(count)
+    return {**summarize(samples), "connections": len(connects)}
+
+
+def run(requests):
+    results = {"vendor": connection.vendor}
+    original = copy.deepcopy(connection.settings_dict)
+    try:
+        for name, config in configurations(original["OPTIONS"]).items():
+            connection.close()
+            connection.settings_dict.update(copy.deepcopy(config))
+            results[name] = run_config(requests)
+    finally:
+        connection.close()
+        connection.settings_dict.update(original)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    with test_database(on_disk=True):
+        print(json.dumps(run(args.requests), indent=2))
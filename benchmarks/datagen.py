@@ -0,0 +1,214 @@
+"""
+Seeded synthetic data for benchmarks: airports, routes, airplanes,
+flights, users with orders and tickets. The same scale and seed always
+produce the same rows, so runs on different commits are comparable.
+Rows are bulk inserted in batches and Flight.tickets_sold is set to
+match the generated tickets.
+"""
+import random
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from airport import flight_search
+from airport.models import (
+    Airport,
+    Route,
+    AirplaneType,
+    Airplane,
+    Flight,
+    Order,
+    Ticket,
+    normalize_search_name,
+)
+
+BATCH_SIZE = 5000
+TICKETS_PER_ORDER = (1, 4)
+DAYS = 30
+
+
+@dataclass
+class Scale:
+    airports: int
+    routes: int
+    airplanes: int
+    flights: int
+    tickets: int
+    users: int
+
+
+SCALES = {
+    "small": Scale(50, 200, 10, 2_000, 10_000, 50),
+    "medium": Scale(500, 2_000, 50, 20_000, 100_000, 200),
+    "large": Scale(5_000, 20_000, 200, 200_000, 1_000_000, 1_000),
+}
+
+
+@dataclass
+class Dataset:
+    """What scenarios need to know about the generated rows"""
+    scale: Scale
+    first_day: date
+    airport_names: list
+    flight_ids: list
+    # flight id: [first free seat index, capacity, seats in row] of the
+    # flights with free seats, seats are taken in row order
+    free_seats: dict
+    user_ids: list
+
+    def counts(self):
+        return asdict(self.scale)
+
+
+def add_arguments(parser, scale="small"):
+    """Add the --scale and --seed options of the data set to a parser"""
+    parser.add_argument("--scale", choices=sorted(SCALES), default=scale)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def _batches(items, size=BATCH_SIZE):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(scale, seed=42):
+    rng = random.Random(seed)
+    first_day = timezone.localdate() + timedelta(days=1)
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+
+    names = [f"Airport {i:05d}" for i in range(scale.airports)]
+    for batch in _batches(
+        Airport(
+            name=name,
+            search_name=normalize_search_name(name),
+            closest_big_city=f"City {i % 100}",
+        )
+        for i, name in enumerate(names)
+    ):
+        Airport.objects.bulk_create(batch)
+    airport_ids = list(
+        Airport.objects.order_by("id").values_list("id", flat=True)
+    )
+
+    for batch in _batches(
+        Route(
+            source_id=source_id,
+            destination_id=destination_id,
+            distance=rng.randint(200, 5000),
+        )
+        for source_id, destination_id in (
+            rng.sample(airport_ids, 2) for _ in range(scale.routes)
+        )
+    ):
+        Route.objects.bulk_create(batch)
+    route_ids = list(
+        Route.objects.order_by("id").values_list("id", flat=True)
+    )
+
+    airplane_type = AirplaneType.objects.create(name="Synthetic Type")
+    Airplane.objects.bulk_create(
+        Airplane(
+            name=f"Airplane {i:04d}",
+            rows=rng.randint(20, 40),
+            seats_in_row=rng.choice([4, 6]),
+            airplane_type=airplane_type,
+        )
+        for i in range(scale.airplanes)
+    )
+    airplanes = list(
+        Airplane.objects.order_by("id").values_list(
+            "id", "rows", "seats_in_row"
+        )
+    )
+
+    # Spread tickets over flights up to 90% of each capacity
+    planned = []
+    tickets_left = scale.tickets
+    for i in range(scale.flights):
+        airplane_id, rows, seats_in_row = rng.choice(airplanes)
+        flights_left = scale.flights - i
+        sold = min(
+            tickets_left,
+            int(rows * seats_in_row * 0.9),
+            rng.randint(0, 2 * tickets_left // flights_left),
+        )
+        tickets_left -= sold
+        departure_time = start + timedelta(
+            minutes=rng.randrange(DAYS * 24 * 60)
+        )
+        planned.append((
+            Flight(
+                route_id=rng.choice(route_ids),
+                airplane_id=airplane_id,
+                departure_time=departure_time,
+                arrival_time=departure_time + timedelta(
+                    minutes=rng.randint(45, 720)
+                ),
+                tickets_sold=sold,
+            ),
+            rows * seats_in_row,
+            seats_in_row,
+        ))
+    for batch in _batches(flight for flight, _, _ in planned):
+        Flight.objects.bulk_create(batch)
+
+    password = make_password("benchpass123")
+    get_user_model().objects.bulk_create(
+        get_user_model()(username=f"bench{i:05d}", password=password)
+        for i in range(scale.users)
+    )
+    user_ids = list(
+        get_user_model().objects.filter(
+            username__startswith="bench"
+        ).order_by("id").values_list("id", flat=True)
+    )
+
+    def seats():
+        for flight, _, seats_in_row in planned:
+            for index in range(flight.tickets_sold):
+                row, seat = divmod(index, seats_in_row)
+                yield flight.id, row + 1, seat + 1
+
+    def orders():
+        """Group the seats into orders of a few tickets"""
+        seat_iter = seats()
+        while True:
+            size = rng.randint(*TICKETS_PER_ORDER)
+            order_seats = list(islice(seat_iter, size))
+            if not order_seats:
+                return
+            yield rng.choice(user_ids), order_seats
+
+    for batch in _batches(orders(), BATCH_SIZE // 4):
+        created = Order.objects.bulk_create(
+            Order(user_id=user_id) for user_id, _ in batch
+        )
+        Ticket.objects.bulk_create(
+            Ticket(order=order, flight_id=flight_id, row=row, seat=seat)
+            for order, (_, order_seats) in zip(created, batch)
+            for flight_id, row, seat in order_seats
+        )
+    flight_search.rebuild()
+
+    return Dataset(
+        scale=scale,
+        first_day=first_day,
+        airport_names=names,
+        flight_ids=[flight.id for flight, _, _ in planned],
+        free_seats={
+            flight.id: [flight.tickets_sold, capacity, seats_in_row]
+            for flight, capacity, seats_in_row in planned
+            if flight.tickets_sold < capacity
+        },
+        user_ids=user_ids,
+    )
@@ -0,0 +1,58 @@
+"""
+Flight list searched by date, source and destination: the database
+join and sort against ids from the (warm) departure index, on the
+benchmarks.datagen data set.
+
+    python -m benchmarks.departure_index [--scale NAME] [--seed N]
+"""
+import argparse
+import json
+
+from benchmarks.utils import setup_django, test_database, measure, summarize
+
+setup_django()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from benchmarks import datagen  # noqa: E402
+
+
+def run(scale_name, seed):
+    dataset = datagen.generate(datagen.SCALES[scale_name], seed=seed)
+    client = APIClient()
+    client.force_authenticate(
+        get_user_model().objects.get(id=dataset.user_ids[0])
+    )
+    url = reverse("airport:flight-list")
+    day = dataset.first_day.isoformat()
+    names = dataset.airport_names
+    # Prefixes of up to 100 airports, and of 10 on each side
+    searches = [
+        {"date": day},
+        {"date": day, "source": names[0][:-2]},
+        {
+            "date": day,
+            "source": names[10][:-1],
+            "destination": names[20][:-1],
+        },
+    ]
+
+    results = dataset.counts()
+    for params in searches:
+        name = "&".join(f"{key}={value}" for key, value in params.items())
+        with override_settings(DEPARTURE_INDEX_ENABLED=False):
+            database = summarize(measure(lambda: client.get(url, params)))
+        indexed = summarize(measure(lambda: client.get(url, params)))
+        results[name] = {"database": database, "departure_index": indexed}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    datagen.add_arguments(parser, scale="large")
+    args = parser.parse_args()
+    with test_database():
+        print(json.dumps(run(args.scale, args.seed), indent=2))
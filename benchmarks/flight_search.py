@@ -0,0 +1,57 @@
+"""
+Flight list latency as the number of sold tickets grows, on the
+benchmarks.datagen data set of each scale.
+
+    python -m benchmarks.flight_search [--scale NAME ...] [--seed N]
+"""
+import argparse
+import json
+
+from benchmarks.utils import setup_django, test_database, measure, summarize
+
+setup_django()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from benchmarks import datagen  # noqa: E402
+
+SCALES = ("small", "medium")
+
+
+def run(scale_name, seed):
+    dataset = datagen.generate(datagen.SCALES[scale_name], seed=seed)
+    client = APIClient()
+    client.force_authenticate(
+        get_user_model().objects.get(id=dataset.user_ids[0])
+    )
+    url = reverse("airport:flight-list")
+
+    def get():
+        response = client.get(url)
+        assert response.status_code == 200
+
+    return {
+        "scale": scale_name,
+        "flights": dataset.scale.flights,
+        "tickets": dataset.scale.tickets,
+        **summarize(measure(get)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--scale",
+        action="append",
+        choices=sorted(datagen.SCALES),
+        help="Scale to run, may be repeated; small and medium by default",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    results = []
+    for scale_name in args.scale or SCALES:
+        with test_database():
+            results.append(run(scale_name, args.seed))
+    print(json.dumps(results, indent=2))
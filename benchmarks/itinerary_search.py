@@ -0,0 +1,130 @@
+"""
+Connecting itinerary search in the in-memory ItineraryIndex: index
+build time from the database and search latency between random
+airports.
+
+    python -m benchmarks.itinerary_search [--airports N] [--flights N]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import timedelta
+
+from benchmarks.utils import setup_django, test_database, measure, summarize
+
+setup_django()
+
+from django.utils import timezone  # noqa: E402
+
+from airport.itineraries import ItineraryIndex  # noqa: E402
+from airport.models import (  # noqa: E402
+    Airport,
+    Route,
+    AirplaneType,
+    Airplane,
+    Flight,
+)
+
+BATCH_SIZE = 5000
+HUBS = 50
+HUBS_PER_AIRPORT = 2
+DAYS = 7
+
+
+def seed(airport_count, flight_count):
+    rng = random.Random(42)
+    Airport.objects.bulk_create(
+        (
+            Airport(name=f"Airport {i:05d}", closest_big_city="City")
+            for i in range(airport_count)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    airport_ids = list(Airport.objects.values_list("id", flat=True))
+    # Hubs are linked to each other, every other airport to a few hubs,
+    # so any two airports are at most three legs apart
+    hubs = airport_ids[:HUBS]
+    pairs = [(a, b) for a in hubs for b in hubs if a != b]
+    for airport_id in airport_ids[HUBS:]:
+        for hub in rng.sample(hubs, HUBS_PER_AIRPORT):
+            pairs += [(airport_id, hub), (hub, airport_id)]
+    Route.objects.bulk_create(
+        (
+            Route(
+                source_id=source_id,
+                destination_id=destination_id,
+                distance=rng.randint(200, 3000),
+            )
+            for source_id, destination_id in pairs
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    route_ids = list(Route.objects.values_list("id", flat=True))
+    airplane = Airplane.objects.create(
+        name="Bench Airplane",
+        rows=30,
+        seats_in_row=6,
+        airplane_type=AirplaneType.objects.create(name="Bench Type"),
+    )
+    start_of_day = timezone.now().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    for start in range(0, flight_count, BATCH_SIZE):
+        flights = []
+        for _ in range(start, min(start + BATCH_SIZE, flight_count)):
+            departure_time = start_of_day + timedelta(
+                minutes=rng.randrange(DAYS * 24 * 60)
+            )
+            flights.append(Flight(
+                route_id=rng.choice(route_ids),
+                airplane=airplane,
+                departure_time=departure_time,
+                arrival_time=departure_time + timedelta(
+                    minutes=rng.randint(45, 600)
+                ),
+            ))
+        Flight.objects.bulk_create(flights)
+    return airport_ids, start_of_day
+
+
+def run(airport_count, flight_count, max_legs):
+    airport_ids, start_of_day = seed(airport_count, flight_count)
+
+    started = time.perf_counter()
+    index = ItineraryIndex.build()
+    build_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    rng = random.Random(7)
+    found = []
+
+    def search():
+        source_id, destination_id = rng.sample(airport_ids, 2)
+        found.append(bool(index.search(
+            [source_id],
+            [destination_id],
+            start_of_day,
+            start_of_day + timedelta(days=1),
+            max_legs=max_legs,
+        )))
+
+    return {
+        "airports": airport_count,
+        "flights": flight_count,
+        "max_legs": max_legs,
+        "build_ms": build_ms,
+        "search": summarize(measure(search, repeat=200)),
+        "searches_with_results": sum(found),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--airports", type=int, default=5_000)
+    parser.add_argument("--flights", type=int, default=200_000)
+    parser.add_argument("--max-legs", type=int, default=3)
+    args = parser.parse_args()
+    with test_database():
+        print(json.dumps(
+            run(args.airports, args.flights, args.max_legs), indent=2
+        ))
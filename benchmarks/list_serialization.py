@@ -0,0 +1,81 @@
+"""
+Rows per second of the DRF list serializers against the .values()
+fast path on 1,000-item flight and order pages, and of flight pages
+read from the flight search table, on the benchmarks.datagen data set.
+
+    python -m benchmarks.list_serialization [--scale NAME] [--seed N]
+"""
+import argparse
+import json
+
+from benchmarks.utils import setup_django, test_database, measure, summarize
+
+setup_django()
+
+from django.db.models import Prefetch  # noqa: E402
+
+from airport.models import Flight, FlightSearch, Order  # noqa: E402
+from airport.serializers import (  # noqa: E402
+    FlightListSerializer,
+    FlightListValuesSerializer,
+    FlightSearchValuesSerializer,
+    OrderListSerializer,
+    OrderListValuesSerializer,
+)
+from airport.views import FlightViewSet  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+
+PAGE = 1000
+
+
+def rows_per_second(samples):
+    summary = summarize(samples)
+    summary["rows_per_second"] = round(PAGE / (summary["p50_ms"] / 1000))
+    return summary
+
+
+def run(scale_name, seed):
+    datagen.generate(datagen.SCALES[scale_name], seed=seed)
+    flights = FlightViewSet.queryset[:PAGE]
+    search_rows = FlightSearch.objects.all()[:PAGE]
+    # Each flight once, with what the DRF serializer reads of it
+    orders = Order.objects.prefetch_related(
+        Prefetch(
+            "tickets__flight",
+            queryset=Flight.objects.select_related(
+                "route__source", "route__destination", "airplane"
+            )
+        )
+    )[:PAGE]
+
+    return {
+        "flights_drf": rows_per_second(measure(
+            lambda: FlightListSerializer(flights.all(), many=True).data
+        )),
+        "flights_values": rows_per_second(measure(
+            lambda: FlightListValuesSerializer.serialize(
+                FlightListValuesSerializer.values(flights.all())
+            )
+        )),
+        "flights_search_table": rows_per_second(measure(
+            lambda: FlightSearchValuesSerializer.serialize(
+                FlightSearchValuesSerializer.values(search_rows.all())
+            )
+        )),
+        "orders_drf": rows_per_second(measure(
+            lambda: OrderListSerializer(orders.all(), many=True).data
+        )),
+        "orders_values": rows_per_second(measure(
+            lambda: OrderListValuesSerializer.serialize(
+                OrderListValuesSerializer.values(orders.all())
+            )
+        )),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+    with test_database():
+        print(json.dumps(run(args.scale, args.seed), indent=2))
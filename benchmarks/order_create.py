@@ -0,0 +1,85 @@
+"""
+Order creation latency as the number of tickets per order grows.
+
+    python -m benchmarks.order_create
+"""
+import json
+
+from benchmarks.utils import setup_django, test_database, measure, summarize
+
+setup_django()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from airport.models import (  # noqa: E402
+    Airport,
+    Route,
+    AirplaneType,
+    Airplane,
+    Flight,
+    Ticket,
+)
+
+TICKET_COUNTS = (1, 5, 10, 20, 40, 80)
+SEATS_IN_ROW = 8
+
+
+def make_flight():
+    source = Airport.objects.create(name="Bench A", closest_big_city="A")
+    destination = Airport.objects.create(name="Bench B", closest_big_city="B")
+    airplane = Airplane.objects.create(
+        name="Bench Airplane",
+        rows=20,
+        seats_in_row=SEATS_IN_ROW,
+        airplane_type=AirplaneType.objects.create(name="Bench Type"),
+    )
+    now = timezone.now()
+    return Flight.objects.create(
+        route=Route.objects.create(
+            source=source, destination=destination, distance=1000
+        ),
+        airplane=airplane,
+        departure_time=now,
+        arrival_time=now,
+    )
+
+
+def run():
+    user = get_user_model().objects.create_user(
+        username="bench", password="benchpass123"
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+    flight = make_flight()
+    url = reverse("airport:order-list")
+
+    results = []
+    for count in TICKET_COUNTS:
+        payload = {
+            "tickets": [
+                {
+                    "row": 1 + i // SEATS_IN_ROW,
+                    "seat": 1 + i % SEATS_IN_ROW,
+                    "flight": flight.id,
+                }
+                for i in range(count)
+            ]
+        }
+
+        def post():
+            response = client.post(url, payload, format="json")
+            assert response.status_code == 201, response.data
+
+        samples = measure(
+            post, setup=lambda: Ticket.objects.filter(flight=flight).delete()
+        )
+        results.append({"tickets": count, **summarize(samples)})
+    return results
+
+
+if __name__ == "__main__":
+    with test_database():
+        print(json.dumps(run(), indent=2))
@@ -0,0 +1,66 @@
+"""
+Flight list latency on the first and last page with page number and
+keyset (cursor) pagination, on the benchmarks.datagen data set.
+
+    python -m benchmarks.pagination [--scale NAME] [--seed N]
+"""
+import argparse
+import json
+
+from benchmarks.utils import setup_django, test_database, measure, summarize
+
+setup_django()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from airport.models import FlightSearch  # noqa: E402
+from airport.views import FlightPagination  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+
+PAGE_SIZE = 10
+
+
+def deep_cursor(url, page):
+    """Cursor of the given page, as a client paging through would get"""
+    paginator = FlightPagination()
+    paginator.model = FlightSearch
+    paginator.base_url = url
+    last_of_previous_page = FlightSearch.objects.order_by(*paginator.keyset)[
+        (page - 1) * PAGE_SIZE - 1
+    ]
+    return paginator.encode_cursor(last_of_previous_page, reverse=False)
+
+
+def run(scale_name, seed):
+    dataset = datagen.generate(datagen.SCALES[scale_name], seed=seed)
+    client = APIClient()
+    client.force_authenticate(
+        get_user_model().objects.get(id=dataset.user_ids[0])
+    )
+    url = reverse("airport:flight-list")
+    pages = dataset.scale.flights // PAGE_SIZE
+
+    def get(path, params=None):
+        def call():
+            response = client.get(path, params)
+            assert response.status_code == 200
+        return call
+
+    return {
+        "flights": dataset.scale.flights,
+        "pages": pages,
+        "page_number_first": summarize(measure(get(url, {"page": 1}))),
+        "page_number_last": summarize(measure(get(url, {"page": pages}))),
+        "cursor_first": summarize(measure(get(url, {"cursor": ""}))),
+        "cursor_last": summarize(measure(get(deep_cursor(url, pages)))),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    datagen.add_arguments(parser, scale="large")
+    args = parser.parse_args()
+    with test_database():
+        print(json.dumps(run(args.scale, args.seed), indent=2))
@@ -0,0 +1,161 @@
+"""
+Multi-threaded load test of concurrent buyers racing for the seats of
+one small flight, half of them booking directly and half through seat
+holds. Fails unless every seat is sold at most once, the counters add
+up and p99 latency stays under --max-p99-ms.
+
+    python -m benchmarks.seat_contention [--threads N] [--attempts N]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from benchmarks.utils import setup_django, test_database, summarize
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from airport.models import (  # noqa: E402
+    Airport,
+    Route,
+    AirplaneType,
+    Airplane,
+    Flight,
+    Ticket,
+)
+
+ROWS = 10
+SEATS_IN_ROW = 4
+
+
+def make_flight():
+    now = timezone.now()
+    return Flight.objects.create(
+        route=Route.objects.create(
+            source=Airport.objects.create(
+                name="Bench A", closest_big_city="A"
+            ),
+            destination=Airport.objects.create(
+                name="Bench B", closest_big_city="B"
+            ),
+            distance=1000,
+        ),
+        airplane=Airplane.objects.create(
+            name="Bench Airplane",
+            rows=ROWS,
+            seats_in_row=SEATS_IN_ROW,
+            airplane_type=AirplaneType.objects.create(name="Bench Type"),
+        ),
+        departure_time=now,
+        arrival_time=now,
+    )
+
+
+def buyer(index, flight_id, attempts, results):
+    user = get_user_model().objects.create_user(
+        username=f"buyer{index}", password="benchpass123"
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+    rng = random.Random(index)
+    use_holds = index % 2 == 1
+
+    try:
+        for _ in range(attempts):
+            seats = rng.sample(
+                [(row, seat) for row in range(1, ROWS + 1)
+                 for seat in range(1, SEATS_IN_ROW + 1)],
+                rng.randint(1, 3)
+            )
+            payload = {
+                "tickets": [
+                    {"row": row, "seat": seat, "flight": flight_id}
+                    for row, seat in seats
+                ]
+            }
+            start = time.perf_counter()
+            if use_holds:
+                response = client.post(
+                    reverse("airport:seathold-list"), payload, format="json"
+                )
+                if response.status_code == 201:
+                    response = client.post(
+                        reverse("airport:seathold-confirm"),
+                        {"holds": [hold["id"] for hold in response.data]},
+                        format="json"
+                    )
+            else:
+                response = client.post(
+                    reverse("airport:order-list"), payload, format="json"
+                )
+            elapsed = time.perf_counter() - start
+            sold = seats if response.status_code == 201 else []
+            results.append((response.status_code, elapsed, sold))
+    finally:
+        connection.close()
+
+
+def run(threads, attempts):
+    flight = make_flight()
+    results = []
+    workers = [
+        threading.Thread(
+            target=buyer, args=(index, flight.id, attempts, results)
+        )
+        for index in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    duration = time.perf_counter() - start
+
+    statuses = [status for status, _, _ in results]
+    sold = [seat for _, _, seats in results for seat in seats]
+    flight.refresh_from_db()
+    report = {
+        "threads": threads,
+        "requests": len(results),
+        "throughput_rps": round(len(results) / duration, 1),
+        "created": statuses.count(201),
+        "rejected": statuses.count(400),
+        "errors": len(statuses) - statuses.count(201) - statuses.count(400),
+        "seats_sold_in_responses": len(sold),
+        "tickets_in_database": Ticket.objects.filter(flight=flight).count(),
+        "tickets_sold_counter": flight.tickets_sold,
+        **summarize([elapsed for _, elapsed, _ in results]),
+    }
+    report["oversold"] = len(sold) - len(set(sold))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=20)
+    parser.add_argument("--max-p99-ms", type=float, default=2000)
+    args = parser.parse_args()
+
+    # Let writers queue on SQLite's lock instead of failing fast
+    settings.DATABASES["default"].setdefault("OPTIONS", {})["timeout"] = 30
+    with test_database(on_disk=True):
+        report = run(args.threads, args.attempts)
+    print(json.dumps(report, indent=2))
+
+    assert report["errors"] == 0, "requests failed"
+    assert report["oversold"] == 0, "a seat was sold twice"
+    assert (
+        report["seats_sold_in_responses"]
+        == report["tickets_in_database"]
+        == report["tickets_sold_counter"]
+    ), "sold seats and counters disagree"
+    assert report["p99_ms"] <= args.max_p99_ms, "p99 latency too high"
@@ -0,0 +1,310 @@
+"""
+Benchmark suite of the booking API. Seeds a synthetic data set at the
+chosen scale, then runs the flight search, flight detail, order create
+and order list scenarios through the Django test client or a local
+HTTP server. Prints (or writes) JSON with latency percentiles, queries
+per request and throughput per scenario; compare two runs with
+benchmarks.compare.
+
+    python -m benchmarks.suite [--scale small|medium|large]
+        [--target client|server] [--requests N] [--concurrency N]
+        [--seed N] [--output FILE]
+"""
+import argparse
+import http.client
+import json
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from urllib.parse import urlencode
+
+from benchmarks.utils import (
+    setup_django,
+    start_wsgi_server,
+    summarize,
+    test_database,
+)
+
+setup_django()
+
+import django  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from airport.throttling import get_store  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+
+SCENARIOS = ("flight_search", "flight_detail", "order_create", "order_list")
+WARMUP = 10
+
+
+class Scenarios:
+    """
+    Build requests of each scenario as (method, path, body, token).
+    Order creation takes free seats in order, so concurrent buyers
+    never collide and every order is expected to succeed.
+    """
+
+    def __init__(self, dataset, seed):
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = {
+            user.id: str(AccessToken.for_user(user))
+            for user in get_user_model().objects.filter(
+                id__in=dataset.user_ids
+            )
+        }
+        self.free_flights = list(dataset.free_seats)
+
+    def _token(self):
+        return self.tokens[self.rng.choice(self.dataset.user_ids)]
+
+    def flight_search(self):
+        names = self.dataset.airport_names
+        day = self.dataset.first_day.toordinal() + self.rng.randrange(7)
+        # A shared prefix matches a group of airports, like a city name
+        source = self.rng.choice(names)[:-1]
+        date = self.dataset.first_day.fromordinal(day).isoformat()
+        query = urlencode({"source": source, "date": date})
+        path = f"/api/airport/flights/?{query}"
+        return "GET", path, None, self._token()
+
+    def flight_detail(self):
+        flight_id = self.rng.choice(self.dataset.flight_ids)
+        return "GET", f"/api/airport/flights/{flight_id}/", None, self._token()
+
+    def order_create(self):
+        with self.lock:
+            while True:
+                flight_id = self.rng.choice(self.free_flights)
+                seat_index, capacity, seats_in_row = (
+                    self.dataset.free_seats[flight_id]
+                )
+                if seat_index < capacity:
+                    break
+                self.free_flights.remove(flight_id)
+            self.dataset.free_seats[flight_id][0] += 1
+        row, seat = divmod(seat_index, seats_in_row)
+        body = {
+            "tickets": [
+                {"flight": flight_id, "row": row + 1, "seat": seat + 1}
+            ]
+        }
+        return "POST", "/api/airport/orders/", body, self._token()
+
+    def order_list(self):
+        return "GET", "/api/airport/orders/", None, self._token()
+
+
+class ClientDriver:
+    """Requests through the Django test client, queries captured"""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, method, path, body, token):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = APIClient()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.generic(
+                method,
+                path,
+                json.dumps(body) if body else "",
+                content_type="application/json",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+        return response.status_code, len(queries)
+
+
+def counting_app(app):
+    """WSGI app adding the request's query count as X-Query-Count"""
+    def wrapped(environ, start_response):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def counting_start_response(status, headers, *args):
+            headers.append(("X-Query-Count", str(len(queries))))
+            return start_response(status, headers, *args)
+
+        with connection.execute_wrapper(count):
+            return app(environ, counting_start_response)
+
+    return wrapped
+
+
+class ServerDriver:
+    """Requests over HTTP to a threaded WSGI server of this process"""
+
+    def __init__(self):
+        self.port, self.stop = start_wsgi_server(
+            counting_app(get_wsgi_application())
+        )
+        self.local = threading.local()
+
+    def __call__(self, method, path, body, token):
+        conn = getattr(self.local, "connection", None)
+        if conn is None:
+            conn = self.local.connection = http.client.HTTPConnection(
+                "127.0.0.1", self.port
+            )
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Host": "testserver",
+        }
+        try:
+            conn.request(
+                method,
+                path,
+                json.dumps(body) if body else None,
+                headers=headers,
+            )
+            response = conn.getresponse()
+            response.read()
+        finally:
+            # The server speaks HTTP/1.0, one request per connection
+            conn.close()
+        return response.status, int(response.getheader("X-Query-Count", 0))
+
+
+def run_scenario(driver, make_request, requests, concurrency):
+    for _ in range(WARMUP):
+        driver(*make_request())
+    # Reset throttle counters between scenarios
+    caches["default"].clear()
+    get_store().clear()
+
+    samples, queries, errors = [], [], []
+    lock = threading.Lock()
+    per_thread = [requests // concurrency] * concurrency
+    per_thread[0] += requests % concurrency
+
+    def worker(count):
+        local_samples, local_queries, local_errors = [], [], 0
+        for _ in range(count):
+            request = make_request()
+            start = time.perf_counter()
+            status_code, query_count = driver(*request)
+            local_samples.append(time.perf_counter() - start)
+            local_queries.append(query_count)
+            if status_code >= 400:
+                local_errors += 1
+        with lock:
+            samples.extend(local_samples)
+            queries.extend(local_queries)
+            errors.append(local_errors)
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, args=(count,))
+        for count in per_thread
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        **summarize(samples),
+        "queries_per_request": round(statistics.mean(queries), 2),
+        "max_queries": max(queries),
+        "requests_per_second": round(len(samples) / elapsed, 1),
+        "errors": sum(errors),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale_name, target, requests, concurrency, seed, scenarios):
+    started = time.perf_counter()
+    dataset = datagen.generate(datagen.SCALES[scale_name], seed=seed)
+    seed_seconds = round(time.perf_counter() - started, 2)
+
+    factory = Scenarios(dataset, seed)
+    driver = ServerDriver() if target == "server" else ClientDriver()
+    try:
+        results = {
+            name: run_scenario(
+                driver, getattr(factory, name), requests, concurrency
+            )
+            for name in scenarios
+        }
+    finally:
+        if target == "server":
+            driver.stop()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "scale": scale_name,
+            "target": target,
+            "requests": requests,
+            "concurrency": concurrency,
+            "seed": seed,
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+        },
+        "dataset": {**dataset.counts(), "seed_seconds": seed_seconds},
+        "scenarios": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    datagen.add_arguments(parser)
+    parser.add_argument(
+        "--target", choices=["client", "server"], default="client"
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=SCENARIOS,
+        help="Scenario to run, may be repeated; all by default",
+    )
+    parser.add_argument("--output", help="Write the JSON to this file")
+    args = parser.parse_args()
+
+    # Threads need a database file they can all open
+    on_disk = args.target == "server" or args.concurrency > 1
+    with test_database(on_disk=on_disk):
+        report = run(
+            args.scale,
+            args.target,
+            args.requests,
+            args.concurrency,
+            args.seed,
+            args.scenario or SCENARIOS,
+        )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
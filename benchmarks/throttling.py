@@ -0,0 +1,86 @@
+"""
+Per-request overhead of the throttles: DRF's UserRateThrottle, which
+rewrites a list of up to rate timestamps per request, against the
+sliding-window throttle on the cache and on the SQLite store. Each
+throttle takes --requests requests of one client, then of --clients
+clients in turn, at the project's "user" rate.
+
+    python -m benchmarks.throttling [--requests N] [--clients N]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+from benchmarks.utils import setup_django, summarize
+
+setup_django()
+
+from django.core.cache import caches  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.throttling import UserRateThrottle  # noqa: E402
+
+from airport.throttling import (  # noqa: E402
+    SlidingWindowUserThrottle,
+    get_store,
+)
+
+
+def run_throttle(throttle_class, requests, clients):
+    users = [
+        SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=pk))
+        for pk in range(clients)
+    ]
+    results = {}
+    for name, sequence in (
+        ("one_client", [users[0]] * requests),
+        ("many_clients", [users[i % clients] for i in range(requests)]),
+    ):
+        caches["default"].clear()
+        get_store().clear()
+        samples, refused = [], 0
+        for request in sequence:
+            start = time.perf_counter()
+            allowed = throttle_class().allow_request(request, None)
+            samples.append(time.perf_counter() - start)
+            refused += not allowed
+        results[name] = {**summarize(samples), "refused": refused}
+    return results
+
+
+def run(requests, clients):
+    directory = tempfile.mkdtemp()
+    try:
+        with override_settings(
+            THROTTLE_SQLITE_PATH=os.path.join(directory, "throttle.sqlite3")
+        ):
+            results = {
+                "rate": UserRateThrottle().rate,
+                "drf_history": run_throttle(
+                    UserRateThrottle, requests, clients
+                ),
+            }
+            for name, store in (
+                ("sliding_window_cache", "CacheStore"),
+                ("sliding_window_sqlite", "SQLiteStore"),
+            ):
+                with override_settings(
+                    THROTTLE_STORE=f"airport.throttling.{store}"
+                ):
+                    results[name] = run_throttle(
+                        SlidingWindowUserThrottle, requests, clients
+                    )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.clients), indent=2))
@@ -0,0 +1,118 @@
+import contextlib
+import logging
+import os
+import shutil
+import socketserver
+import statistics
+import tempfile
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "airport_api.settings")
+    django.setup()
+    # Rejected requests are expected in benchmarks, don't log each one
+    logging.getLogger("django.request").setLevel(logging.ERROR)
+
+
+@contextlib.contextmanager
+def test_database(on_disk=False):
+    """
+    Run the benchmark against a throwaway test database and throttle
+    store file. SQLite test databases live in memory unless on_disk is
+    set, which benchmarks sharing the database between threads need.
+    """
+    from django.db import connection
+    from django.test.utils import (
+        override_settings,
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    directory = tempfile.mkdtemp()
+    if on_disk and connection.vendor == "sqlite":
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(
+            directory, "benchmark.sqlite3"
+        )
+    throttle_path = override_settings(
+        THROTTLE_SQLITE_PATH=os.path.join(directory, "throttle.sqlite3")
+    )
+    throttle_path.enable()
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        throttle_path.disable()
+        teardown_test_environment()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def measure(func, repeat=20, setup=None):
+    """Call func repeat times and return the wall time of each call"""
+    from django.core.cache import cache
+
+    from airport.throttling import get_store
+
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        # Keep throttle counters from building up between calls
+        cache.clear()
+        get_store().clear()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples):
+    """Return latency percentiles in milliseconds"""
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        index = min(len(ordered) - 1, int(round(fraction * len(ordered))))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def start_wsgi_server(app=None):
+    """
+    Serve the project (or app) from a thread of this process, so the
+    server uses the benchmark's test database. Requests must be sent
+    with "Host: testserver". Returns the port and a stop function.
+    """
+    from django.core.wsgi import get_wsgi_application
+
+    server = make_server(
+        "127.0.0.1",
+        0,
+        app or get_wsgi_application(),
+        server_class=ThreadingWSGIServer,
+        handler_class=QuietHandler,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port, server.shutdown